@@ -0,0 +1,237 @@
+"""Офлайн-бэктест SignalGenerator на записанных свечах.
+
+Пример:
+    python backtest.py data/*.csv --expiry 60 --workers 4
+"""
+import argparse
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from bot import SignalGenerator
+from candle_archive import iter_days
+from indicators import RsiState
+
+# Столько свечей нужно analyze_asset, чтобы выдать первый сигнал
+MIN_CANDLES = 50
+
+
+# ==================== ЧТЕНИЕ СВЕЧЕЙ ====================
+def read_chunks(path, chunk_size=200_000):
+    """Потоковое чтение CSV/Parquet кусками DataFrame с колонками time, close (и asset)"""
+    if os.path.isdir(path):
+        # Каталог актива в архиве свечей (candles/60/EURUSD_otc): по куску на день, через mmap
+        for times, closes in iter_days(path):
+            yield pd.DataFrame({'time': times, 'close': closes}, copy=False)
+    elif path.endswith('.parquet'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("❌ Для чтения Parquet нужен pyarrow: pip install pyarrow")
+        parquet = pq.ParquetFile(path)
+        columns = [c for c in ('asset', 'time', 'close') if c in parquet.schema_arrow.names]
+        for batch in parquet.iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(
+            path, chunksize=chunk_size,
+            usecols=lambda c: c in ('asset', 'time', 'close')
+        )
+
+
+def asset_from_path(path):
+    return os.path.basename(path).split('.')[0]
+
+
+def file_assets(path, chunk_size=200_000):
+    """Активы файла: первый проход по колонке asset (без нее — один актив по имени файла)"""
+    assets = {}
+    for chunk in read_chunks(path, chunk_size):
+        if 'asset' not in chunk.columns:
+            return [asset_from_path(path)]
+        assets.update(dict.fromkeys(chunk['asset'].unique()))
+    return list(assets)
+
+
+def split_tasks(paths, workers, chunk_size=200_000):
+    """Задачи пула (файл, активы или None — все активы файла).
+
+    Файл с колонкой asset делится на группы активов по числу процессов:
+    каждая задача читает файл сама и пропускает чужие активы.
+    """
+    tasks = []
+    for path in paths:
+        assets = file_assets(path, chunk_size) if workers > 1 else []
+        if len(assets) > 1:
+            tasks.extend((path, assets[i::workers]) for i in range(min(workers, len(assets))))
+        else:
+            tasks.append((path, None))
+    return tasks
+
+
+def select_assets(chunk, assets):
+    """Строки куска только выбранных активов (assets=None — все)"""
+    if assets is None or 'asset' not in chunk.columns:
+        return chunk
+    return chunk[chunk['asset'].isin(assets)]
+
+
+# ==================== ПРОГОН ====================
+class AssetReplay:
+    """Прогон одного актива по кускам с переносом состояния между ними.
+
+    Между кусками хранятся только последние period цен (или RsiState для
+    Уайлдера) и еще не истекшие сигналы, поэтому память ограничена.
+    """
+
+    def __init__(self, asset, generator, expiry_candles):
+        self.asset = asset
+        self.generator = generator
+        self.expiry_candles = expiry_candles
+        self.period, self.lower, self.upper, self.min_confidence = generator.params(asset)
+        self.tail = np.empty(0)
+        self.rsi_state = RsiState(self.period, wilder=True) if generator.wilder else None
+        self.seen = 0
+        # Незакрытые сигналы: глобальный индекс экспирации, направление, цена входа
+        self.pending_due = np.empty(0, dtype=np.int64)
+        self.pending_dir = np.empty(0, dtype=np.int64)
+        self.pending_entry = np.empty(0)
+        self.stats = {'signals': 0, 'wins': 0, 'losses': 0, 'draws': 0, 'candles': 0}
+
+    def _rsi(self, closes):
+        if self.rsi_state is not None:
+            return np.array([
+                v if v is not None else np.nan for v in map(self.rsi_state.update, closes)
+            ])
+        full = np.concatenate([self.tail, closes])
+        rsi = self.generator.calculate_rsi(pd.Series(full), self.period)
+        if rsi is None:
+            return np.full(len(closes), np.nan)
+        return rsi.to_numpy()[len(self.tail):]
+
+    def _score(self, direction, entry, exit_price):
+        move = np.sign(exit_price - entry) * direction
+        self.stats['wins'] += int((move > 0).sum())
+        self.stats['losses'] += int((move < 0).sum())
+        self.stats['draws'] += int((move == 0).sum())
+
+    def feed(self, closes):
+        closes = np.asarray(closes, dtype=np.float64)
+        n = len(closes)
+        base = self.seen
+
+        # Закрываем сигналы из прошлых кусков, экспирация которых наступила
+        if len(self.pending_due):
+            ready = self.pending_due - base < n
+            self._score(self.pending_dir[ready], self.pending_entry[ready],
+                        closes[self.pending_due[ready] - base])
+            self.pending_due = self.pending_due[~ready]
+            self.pending_dir = self.pending_dir[~ready]
+            self.pending_entry = self.pending_entry[~ready]
+
+        direction, _ = self.generator.classify(
+            self._rsi(closes), self.lower, self.upper, self.min_confidence
+        )
+        direction[:max(0, MIN_CANDLES - 1 - base)] = 0
+        idx = np.flatnonzero(direction)
+        self.stats['signals'] += len(idx)
+
+        exit_idx = idx + self.expiry_candles
+        inside = exit_idx < n
+        self._score(direction[idx[inside]], closes[idx[inside]], closes[exit_idx[inside]])
+        outside = idx[~inside]
+        self.pending_due = np.concatenate([self.pending_due, outside + base + self.expiry_candles])
+        self.pending_dir = np.concatenate([self.pending_dir, direction[outside]])
+        self.pending_entry = np.concatenate([self.pending_entry, closes[outside]])
+
+        period = self.period
+        self.tail = closes[-period:] if n >= period else np.concatenate([self.tail, closes])[-period:]
+        self.seen += n
+        self.stats['candles'] += n
+
+
+def backtest_file(path, expiry=60, timeframe=60, chunk_size=200_000, rsi_period=14, wilder=False,
+                  params=None, assets=None):
+    """Бэктест одного файла (только assets, если заданы). Возвращает {asset: статистика}"""
+    logging.getLogger().setLevel(logging.WARNING)
+    generator = SignalGenerator(rsi_period=rsi_period, wilder=wilder)
+    if params:
+        generator.load_params(params)
+    expiry_candles = max(1, expiry // timeframe)
+    replays = {}
+
+    for chunk in read_chunks(path, chunk_size):
+        chunk = select_assets(chunk, assets)
+        if 'asset' in chunk.columns:
+            groups = chunk.groupby('asset', sort=False)
+        else:
+            groups = [(asset_from_path(path), chunk)]
+        for asset, frame in groups:
+            replay = replays.get(asset)
+            if replay is None:
+                replay = replays[asset] = AssetReplay(asset, generator, expiry_candles)
+            replay.feed(frame['close'].to_numpy())
+
+    return {asset: replay.stats for asset, replay in replays.items()}
+
+
+# ==================== ОТЧЕТ ====================
+def win_rate(stats):
+    resolved = stats['wins'] + stats['losses']
+    return 100.0 * stats['wins'] / resolved if resolved else 0.0
+
+
+def print_report(results):
+    total = {'signals': 0, 'wins': 0, 'losses': 0, 'draws': 0, 'candles': 0}
+    print(f"{'Актив':<16}{'Свечей':>12}{'Сигналов':>10}{'Побед':>8}{'Пораж.':>8}{'Ничьих':>8}{'Win %':>8}")
+    for asset in sorted(results):
+        stats = results[asset]
+        for key in total:
+            total[key] += stats[key]
+        print(f"{asset:<16}{stats['candles']:>12}{stats['signals']:>10}{stats['wins']:>8}"
+              f"{stats['losses']:>8}{stats['draws']:>8}{win_rate(stats):>8.1f}")
+    print('-' * 70)
+    print(f"{'ИТОГО':<16}{total['candles']:>12}{total['signals']:>10}{total['wins']:>8}"
+          f"{total['losses']:>8}{total['draws']:>8}{win_rate(total):>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бэктест сигналов по записанным свечам")
+    parser.add_argument('files', nargs='+',
+                        help="CSV/Parquet файлы со свечами (time, close[, asset]) или каталоги актива в архиве")
+    parser.add_argument('--expiry', type=int, default=60, help="Экспирация сигнала, секунд")
+    parser.add_argument('--timeframe', type=int, default=60, help="Таймфрейм свечей, секунд")
+    parser.add_argument('--chunk-size', type=int, default=200_000, help="Свечей в одном куске чтения")
+    parser.add_argument('--period', type=int, default=14, help="Период RSI")
+    parser.add_argument('--wilder', action='store_true', help="Сглаживание RSI по Уайлдеру")
+    parser.add_argument('--params', help="JSON с параметрами по активам (результат optimizer.py)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="Процессов в пуле (делят между собой файлы и активы внутри файла)")
+    parser.add_argument('--json', help="Сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    options = dict(expiry=args.expiry, timeframe=args.timeframe, chunk_size=args.chunk_size,
+                   rsi_period=args.period, wilder=args.wilder, params=args.params)
+    results = {}
+    tasks = split_tasks(args.files, args.workers, args.chunk_size)
+    if args.workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            futures = [pool.submit(backtest_file, path, assets=assets, **options) for path, assets in tasks]
+            for future in futures:
+                results.update(future.result())
+    else:
+        for path in args.files:
+            results.update(backtest_file(path, **options))
+
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
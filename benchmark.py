@@ -0,0 +1,245 @@
+"""Нагрузочный бенчмарк: симулятор Pocket Option -> анализ -> заглушка Telegram.
+
+Для каждого числа активов меряет загрузку истории (свечей/с), поток тиков
+(тиков/с), длительность цикла анализа, а для каждого числа подписчиков —
+задержку от сигнала до получения сообщения (p50/p99). Все данные локальные
+и детерминированные, поэтому результаты сравнимы между запусками.
+
+В рассылку идут --signals сигналов: сначала настоящие сигналы цикла анализа,
+а если спокойный рынок дал меньше, остальные дописываются синтетическими.
+Их число выводится отдельно (signals_real / signals_synthetic).
+
+Пример:
+    python benchmark.py --assets 10 100 1000 --subscribers 10 100 --json bench.json
+    python benchmark.py --baseline bench.json   # сравнение с прошлым прогоном
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+import numpy as np
+from telegram import Bot
+
+from bot import PocketOptionClient, SignalGenerator
+from candle_store import CandleStore
+from delivery import GLOBAL_RATE, SignalDelivery
+from fake_telegram import FakeTelegramAPI
+from simulator import MarketSimulator, SimulatorServer
+
+BENCH_SSID = '42["auth",{"session":"benchmark","isDemo":1}]'
+
+# Больше — лучше; для остальных метрик лучше меньше
+HIGHER_IS_BETTER = ('history_candles_per_s', 'stream_ticks_per_s')
+# Счетчики, а не метрики производительности: в сравнении с прошлым прогоном не участвуют
+COUNTS = ('signals_real', 'signals_synthetic')
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if len(values) else float('nan')
+
+
+# ==================== ЭТАПЫ ====================
+async def bench_feed(assets, seconds, speed, capacity, timeframe, seed):
+    """Загрузка истории и поток тиков через настоящий PocketOptionClient"""
+    simulator = MarketSimulator(assets=assets, seed=seed, speed=speed)
+    server = SimulatorServer(simulator, port=0)
+    await server.start()
+    client = PocketOptionClient(BENCH_SSID, url=server.url, request_timeout=60)
+    store = CandleStore(capacity=capacity, timeframe=timeframe)
+    ticks = 0
+
+    def on_stream(payload):
+        nonlocal ticks
+        ticks += len(payload)
+        store.on_stream(payload)
+
+    client.on('updateStream', on_stream)
+    try:
+        if not await client.connect():
+            raise SystemExit("❌ Не удалось подключиться к симулятору")
+        start = time.perf_counter()
+        all_candles = await asyncio.gather(
+            *(client.get_candles(asset, timeframe, capacity) for asset in client.assets_list)
+        )
+        for asset, candles in zip(client.assets_list, all_candles):
+            store.seed(asset, candles)
+        history_time = time.perf_counter() - start
+        history = sum(len(c or ()) for c in all_candles)
+
+        for asset in client.assets_list:
+            await client.subscribe_asset(asset, timeframe)
+        await asyncio.sleep(0.5)
+        ticks = 0
+        start = time.perf_counter()
+        await asyncio.sleep(seconds)
+        stream_time = time.perf_counter() - start
+        return store, {
+            'history_candles_per_s': history / history_time,
+            'stream_ticks_per_s': ticks / stream_time,
+        }
+    finally:
+        await client.close()
+        await server.stop()
+
+
+def bench_scan(store, cycles):
+    """Цикл анализа по закрытым свечам всех активов, как в MarketScanner.scan_once"""
+    generator = SignalGenerator()
+    times, signals = [], []
+    for _ in range(cycles):
+        boundary = max(buf.last_time for buf in store.buffers.values())
+        start = time.perf_counter()
+        found = generator.analyze_many({asset: buf.closed(boundary) for asset, buf in store.buffers.items()})
+        times.append(time.perf_counter() - start)
+        signals = found
+    return signals, {
+        'scan_cycle_p50_ms': percentile(times, 50) * 1000,
+        'scan_cycle_p99_ms': percentile(times, 99) * 1000,
+        'signals_real': len(signals),
+    }
+
+
+def delivery_signals(signals, store, count):
+    """count сигналов для замера доставки: настоящие, затем синтетические"""
+    generator = SignalGenerator()
+    signals = list(signals[:count])
+    real = len(signals)
+    buffers = list(store.buffers.items())
+    # Спокойный рынок мог не дать сигналов: добиваем по кругу заведомо сработавшим RSI
+    for i in range(count - real):
+        asset, buf = buffers[i % len(buffers)]
+        signals.append(generator.make_signal(asset, generator.lower - 10, float(buf.closes(1)[0])))
+    return signals, {'signals_synthetic': len(signals) - real}
+
+
+async def bench_delivery(signals, subscribers, global_rate, timeout):
+    """Задержка от постановки сигнала в очередь до получения сообщения заглушкой"""
+    api = FakeTelegramAPI(port=0)
+    await api.start()
+    bot = Bot('0:benchmark', base_url=api.base_url)
+    delivery = SignalDelivery(bot, global_rate=global_rate)
+    await bot.initialize()
+    delivery.start()
+    try:
+        chat_ids = list(range(1, subscribers + 1))
+        sent_at = {}
+        for i, signal in enumerate(signals):
+            text = f"#{i} {signal['asset']} {signal['direction']} {signal['confidence']}%"
+            sent_at[text] = time.monotonic()
+            delivery.broadcast(text, chat_ids, parse_mode=None)
+            # Сигналы приходят на закрытии свечей, а не одной пачкой
+            await asyncio.sleep(0.05)
+        expected = len(signals) * subscribers
+        deadline = time.monotonic() + timeout
+        while len(api.messages) < expected and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        latencies = [received - sent_at[text] for _, text, received in api.messages]
+        return {
+            'delivered': len(api.messages),
+            'expected': expected,
+            'delivery_p50_s': percentile(latencies, 50),
+            'delivery_p99_s': percentile(latencies, 99),
+        }
+    finally:
+        await delivery.stop()
+        await bot.shutdown()
+        await api.stop()
+
+
+async def run(args):
+    results = []
+    for assets in args.assets:
+        store, feed = await bench_feed(assets, args.seconds, args.speed, args.capacity,
+                                       args.timeframe, args.seed)
+        signals, scan = bench_scan(store, args.cycles)
+        signals, padding = delivery_signals(signals, store, args.signals)
+        for subscribers in args.subscribers:
+            delivery = await bench_delivery(signals, subscribers, args.global_rate, args.timeout)
+            row = {'assets': assets, 'subscribers': subscribers, **feed, **scan, **padding, **delivery}
+            results.append(row)
+            print_row(row)
+    return results
+
+
+# ==================== ОТЧЕТ ====================
+COLUMNS = (
+    ('assets', 'активов', '{:>8}'),
+    ('subscribers', 'подписч.', '{:>8}'),
+    ('history_candles_per_s', 'свечей/с', '{:>10.0f}'),
+    ('stream_ticks_per_s', 'тиков/с', '{:>9.0f}'),
+    ('scan_cycle_p50_ms', 'цикл p50 мс', '{:>11.2f}'),
+    ('scan_cycle_p99_ms', 'цикл p99 мс', '{:>11.2f}'),
+    ('signals_real', 'сигналов', '{:>8}'),
+    ('signals_synthetic', 'синтет.', '{:>7}'),
+    ('delivery_p50_s', 'доставка p50 с', '{:>14.3f}'),
+    ('delivery_p99_s', 'доставка p99 с', '{:>14.3f}'),
+)
+
+
+def print_header():
+    print(' '.join(f"{title:>{len(fmt.format(0))}}" for _, title, fmt in COLUMNS))
+
+
+def print_row(row):
+    print(' '.join(fmt.format(row[key]) for key, _, fmt in COLUMNS)
+          + ('' if row['delivered'] == row['expected'] else f"  ⚠️ доставлено {row['delivered']}/{row['expected']}"))
+
+
+def compare(results, baseline, tolerance):
+    """Сравнение с прошлым прогоном; возвращает число регрессий больше tolerance"""
+    previous = {(r['assets'], r['subscribers']): r for r in baseline}
+    regressions = 0
+    for row in results:
+        old = previous.get((row['assets'], row['subscribers']))
+        if old is None:
+            continue
+        for key, title, _ in COLUMNS[2:]:
+            if key in COUNTS or not old.get(key):
+                continue
+            change = (row[key] - old[key]) / old[key]
+            worse = -change if key in HIGHER_IS_BETTER else change
+            if worse > tolerance:
+                regressions += 1
+                print(f"📉 {row['assets']}×{row['subscribers']} {title}: "
+                      f"{old[key]:.4g} -> {row[key]:.4g} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный бенчмарк конвейера сигналов")
+    parser.add_argument('--assets', type=int, nargs='+', default=[10, 100, 500], help="Число активов")
+    parser.add_argument('--subscribers', type=int, nargs='+', default=[10, 100], help="Число подписчиков")
+    parser.add_argument('--seconds', type=float, default=5, help="Длительность замера потока")
+    parser.add_argument('--speed', type=float, default=10, help="Ускорение времени симулятора")
+    parser.add_argument('--capacity', type=int, default=200, help="Свечей истории на актив")
+    parser.add_argument('--timeframe', type=int, default=60)
+    parser.add_argument('--cycles', type=int, default=20, help="Циклов анализа для замера")
+    parser.add_argument('--signals', type=int, default=5,
+                        help="Сигналов на рассылку (недостающие до N дописываются синтетическими)")
+    parser.add_argument('--global-rate', type=float, default=GLOBAL_RATE,
+                        help="Лимит сообщений в секунду (по умолчанию как у Telegram)")
+    parser.add_argument('--timeout', type=float, default=300, help="Сколько ждать доставки")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help="Сохранить результаты в JSON")
+    parser.add_argument('--baseline', help="JSON прошлого прогона для сравнения")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Допустимое ухудшение (доля)")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    print_header()
+    results = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            raise SystemExit(f"❌ Регрессий: {regressions}")
+        print("✅ Регрессий нет")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,11 +4,26 @@ import asyncio
 import json
 import time
 import random
+import re
 import socket
-import ssl
 from datetime import datetime
-import pandas as pd
-import websocket
+from signal import SIGINT, SIGTERM
+import numpy as np
+import websockets
+from candle_archive import create_candle_archive
+from candle_store import CandleBuffer, CandleStore, CandleView
+from indicators import RsiState, rsi_matrix
+from delivery import SignalDelivery
+from storage import create_storage
+from strategies import STRATEGIES, SeriesContext
+import metrics
+from keep_alive import keep_alive
+from messages import SignalRenderer
+from scheduler import ScanScheduler, timeframes_from_env
+from sharding import ShardPool
+from signal_cache import OutcomeStats, create_outcome_tracker, create_signal_cache
+from watchlists import DIRECTIONS, MODES, Watch, WatchlistIndex
+from webhook import WebhookServer, webhook_secret
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes
 
@@ -19,72 +34,216 @@ logging.basicConfig(
 )
 
 # ==================== POCKET OPTION WEBSOCKET ====================
+POCKET_WS_URL = "wss://ws.pocketoption.com/socket.io/?EIO=4&transport=websocket"
+
+# События, которыми сервер отвечает на наши запросы (если не использует ack)
+RESPONSE_EVENTS = {
+    'getCandles': ('getCandles', 'candles', 'loadHistoryPeriod'),
+    'getAssets': ('getAssets', 'assets', 'updateAssets'),
+}
+
+
 class PocketOptionClient:
-    def __init__(self, ssid):
+    def __init__(self, ssid, url=None, request_timeout=10):
         self.ssid = ssid
+        self.url = url or os.getenv('POCKET_WS_URL', POCKET_WS_URL)
+        self.request_timeout = request_timeout
+        # Время (monotonic) последнего кадра, последних данных, нашего ping и pong на него
+        self.last_message_at = 0.0
+        self.last_data_at = 0.0
+        self.last_ping_at = 0.0
+        self.last_pong_at = 0.0
         self.ws = None
         self.connected = False
         self.balance = 0
         self.assets_list = []
-        
-    def connect(self):
+        self._reader_task = None
+        self._ack_id = 0
+        # ack id -> future, и очередь ожидающих ответа по имени запроса
+        self._pending_acks = {}
+        self._pending_events = {}
+        self._authorized = None
+        # Подписчики на потоковые события (updateStream и т.п.)
+        self._listeners = {}
+
+    async def connect(self):
         """Подключение к Pocket Option через WebSocket"""
         try:
             # Извлекаем session из SSID
-            import re
             match = re.search(r'"session":"([^"]+)"', self.ssid)
             if not match:
                 logging.error("❌ Не удалось извлечь session из SSID")
                 return False
-            
+
             session = match.group(1)
             logging.info(f"✅ Session извлечена: {session[:30]}...")
-            
-            # Настройки WebSocket с правильными DNS
-            ws_url = "wss://ws.pocketoption.com/socket.io/?EIO=4&transport=websocket"
-            
-            # Создаем WebSocket с правильными параметрами
-            self.ws = websocket.WebSocket()
-            self.ws.connect(
-                ws_url,
-                timeout=30,
-                skip_utf8_validation=False,
-                enable_multithread=True
-            )
-            
-            # Отправляем auth сообщение
+
+            self.ws = await websockets.connect(self.url, open_timeout=30, ping_interval=None, max_size=None)
+            self._authorized = asyncio.Event()
+            self._reader_task = asyncio.create_task(self._reader())
+
+            # Подключаемся к namespace socket.io и отправляем auth сообщение
+            await self.ws.send('40')
             auth_msg = f'42["auth",{{"session":"{session}","isDemo":1,"uid":12345678,"platform":2}}]'
-            self.ws.send(auth_msg)
-            
-            # Получаем ответ
-            response = self.ws.recv()
-            logging.info(f"📡 Ответ от сервера: {response[:100]}")
-            
-            # Отправляем ping для поддержания соединения
-            self.ws.send('2')
-            
+            await self.ws.send(auth_msg)
+
+            # Ждем ответ на авторизацию вместо фиксированной паузы
+            try:
+                await asyncio.wait_for(self._authorized.wait(), self.request_timeout)
+            except asyncio.TimeoutError:
+                logging.warning("⚠️ Сервер не подтвердил авторизацию, продолжаем")
+
             self.connected = True
+            self.last_message_at = self.last_data_at = time.monotonic()
+            self.last_ping_at = self.last_pong_at = 0.0
             logging.info("✅ Подключено к Pocket Option (WebSocket)")
-            
+
             # Получаем список активов
-            self.get_assets()
+            await self.get_assets()
             return True
-            
+
         except Exception as e:
             logging.error(f"❌ Ошибка подключения: {e}")
+            await self.close()
             return False
-    
-    def get_assets(self):
+
+    async def close(self):
+        """Закрытие соединения и отмена ожидающих запросов"""
+        self.connected = False
+        if self._reader_task and self._reader_task is not asyncio.current_task():
+            self._reader_task.cancel()
+        self._reader_task = None
+        if self.ws:
+            try:
+                await self.ws.close()
+            except Exception:
+                pass
+        self.ws = None
+        self._fail_pending(ConnectionError("соединение закрыто"))
+
+    def _fail_pending(self, exc):
+        for future in self._pending_acks.values():
+            if not future.done():
+                future.set_exception(exc)
+        for waiters in self._pending_events.values():
+            for _, future in waiters:
+                if not future.done():
+                    future.set_exception(exc)
+        self._pending_acks.clear()
+        self._pending_events.clear()
+
+    async def _reader(self):
+        """Фоновое чтение сокета и разбор входящих кадров socket.io"""
+        try:
+            async for frame in self.ws:
+                if isinstance(frame, bytes):
+                    frame = frame.decode('utf-8', errors='ignore')
+                try:
+                    await self._handle_frame(frame)
+                except Exception as e:
+                    logging.error(f"❌ Ошибка обработки кадра: {e}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"❌ Чтение WebSocket прервано: {e}")
+        finally:
+            self.connected = False
+            self._fail_pending(ConnectionError("соединение потеряно"))
+
+    async def _handle_frame(self, frame):
+        now = time.monotonic()
+        self.last_message_at = now
+        if frame == '2':
+            # Engine.IO ping от сервера
+            await self.ws.send('3')
+            return
+        if frame == '3':
+            self.last_pong_at = now
+            return
+        if frame.startswith('42') or frame.startswith('43'):
+            self.last_data_at = now
+        if frame.startswith('43'):
+            # Ответ на запрос с ack id: 43<id>[...]
+            match = re.match(r'43(\d+)(.*)', frame, re.S)
+            if match:
+                future = self._pending_acks.pop(int(match.group(1)), None)
+                if future and not future.done():
+                    data = json.loads(match.group(2))
+                    future.set_result(data[0] if len(data) == 1 else data)
+            return
+        if frame.startswith('42'):
+            data = json.loads(frame[2:])
+            if isinstance(data, list) and data:
+                self._dispatch(data[0], data[1] if len(data) > 1 else None)
+
+    def on(self, event, callback):
+        """Подписка на входящее событие сокета"""
+        self._listeners.setdefault(event, []).append(callback)
+
+    def _dispatch(self, event, payload):
+        """Передача события слушателям и ожидающему запросу"""
+        # Любое событие после auth означает, что сервер нас принял
+        self._authorized.set()
+
+        for callback in self._listeners.get(event, ()):
+            try:
+                callback(payload)
+            except Exception as e:
+                logging.error(f"❌ Ошибка обработчика {event}: {e}")
+
+        for request, events in RESPONSE_EVENTS.items():
+            if event not in events:
+                continue
+            waiters = self._pending_events.get(request)
+            if not waiters:
+                return
+            asset = payload.get('asset') if isinstance(payload, dict) else None
+            # Ответ отдается запросу с тем же активом (запросам без ключа подходит любой)
+            match = next((i for i, (key, _) in enumerate(waiters) if key is None or key == asset), None)
+            if match is None and asset is None and len(waiters) == 1:
+                # Ответ без актива однозначен, только если запрос один: ответы
+                # на параллельные getCandles приходят в любом порядке
+                match = 0
+            if match is None:
+                logging.warning(f"⚠️ Ответ {event} не сопоставлен запросу "
+                                f"(ожидают {len(waiters)}), пропущен")
+                return
+            _, future = waiters.pop(match)
+            if not future.done():
+                future.set_result(payload)
+            return
+
+    async def _request(self, event, payload, key=None):
+        """Отправка запроса и ожидание ответа на него"""
+        if not self.ws:
+            raise ConnectionError("нет подключения к WebSocket")
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._ack_id += 1
+        ack_id = self._ack_id
+        self._pending_acks[ack_id] = future
+        self._pending_events.setdefault(event, []).append((key, future))
+        try:
+            await self.ws.send(f'42{ack_id}' + json.dumps([event, payload], separators=(',', ':')))
+            return await asyncio.wait_for(asyncio.shield(future), self.request_timeout)
+        finally:
+            self._pending_acks.pop(ack_id, None)
+            waiters = self._pending_events.get(event)
+            if waiters:
+                waiters[:] = [w for w in waiters if w[1] is not future]
+
+    async def get_assets(self):
         """Получение списка доступных активов"""
         try:
-            # Отправляем запрос на получение активов
-            self.ws.send('42["getAssets",{}]')
-            time.sleep(2)
-            
-            # Читаем ответ
-            response = self.ws.recv()
+            response = await self._request('getAssets', {})
             logging.info(f"📊 Получен список активов")
-            
+
+            assets = self._parse_assets(response)
+            if assets:
+                self.assets_list = assets
+                return True
+
             # Базовый список активов на всякий случай
             self.assets_list = [
                 "EURUSD_otc", "GBPUSD_otc", "USDJPY_otc",
@@ -97,97 +256,291 @@ class PocketOptionClient:
             # Возвращаем базовый список
             self.assets_list = ["EURUSD_otc", "GBPUSD_otc", "USDJPY_otc", "BTCUSD_otc"]
             return False
-    
-    def get_candles(self, asset, timeframe=60, count=100):
+
+    @staticmethod
+    def _parse_assets(response):
+        if isinstance(response, dict):
+            response = response.get('assets')
+        if not isinstance(response, list):
+            return []
+        assets = []
+        for item in response:
+            if isinstance(item, str):
+                assets.append(item)
+            elif isinstance(item, dict) and item.get('symbol'):
+                assets.append(item['symbol'])
+            elif isinstance(item, list) and len(item) > 1 and isinstance(item[1], str):
+                assets.append(item[1])
+        return assets
+
+    @staticmethod
+    def _parse_candles(response):
+        if isinstance(response, dict):
+            response = response.get('candles', response.get('data'))
+        if not isinstance(response, list):
+            return []
+        candles = []
+        for c in response:
+            if isinstance(c, dict) and 'close' in c:
+                candles.append({
+                    'close': float(c.get('close', 0)),
+                    'open': float(c.get('open', 0)),
+                    'high': float(c.get('high', 0)),
+                    'low': float(c.get('low', 0)),
+                    'time': c.get('time', 0)
+                })
+        return candles
+
+    async def subscribe_asset(self, asset, timeframe=60):
+        """Подписка на живой поток цен по активу"""
+        if not self.ws:
+            return False
+        try:
+            await self.ws.send('42' + json.dumps(["changeSymbol", {"asset": asset, "period": timeframe}]))
+            return True
+        except Exception as e:
+            logging.error(f"❌ Ошибка подписки на {asset}: {e}")
+            return False
+
+    async def get_candles(self, asset, timeframe=60, count=100):
         """Получение реальных свечей через WebSocket"""
         try:
             if not self.connected or not self.ws:
                 logging.warning("⚠️ Нет подключения к WebSocket")
                 return None
-            
-            # Отправляем запрос на свечи
-            msg = f'42["getCandles",{{"asset":"{asset}","timeframe":{timeframe},"count":{count}}}]'
-            self.ws.send(msg)
-            
-            # Ждем ответ
-            time.sleep(3)
-            
-            # Получаем данные
-            response = self.ws.recv()
-            
-            # Парсим ответ
-            if response and response.startswith('42'):
-                try:
-                    data = json.loads(response[2:])
-                    if data and len(data) > 1 and isinstance(data[1], list):
-                        candles_data = data[1]
-                        
-                        # Преобразуем в формат pandas
-                        candles = []
-                        for c in candles_data:
-                            if isinstance(c, dict) and 'close' in c:
-                                candles.append({
-                                    'close': float(c.get('close', 0)),
-                                    'open': float(c.get('open', 0)),
-                                    'high': float(c.get('high', 0)),
-                                    'low': float(c.get('low', 0)),
-                                    'time': c.get('time', 0)
-                                })
-                        
-                        if candles:
-                            logging.info(f"✅ Получено {len(candles)} свечей для {asset}")
-                            return candles
-                except json.JSONDecodeError:
-                    pass
-            
-            # Если не получили реальные данные, возвращаем тестовые
-            return self._generate_test_candles(asset, count)
-            
+
+            # Отправляем запрос и ждем ответ именно на него
+            with metrics.CANDLE_FETCH_SECONDS.time():
+                response = await self._request(
+                    'getCandles',
+                    {"asset": asset, "timeframe": timeframe, "count": count},
+                    key=asset
+                )
+
+            candles = self._parse_candles(response)
+            if candles:
+                logging.info(f"✅ Получено {len(candles)} свечей для {asset}")
+                return candles
+
+            logging.warning(f"⚠️ Пустой ответ на запрос свечей для {asset}")
+            return None
+
         except Exception as e:
-            logging.error(f"❌ Ошибка получения свечей для {asset}: {e}")
-            return self._generate_test_candles(asset, count)
-    
-    def _generate_test_candles(self, asset, count):
-        """Генерация тестовых свечей для отладки"""
-        candles = []
-        base_price = 1.1000
-        if "BTC" in asset:
-            base_price = 50000
-        elif "JPY" in asset:
-            base_price = 150.0
-            
-        for i in range(count):
-            price = base_price + random.uniform(-base_price*0.01, base_price*0.01)
-            candles.append({
-                'close': price,
-                'open': price - random.uniform(-base_price*0.005, base_price*0.005),
-                'high': price + random.uniform(0, base_price*0.005),
-                'low': price - random.uniform(0, base_price*0.005),
-                'time': int(time.time()) - (count - i) * 60
-            })
-        return candles
-    
-    def ping(self):
+            logging.error(f"❌ Ошибка получения свечей для {asset}: {e!r}")
+            return None
+
+    async def ping(self):
         """Отправка ping для поддержания соединения"""
         try:
             if self.ws:
-                self.ws.send('2')
+                await self.ws.send('2')
+                self.last_ping_at = time.monotonic()
                 return True
-        except:
+        except Exception:
             return False
         return False
 
+# ==================== СУПЕРВИЗОР СОЕДИНЕНИЯ ====================
+class ConnectionSupervisor:
+    """Следит за соединением с Pocket Option и переподключается при сбоях.
+
+    Соединение считается мертвым, если reader завершился, сервер молчит
+    дольше heartbeat_timeout или не ответил на наш ping за pong_timeout
+    (если он вообще отвечает на ping), и зависшим, если нет данных дольше
+    stale_after.
+    Переподключение идет с экспоненциальной паузой и случайным разбросом,
+    после успеха вызывается on_connected (переподписка и догрузка свечей).
+    """
+
+    def __init__(self, client, on_connected=None, ping_interval=30, heartbeat_timeout=60,
+                 stale_after=120, check_interval=5, base_backoff=1, max_backoff=60, pong_timeout=10):
+        self.client = client
+        self.on_connected = on_connected
+        self.ping_interval = ping_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.pong_timeout = pong_timeout
+        self.stale_after = stale_after
+        self.check_interval = check_interval
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.reconnects = 0
+        self.downtime = 0.0
+        self.disconnected_since = time.monotonic()
+        self.running = False
+        self._attempt = 0
+        self._last_ping = 0.0
+        self._was_connected = False
+
+    @property
+    def connected(self):
+        return self.client.connected
+
+    @property
+    def healthy(self):
+        """Соединение живо и данные не устарели"""
+        return self.client.connected and self.problem() is None
+
+    def degraded(self):
+        """Одно соединение либо работает, либо нет; частичный отказ бывает только у ShardPool"""
+        return None
+
+    def feed_age(self):
+        """Сколько секунд назад пришли последние данные"""
+        if not self.client.last_data_at:
+            return None
+        return time.monotonic() - self.client.last_data_at
+
+    def total_downtime(self):
+        if self.disconnected_since is None:
+            return self.downtime
+        return self.downtime + time.monotonic() - self.disconnected_since
+
+    def problem(self):
+        """Причина, по которой соединение надо пересоздать, или None"""
+        if not self.client.connected:
+            return "соединение потеряно"
+        now = time.monotonic()
+        if now - self.client.last_message_at > self.heartbeat_timeout:
+            return f"нет heartbeat {now - self.client.last_message_at:.0f}с"
+        # Сокет, который еще принимает запись, но уже не читается: ping ушел, pong нет.
+        # Проверяем, только если сервер на этом соединении уже отвечал на ping
+        ping, pong = self.client.last_ping_at, self.client.last_pong_at
+        if pong and ping > pong and now - ping > self.pong_timeout:
+            return f"нет pong {now - ping:.0f}с"
+        if now - self.client.last_data_at > self.stale_after:
+            return f"нет данных {now - self.client.last_data_at:.0f}с"
+        return None
+
+    def _backoff(self):
+        delay = min(self.max_backoff, self.base_backoff * 2 ** self._attempt)
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _connect(self):
+        if await self.client.connect():
+            if self.disconnected_since is not None:
+                self.downtime += time.monotonic() - self.disconnected_since
+                self.disconnected_since = None
+            self._attempt = 0
+            # Считаем только удачные переподключения, а не каждую попытку
+            if self._was_connected:
+                self.reconnects += 1
+                metrics.RECONNECTS.inc()
+            self._was_connected = True
+            if self.on_connected:
+                try:
+                    await self.on_connected()
+                except Exception as e:
+                    logging.error(f"❌ Ошибка восстановления подписок: {e}")
+            return True
+        self._attempt += 1
+        return False
+
+    async def run(self):
+        self.running = True
+        first = True
+        while self.running:
+            try:
+                reason = self.problem()
+                if reason is None:
+                    if time.monotonic() - self._last_ping >= self.ping_interval:
+                        self._last_ping = time.monotonic()
+                        await self.client.ping()
+                    await asyncio.sleep(self.check_interval)
+                    continue
+
+                if self.disconnected_since is None:
+                    self.disconnected_since = time.monotonic()
+                if not first:
+                    logging.warning(f"⚠️ Pocket Option: {reason}, переподключение...")
+                    await self.client.close()
+                first = False
+
+                if not await self._connect():
+                    delay = self._backoff()
+                    logging.warning(f"🔁 Повторное подключение через {delay:.1f}с")
+                    await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"❌ Ошибка супервизора соединения: {e}")
+                await asyncio.sleep(self.check_interval)
+
+    async def stop(self):
+        self.running = False
+        await self.client.close()
+
 # ==================== ГЕНЕРАТОР СИГНАЛОВ ====================
 class SignalGenerator:
-    def __init__(self):
+    def __init__(self, rsi_period=14, wilder=False, lower=30, upper=70, min_confidence=60):
         self.assets = [
             "EURUSD_otc", "GBPUSD_otc", "USDJPY_otc",
             "AUDUSD_otc", "BTCUSD_otc", "ETHUSD_otc"
         ]
+        self.rsi_period = rsi_period
+        self.wilder = wilder
+        self.lower = lower
+        self.upper = upper
+        self.min_confidence = min_confidence
+        # Подобранные оптимизатором параметры по активам (перекрывают общие)
+        self.asset_params = {}
+        # Комбинированная стратегия вместо чистого RSI (None — только RSI)
+        self.strategy = None
+        # Последний RSI по активам из analyze_many (для гистерезиса SignalCache)
+        self.last_rsi = {}
+        # Состояние RSI Уайлдера по активам: (RsiState, время последней учтенной свечи, version буфера)
+        self.rsi_states = {}
         logging.info(f"📊 Отслеживаемые активы: {self.assets}")
 
+    def load_params(self, path):
+        """Загрузка параметров по активам из результата optimizer.py"""
+        with open(path) as f:
+            data = json.load(f)
+        for asset, best in data.items():
+            self.asset_params[asset] = {
+                'period': int(best['period']),
+                'lower': float(best['lower']),
+                'upper': float(best['upper']),
+                'min_confidence': float(best['min_confidence']),
+            }
+        logging.info(f"⚙️ Загружены параметры для {len(self.asset_params)} активов из {path}")
+
+    def set_strategy(self, strategy):
+        """Включение стратегии из strategies.STRATEGIES (по имени) или своей Strategy"""
+        if isinstance(strategy, str):
+            if strategy not in STRATEGIES:
+                raise ValueError(f"Неизвестная стратегия: {strategy}")
+            strategy = STRATEGIES[strategy]
+        self.strategy = strategy
+        logging.info(f"🧠 Стратегия: {', '.join(name for name, _, _ in strategy.rules)}")
+
+    def analyze_strategy(self, candles, asset):
+        """Анализ актива комбинированной стратегией (список свечей, CandleBuffer или CandleView)"""
+        if candles is None or len(candles) < 50:
+            return None
+        try:
+            if isinstance(candles, (CandleBuffer, CandleView)):
+                _, _, high, low, close = candles.arrays()
+            else:
+                close = [c['close'] for c in candles]
+                high = [c.get('high', c['close']) for c in candles]
+                low = [c.get('low', c['close']) for c in candles]
+            ctx = SeriesContext(close, high, low)
+            signal = self.strategy.evaluate(ctx, asset)
+            self.last_rsi[asset] = ctx.last('rsi', self.params(asset)[0])
+            return signal
+        except Exception as e:
+            logging.error(f"❌ Ошибка анализа {asset}: {e}")
+            return None
+
+    def params(self, asset):
+        """Параметры актива: (период RSI, нижний порог, верхний порог, мин. уверенность)"""
+        p = self.asset_params.get(asset)
+        if p is None:
+            return self.rsi_period, self.lower, self.upper, self.min_confidence
+        return p['period'], p['lower'], p['upper'], p['min_confidence']
+
     def calculate_rsi(self, prices, period=14):
-        """Расчет RSI индикатора"""
+        """Расчет RSI индикатора (эталонная векторная версия для проверки RsiState)"""
         if len(prices) < period + 1:
             return None
             
@@ -199,65 +552,406 @@ class SignalGenerator:
         return rsi
 
     def analyze_asset(self, candles, asset):
-        """Анализ актива и генерация сигнала"""
-        if candles is None or len(candles) < 50:
+        """Анализ актива и генерация сигнала (analyze_many для одного актива)"""
+        signals = self.analyze_many({asset: candles})
+        return signals[0] if signals else None
+
+    def wilder_rsi(self, asset, period, candles):
+        """RSI Уайлдера по закрытым свечам буфера с состоянием на актив.
+
+        RsiState продолжает считать с последней учтенной свечи, поэтому цикл
+        обходится O(1) на новую свечу. Если история буфера переписана (version),
+        учтенной свечи в окне уже нет или ее цена исправлена, состояние
+        пересчитывается по всему окну.
+        """
+        times, _, _, _, closes = candles.arrays()
+        entry = self.rsi_states.get(asset)
+        start = 0
+        if entry is not None and entry[0].period == period and entry[2] == candles.version:
+            state, last_time = entry[0], entry[1]
+            idx = int(np.searchsorted(times, last_time))
+            if idx < len(times) and times[idx] == last_time and closes[idx] == state.prev:
+                start = idx + 1
+        if not start:
+            state = RsiState(period, wilder=True)
+        for close in closes[start:]:
+            state.update(close)
+        self.rsi_states[asset] = (state, int(times[-1]), candles.version)
+        return state.value
+
+    def analyze_many(self, candles_by_asset):
+        """Пакетный анализ: RSI и пороги считаются для всех активов одной матрицей.
+
+        Принимает {asset: список свечей, CandleBuffer или CandleView} и возвращает список
+        сигналов в том же формате, что и analyze_asset.
+        """
+        if self.strategy is not None:
+            return [
+                signal for asset, candles in candles_by_asset.items()
+                if (signal := self.analyze_strategy(candles, asset))
+            ]
+
+        # Группируем по периоду RSI и длине окна, чтобы сложить ряды в одну матрицу
+        groups = {}
+        # RSI Уайлдера по буферам считается инкрементально: (активы, RSI, цены, пороги)
+        stateful = ([], [], [], [])
+        for asset, candles in candles_by_asset.items():
+            if candles is None or len(candles) < 50:
+                continue
+            period, lower, upper, min_confidence = self.params(asset)
+            if self.wilder and isinstance(candles, (CandleBuffer, CandleView)):
+                try:
+                    rsi = self.wilder_rsi(asset, period, candles)
+                except Exception as e:
+                    logging.error(f"❌ Ошибка анализа {asset}: {e}")
+                    continue
+                for column, value in zip(stateful, (asset, rsi, candles.closes(1)[0],
+                                                    (lower, upper, min_confidence))):
+                    column.append(value)
+                continue
+            if isinstance(candles, (CandleBuffer, CandleView)):
+                closes = candles.closes(None if self.wilder else period + 1)
+            else:
+                tail = candles if self.wilder else candles[-(period + 1):]
+                closes = [c['close'] for c in tail]
+            group = groups.setdefault((period, len(closes)), ([], [], []))
+            group[0].append(asset)
+            group[1].append(closes)
+            group[2].append((lower, upper, min_confidence))
+
+        signals = []
+        for (period, _), (assets, rows, thresholds) in groups.items():
+            try:
+                matrix = np.array(rows, dtype=np.float64)
+                rsi = rsi_matrix(matrix, period, self.wilder)
+                signals.extend(self._classify_signals(assets, rsi, matrix[:, -1], thresholds))
+            except Exception as e:
+                logging.error(f"❌ Ошибка пакетного анализа: {e}")
+        if stateful[0]:
+            assets, rsi, prices, thresholds = stateful
+            rsi = np.array([np.nan if v is None else v for v in rsi], dtype=np.float64)
+            signals.extend(self._classify_signals(assets, rsi, np.asarray(prices, dtype=np.float64), thresholds))
+        return signals
+
+    def _classify_signals(self, assets, rsi, prices, thresholds):
+        """Сигналы по RSI и ценам активов с их порогами"""
+        self.last_rsi.update(zip(assets, rsi.tolist()))
+        lower, upper, min_confidence = np.array(thresholds, dtype=np.float64).T
+        direction, confidence = self.classify(rsi, lower, upper, min_confidence)
+        signals = []
+        for i in np.flatnonzero(direction != 0):
+            signal = self.make_signal(assets[i], float(rsi[i]), float(prices[i]))
+            if signal:
+                signals.append(signal)
+        return signals
+
+    def classify(self, rsi, lower=None, upper=None, min_confidence=None):
+        """Векторная версия порогов make_signal: (направление, уверенность).
+
+        Направление 1 — CALL, -1 — PUT, 0 — нет сигнала. Пороги могут быть
+        массивами той же формы, что и rsi.
+        """
+        lower = self.lower if lower is None else lower
+        upper = self.upper if upper is None else upper
+        min_confidence = self.min_confidence if min_confidence is None else min_confidence
+
+        rsi = np.asarray(rsi, dtype=np.float64)
+        confidence = np.where(
+            rsi < lower, np.minimum(85, 100 - (lower - rsi)),
+            np.where(rsi > upper, np.minimum(85, 100 - (rsi - upper)), 0)
+        )
+        direction = np.where(rsi < lower, 1, np.where(rsi > upper, -1, 0))
+        direction = np.where(confidence > min_confidence, direction, 0)
+        return direction, confidence
+
+    def make_signal(self, asset, rsi, current_price):
+        """Сигнал по значению RSI или None"""
+        if rsi is None:
             return None
 
+        _, lower, upper, min_confidence = self.params(asset)
+        signal = None
+        confidence = 0
+
+        if rsi < lower:
+            signal = "CALL 📈"
+            confidence = min(85, 100 - (lower - rsi))
+            logging.info(f"🔍 {asset}: RSI={rsi:.1f} -> CALL")
+        elif rsi > upper:
+            signal = "PUT 📉"
+            confidence = min(85, 100 - (rsi - upper))
+            logging.info(f"🔍 {asset}: RSI={rsi:.1f} -> PUT")
+
+        if signal and confidence > min_confidence:
+            return {
+                'asset': asset,
+                'direction': signal,
+                'confidence': round(confidence, 1),
+                'rsi': round(rsi, 1),
+                'price': round(current_price, 5),
+                'time': datetime.now().strftime('%H:%M:%S'),
+                # Время по часам системы: сравнимо и в процессе бота, и в воркере шарда
+                'created_at': time.time(),
+            }
+        return None
+
+# ==================== СКАНЕР РЫНКА ====================
+class MarketScanner:
+    """Соединение с Pocket Option, живые свечи и анализ на закрытии свечей.
+
+    Используется ботом в однопроцессном режиме и каждым воркером шарда.
+    select_assets(universe) выбирает активы для очередного цикла, найденные
+    сигналы без повторов (signal_cache) передаются в on_signals(signals),
+    а их итоги на экспирации (outcomes) — в on_outcome(outcome). Закрытые
+    свечи пишутся в archive, из него же буферы заполняются при старте.
+    """
+
+    def __init__(self, ssid, signal_generator, candle_store, scheduler, on_signals,
+                 select_assets=None, client=None, signal_cache=None, outcomes=None, on_outcome=None,
+                 archive=None):
+        self.ssid = ssid
+        self.signal_generator = signal_generator
+        self.candle_store = candle_store
+        self.scheduler = scheduler
+        self.on_signals = on_signals
+        self.select_assets = select_assets or list
+        self.client = client or PocketOptionClient(ssid)
+        # Живые обновления цен попадают сразу в хранилище свечей
+        self.client.on('updateStream', self.candle_store.on_stream)
+        self.client.on('updateCandle', self.candle_store.on_candle)
+        self.signal_cache = signal_cache
+        self.outcomes = outcomes
+        self.on_outcome = on_outcome
+        self.archive = archive
+        self.supervisor = None
+        self.running = False
+        self.cycles = 0
+
+    async def fetch_candles(self, asset, count):
+        """Запрос свечей в пределах общего бюджета запросов к серверу"""
+        await self.scheduler.acquire()
+        return await self.client.get_candles(asset, self.candle_store.timeframe_of(asset), count)
+
+    async def seed_candles(self, assets):
+        """Загрузка истории свечей и подписка на поток по активам"""
+        if not assets or not self.client or not self.client.connected:
+            return
+        if self.archive is not None:
+            # Теплый старт: история из архива, с сервера догружается только пропуск
+            start = time.perf_counter()
+            warmed = self.archive.warm_start(self.candle_store, assets)
+            if warmed:
+                logging.info(f"♨️ Из архива загружено {len(warmed)} активов "
+                             f"за {(time.perf_counter() - start) * 1000:.0f} мс")
+            for asset in warmed:
+                await self.client.subscribe_asset(asset, self.candle_store.timeframe_of(asset))
+            warmed = set(warmed)
+            assets = [a for a in assets if a not in warmed]
+        all_candles = await asyncio.gather(
+            *(self.fetch_candles(asset, self.candle_store.capacity) for asset in assets)
+        )
+        for asset, candles in zip(assets, all_candles):
+            if candles:
+                self.candle_store.seed(asset, candles)
+                await self.client.subscribe_asset(asset, self.candle_store.timeframe_of(asset))
+
+    async def refresh_stale(self, assets, boundary):
+        """Догрузка последних свечей по активам, для которых поток не прислал закрытую свечу"""
+        stale = [
+            asset for asset in assets
+            if (buf := self.candle_store.get(asset)) is not None and len(buf)
+            and buf.last_time < boundary - buf.timeframe
+        ]
+        if not stale:
+            return
+        all_candles = await asyncio.gather(*(self.fetch_candles(asset, 3) for asset in stale))
+        for asset, candles in zip(stale, all_candles):
+            if candles:
+                self.candle_store.get(asset).merge(candles)
+
+    async def on_feed_connected(self):
+        """Вызывается после каждого (пере)подключения к Pocket Option"""
+        # Берем все OTC-активы, которые отдал сервер
+        otc_assets = [a for a in self.client.assets_list if a.endswith('_otc')]
+        if otc_assets:
+            self.signal_generator.assets = otc_assets
+            logging.info(f"📊 Активов в мониторинге: {len(otc_assets)}")
+
+        # После разрыва: переподписка на поток и догрузка пропущенных свечей
+        self.candle_store.mark_stale(time.time())
+        for asset in self.candle_store.buffers:
+            await self.client.subscribe_asset(asset, self.candle_store.timeframe_of(asset))
+
+    async def scan_once(self):
+        """Один цикл: подготовка свечей, сон до закрытия свечи, анализ"""
+        # Свечи нужны только по выбранным активам
+        assets = self.select_assets(self.signal_generator.assets)
+        ranked = self.scheduler.rank(assets, self.candle_store, self.signal_generator)
+
+        # История запрашивается один раз, дальше свечи приходят потоком.
+        # Все запросы идут через бюджет планировщика, самые срочные активы первыми
+        await self.seed_candles([a for a in ranked if a not in self.candle_store])
+        gaps = self.candle_store.gaps()
+        for asset in [a for a in ranked if a in gaps]:
+            await self.scheduler.acquire()
+            await self.candle_store.backfill(self.client, asset)
+
+        # Спим ровно до закрытия ближайшей свечи
+        boundary, closed = await self.scheduler.wait_next(assets)
+        cycle_start = time.perf_counter()
+        due_set = set(self.scheduler.due(assets, closed))
+        due = [a for a in ranked if a in due_set]
+        await self.refresh_stale(due, boundary)
+
+        # Анализируем только закрытые свечи всех активов одним пакетом
+        with metrics.ANALYZE_SECONDS.time():
+            signals = self.signal_generator.analyze_many({
+                asset: buf.closed(boundary)
+                for asset in due if (buf := self.candle_store.get(asset)) is not None
+            })
+        metrics.SCAN_CLOSE_LAG_SECONDS.observe(time.time() - boundary)
+
+        # Пока RSI не вышел из зоны сигнала, повтор не рассылается
+        if self.signal_cache is not None:
+            if self.signal_generator.strategy is None:
+                self.signal_cache.observe(self.signal_generator.last_rsi, self.signal_generator.params)
+            else:
+                # У стратегии свои условия входа, пороги RSI для гистерезиса к ней не подходят
+                self.signal_cache.observe_signals(due, signals)
+            signals = self.signal_cache.admit(signals)
+        if signals:
+            self.on_signals(signals)
+        self.archive_candles(due, boundary)
+
+        if self.outcomes is not None:
+            for signal in signals:
+                self.outcomes.track(signal, boundary, self.candle_store.timeframe_of(signal['asset']))
+            for outcome in self.outcomes.resolve(self.candle_store):
+                if self.on_outcome:
+                    self.on_outcome(outcome)
+
+        metrics.SCAN_CYCLE_SECONDS.observe(time.perf_counter() - cycle_start)
+        self.cycles += 1
+        logging.debug(f"🔄 Цикл сканирования #{self.cycles}: {len(due)} активов на закрытии {boundary}")
+
+    def archive_candles(self, assets, boundary):
+        """Запись новых закрытых свечей в архив"""
+        if self.archive is None:
+            return
+        for asset in assets:
+            buf = self.candle_store.get(asset)
+            # С дырой не пишем: архив только дописывается, пропуск сначала догрузит backfill
+            if buf is not None and not buf.missing:
+                try:
+                    metrics.CANDLES_ARCHIVED.inc(self.archive.record(asset, buf.closed(boundary)))
+                except OSError as e:
+                    logging.error(f"❌ Ошибка записи архива свечей {asset}: {e}")
+
+    async def run(self):
+        logging.info("🔄 Подключение к Pocket Option...")
+
+        # Супервизор держит соединение, пингует и переподключается при сбоях
+        self.supervisor = ConnectionSupervisor(self.client, on_connected=self.on_feed_connected)
+        supervisor_task = asyncio.create_task(self.supervisor.run())
+
+        self.running = True
         try:
-            df = pd.DataFrame(candles)
-            prices = df['close']
-            
-            rsi_series = self.calculate_rsi(prices)
-            if rsi_series is None or len(rsi_series) == 0:
-                return None
-                
-            rsi = rsi_series.iloc[-1]
-            current_price = prices.iloc[-1]
-
-            signal = None
-            confidence = 0
-
-            if rsi < 30:
-                signal = "CALL 📈"
-                confidence = min(85, 100 - (30 - rsi))
-                logging.info(f"🔍 {asset}: RSI={rsi:.1f} -> CALL")
-            elif rsi > 70:
-                signal = "PUT 📉"
-                confidence = min(85, 100 - (rsi - 70))
-                logging.info(f"🔍 {asset}: RSI={rsi:.1f} -> PUT")
-
-            if signal and confidence > 60:
-                return {
-                    'asset': asset,
-                    'direction': signal,
-                    'confidence': round(confidence, 1),
-                    'rsi': round(rsi, 1),
-                    'price': round(current_price, 5),
-                    'time': datetime.now().strftime('%H:%M:%S')
-                }
-            return None
-            
-        except Exception as e:
-            logging.error(f"❌ Ошибка анализа {asset}: {e}")
-            return None
+            while self.running:
+                try:
+                    if not self.supervisor.healthy:
+                        # Без живого потока не анализируем устаревшие свечи
+                        logging.warning(f"⏸ Нет данных от Pocket Option: {self.supervisor.problem()}")
+                        await asyncio.sleep(5)
+                        continue
+                    await self.scan_once()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logging.error(f"❌ Ошибка в цикле сканирования: {e}")
+                    await asyncio.sleep(10)
+        finally:
+            supervisor_task.cancel()
+            await self.supervisor.stop()
+            if self.archive is not None:
+                self.archive.close()
+
+    def stop(self):
+        self.running = False
+
+
+def create_signal_generator():
+    """Генератор сигналов с параметрами из SIGNAL_PARAMS и стратегией из STRATEGY"""
+    generator = SignalGenerator()
+    params_path = os.getenv('SIGNAL_PARAMS', 'signal_params.json')
+    if os.path.exists(params_path):
+        generator.load_params(params_path)
+    if os.getenv('STRATEGY'):
+        generator.set_strategy(os.getenv('STRATEGY'))
+    return generator
 
 # ==================== TELEGRAM БОТ ====================
+MODE_TITLES = {'instant': '⚡ Сразу', 'digest': '📦 Дайджест', 'pinned': '📌 Закреп'}
+
+
 class TelegramSignalBot:
     def __init__(self, token, ssid):
         self.token = token
         self.ssid = ssid
-        self.pocket_client = None
-        self.signal_generator = SignalGenerator()
+        self.signal_generator = create_signal_generator()
+        timeframe, asset_timeframes = timeframes_from_env()
+        self.outcome_stats = OutcomeStats()
+        # SCAN_WORKERS > 1: активы делятся между процессами-воркерами, у каждого
+        # свои соединение, свечи и архив, поэтому сканер здесь не создается
+        workers = int(os.getenv('SCAN_WORKERS', '1'))
+        if workers > 1:
+            self.scanner = None
+            self.shards = ShardPool(
+                ssid, workers, self.publish_signals, self.signal_generator, on_outcome=self.record_outcome
+            )
+        else:
+            self.shards = None
+            self.scanner = MarketScanner(
+                ssid, self.signal_generator,
+                CandleStore(capacity=200, timeframe=timeframe, timeframes=asset_timeframes),
+                ScanScheduler(timeframe, asset_timeframes),
+                on_signals=self.publish_signals, select_assets=self.watched_assets,
+                signal_cache=create_signal_cache(), outcomes=create_outcome_tracker(),
+                on_outcome=self.record_outcome, archive=create_candle_archive(timeframe, asset_timeframes)
+            )
         self.subscribers = set()
+        self.watchlists = WatchlistIndex()
+        self.storage = create_storage()
+        self.delivery = None
+        self.renderer = SignalRenderer()
+        # Сигналы для дайджестов копятся digest_delay секунд: в режиме шардов
+        # один цикл приходит несколькими пачками от разных воркеров
+        self.digest_delay = float(os.getenv('DIGEST_DELAY', '1'))
+        self.pending_digests = {}  # user_id -> сигналы текущего цикла
+        self.digest_handle = None
         self.is_scanning = False
-        self.ping_task = None
+        self.scan_task = None
+        # В режиме webhook реплик может быть несколько: сканирует только ведущая
+        self.webhook_url = os.getenv('WEBHOOK_URL')
+        self.replica_id = os.getenv('REPLICA_ID') or f"{socket.gethostname()}-{os.getpid()}"
+        self.is_leader = not self.webhook_url
+        self.setup_metrics()
         logging.info("🤖 Инициализация бота...")
 
+    @property
+    def pocket_client(self):
+        return self.scanner.client if self.scanner is not None else None
+
+    @property
+    def supervisor(self):
+        """Супервизор соединения или пул воркеров в режиме шардов (одинаковый интерфейс)"""
+        return self.shards if self.shards is not None else self.scanner.supervisor
+
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /start"""
         keyboard = [
             [InlineKeyboardButton("📊 Подписаться на сигналы", callback_data='subscribe')],
             [InlineKeyboardButton("🔍 Список активов", callback_data='assets')],
+            [InlineKeyboardButton("⭐ Мои активы", callback_data='watchlist')],
             [InlineKeyboardButton("📈 Статус", callback_data='status')],
             [InlineKeyboardButton("🛑 Отписаться", callback_data='unsubscribe')]
         ]
@@ -280,7 +974,7 @@ class TelegramSignalBot:
         user_id = query.from_user.id
 
         if query.data == 'subscribe':
-            self.subscribers.add(user_id)
+            self.add_subscriber(user_id)
             await query.edit_message_text(
                 "✅ *Ты подписан на сигналы!*\n\n"
                 "Я буду присылать уведомления, когда найду хорошие точки входа.\n"
@@ -289,150 +983,478 @@ class TelegramSignalBot:
             )
             logging.info(f"👤 Пользователь {user_id} подписался")
             
-            if not self.is_scanning:
-                self.is_scanning = True
-                asyncio.create_task(self.scan_and_send_signals())
+            self.start_scanning()
 
         elif query.data == 'assets':
-            assets_list = "\n".join([f"• `{asset}`" for asset in self.signal_generator.assets])
             await query.edit_message_text(
-                f"📊 *Отслеживаемые активы:*\n{assets_list}",
+                self.assets_text() + "\n\nНажми на актив, чтобы добавить его в «Мои активы»:",
+                reply_markup=self.assets_keyboard(user_id),
                 parse_mode='Markdown'
             )
 
-        elif query.data == 'status':
-            status_text = f"📊 *Статус бота:*\n"
-            status_text += f"👥 Подписчиков: {len(self.subscribers)}\n"
-            status_text += f"📈 Активов в мониторинге: {len(self.signal_generator.assets)}\n"
-            status_text += f"🔄 Статус: {'🟢 Активен' if self.is_scanning else '🔴 Остановлен'}"
-            
-            if self.pocket_client and self.pocket_client.connected:
-                status_text += f"\n✅ Подключено к Pocket Option"
+        elif query.data.startswith('assets:'):
+            # Листание страниц кнопок активов
+            page = int(query.data.partition(':')[2])
+            await query.edit_message_reply_markup(reply_markup=self.assets_keyboard(user_id, page))
+
+        elif query.data == 'watchlist':
+            await query.edit_message_text(
+                self.watchlist_text(user_id), reply_markup=self.watchlist_keyboard(user_id), parse_mode='Markdown'
+            )
+
+        elif query.data.startswith(('watch:', 'dir:', 'conf:', 'mode:')) or query.data == 'watch_all':
+            kind, _, value = query.data.partition(':')
+            page = 0
+            if kind == 'watch':
+                # watch:<страница>:<актив>
+                page, _, value = value.partition(':')
+                page = int(page)
+                self.watchlists.toggle(user_id, value)
+            elif kind == 'dir':
+                self.watchlists.set_directions(user_id, DIRECTIONS if value == 'ALL' else [value])
+            elif kind == 'conf':
+                self.watchlists.set_min_confidence(user_id, int(value))
+            elif kind == 'mode':
+                self.watchlists.set_mode(user_id, value)
+            else:
+                self.watchlists.watch_all(user_id)
+            self.save_watchlist(user_id)
+
+            if kind == 'watch':
+                await query.edit_message_reply_markup(reply_markup=self.assets_keyboard(user_id, page))
             else:
-                status_text += f"\n❌ Нет подключения к Pocket Option"
-                
-            await query.edit_message_text(status_text, parse_mode='Markdown')
+                await query.edit_message_text(
+                    self.watchlist_text(user_id), reply_markup=self.watchlist_keyboard(user_id), parse_mode='Markdown'
+                )
+
+        elif query.data == 'status':
+            await query.edit_message_text(self.status_text(), parse_mode='Markdown')
 
         elif query.data == 'unsubscribe':
             if user_id in self.subscribers:
-                self.subscribers.remove(user_id)
+                self.remove_subscriber(user_id)
                 await query.edit_message_text("🛑 *Ты отписался от сигналов*", parse_mode='Markdown')
                 logging.info(f"👤 Пользователь {user_id} отписался")
             else:
                 await query.edit_message_text("❌ Ты не был подписан")
 
+    def status_text(self):
+        """Текст статуса для /status и кнопки «Статус»"""
+        status_text = f"📊 *Статус бота:*\n"
+        status_text += f"👥 Подписчиков: {len(self.subscribers)}\n"
+        status_text += f"📈 Активов в мониторинге: {len(self.signal_generator.assets)}\n"
+        status_text += f"🔄 Статус: {'🟢 Активен' if self.is_scanning else '🔴 Остановлен'}"
+
+        if self.supervisor and self.supervisor.healthy:
+            status_text += f"\n✅ Подключено к Pocket Option"
+            if self.supervisor.degraded():
+                status_text += f"\n⚠️ Частичный сбой: {self.supervisor.degraded()}"
+        elif self.supervisor and self.supervisor.connected:
+            status_text += f"\n⚠️ Pocket Option: {self.supervisor.problem()}"
+        else:
+            status_text += f"\n❌ Нет подключения к Pocket Option"
+
+        if self.supervisor:
+            status_text += f"\n🔁 Переподключений: {self.supervisor.reconnects}"
+            status_text += f"\n⏱ Простой: {self.supervisor.total_downtime():.0f}с"
+        status_text += f"\n{self.outcome_stats.text()}"
+        if self.webhook_url:
+            status_text += f"\n🖥 Реплика {self.replica_id}: {'ведущая' if self.is_leader else 'резервная'}"
+        return status_text
+
     async def subscribe_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /subscribe"""
         user_id = update.effective_user.id
-        self.subscribers.add(user_id)
+        self.add_subscriber(user_id)
         await update.message.reply_text("✅ Ты подписан на сигналы! (команда)")
         logging.info(f"👤 Пользователь {user_id} подписался через команду")
         
-        if not self.is_scanning:
-            self.is_scanning = True
-            asyncio.create_task(self.scan_and_send_signals())
+        self.start_scanning()
 
     async def status_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /status"""
-        status_text = f"📊 *Статус бота:*\n"
-        status_text += f"👥 Подписчиков: {len(self.subscribers)}\n"
-        status_text += f"📈 Активов в мониторинге: {len(self.signal_generator.assets)}\n"
-        status_text += f"🔄 Статус: {'🟢 Активен' if self.is_scanning else '🔴 Остановлен'}"
-        
-        if self.pocket_client and self.pocket_client.connected:
-            status_text += f"\n✅ Подключено к Pocket Option"
-        else:
-            status_text += f"\n❌ Нет подключения к Pocket Option"
-            
-        await update.message.reply_text(status_text, parse_mode='Markdown')
+        await update.message.reply_text(self.status_text(), parse_mode='Markdown')
 
     async def assets_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /assets"""
-        assets_list = "\n".join([f"• `{asset}`" for asset in self.signal_generator.assets])
         await update.message.reply_text(
-            f"📊 *Отслеживаемые активы:*\n{assets_list}",
+            self.assets_text(),
+            reply_markup=self.assets_keyboard(update.effective_user.id),
             parse_mode='Markdown'
         )
 
-    def format_signal(self, signal):
-        """Форматирование сигнала"""
+    async def watchlist_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик команды /watchlist"""
+        user_id = update.effective_user.id
+        await update.message.reply_text(
+            self.watchlist_text(user_id), reply_markup=self.watchlist_keyboard(user_id), parse_mode='Markdown'
+        )
+
+    async def watch_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик команды /watch EURUSD_otc [GBPUSD_otc ...]"""
+        user_id = update.effective_user.id
+        known = set(self.signal_generator.assets)
+        added = [asset for asset in context.args if asset in known]
+        unknown = [asset for asset in context.args if asset not in known]
+        for asset in added:
+            self.watchlists.watch(user_id, asset)
+        if added:
+            self.save_watchlist(user_id)
+
+        text = f"⭐ Добавлено: {', '.join(added)}" if added else "Использование: /watch EURUSD_otc GBPUSD_otc"
+        if unknown:
+            text += f"\n❌ Неизвестные активы: {', '.join(unknown)}"
+        await update.message.reply_text(text)
+
+    async def unwatch_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик команды /unwatch EURUSD_otc [...]"""
+        user_id = update.effective_user.id
+        if not context.args:
+            await update.message.reply_text("Использование: /unwatch EURUSD_otc")
+            return
+        for asset in context.args:
+            watch = self.watchlists.unwatch(user_id, asset)
+        self.save_watchlist(user_id)
+        text = f"🗑 Убрано: {', '.join(context.args)}"
+        if watch.assets is not None and not watch.assets:
+            text += "\n⚠️ Список активов пуст — сигналы приходить не будут. Добавь актив через /watch " \
+                    "или выбери «Все активы» в /watchlist"
+        await update.message.reply_text(text)
+
+    async def direction_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик команды /direction CALL|PUT|ALL"""
+        user_id = update.effective_user.id
+        value = context.args[0].upper() if context.args else ''
+        if value not in ('CALL', 'PUT', 'ALL'):
+            await update.message.reply_text("Использование: /direction CALL | PUT | ALL")
+            return
+        self.watchlists.set_directions(user_id, DIRECTIONS if value == 'ALL' else [value])
+        self.save_watchlist(user_id)
+        await update.message.reply_text(f"✅ Направления: {value}")
+
+    async def minconf_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик команды /minconf 70"""
+        user_id = update.effective_user.id
+        try:
+            value = float(context.args[0])
+        except (IndexError, ValueError):
+            await update.message.reply_text("Использование: /minconf 70")
+            return
+        self.watchlists.set_min_confidence(user_id, value)
+        self.save_watchlist(user_id)
+        await update.message.reply_text(f"✅ Минимальная уверенность: {value:g}%")
+
+    async def mode_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик команды /mode instant|digest|pinned"""
+        user_id = update.effective_user.id
+        value = context.args[0].lower() if context.args else ''
+        if value not in MODES:
+            await update.message.reply_text("Использование: /mode instant | digest | pinned")
+            return
+        self.watchlists.set_mode(user_id, value)
+        self.save_watchlist(user_id)
+        await update.message.reply_text(f"✅ Режим доставки: {MODE_TITLES[value]}")
+
+    def assets_text(self, limit=100):
+        """Список активов в мониторинге (с ограничением длины сообщения)"""
+        assets = self.signal_generator.assets
+        assets_list = "\n".join([f"• `{asset}`" for asset in assets[:limit]])
+        if len(assets) > limit:
+            assets_list += f"\n…и еще {len(assets) - limit}"
+        return f"📊 *Отслеживаемые активы:*\n{assets_list}"
+
+    def assets_keyboard(self, user_id, page=0, per_page=40):
+        """Кнопки добавления/удаления активов в «Мои активы», по per_page на страницу"""
+        watched = self.watchlists.get(user_id).assets or set()
+        assets = self.signal_generator.assets
+        pages = max(1, -(-len(assets) // per_page))
+        page = min(max(page, 0), pages - 1)
+        buttons = [
+            InlineKeyboardButton(f"{'⭐ ' if asset in watched else ''}{asset}", callback_data=f'watch:{page}:{asset}')
+            for asset in assets[page * per_page:(page + 1) * per_page]
+        ]
+        rows = [buttons[i:i + 2] for i in range(0, len(buttons), 2)]
+        if pages > 1:
+            rows.append([
+                InlineKeyboardButton("◀️", callback_data=f'assets:{(page - 1) % pages}'),
+                InlineKeyboardButton(f"{page + 1}/{pages}", callback_data=f'assets:{page}'),
+                InlineKeyboardButton("▶️", callback_data=f'assets:{(page + 1) % pages}'),
+            ])
+        rows.append([InlineKeyboardButton("⭐ Мои активы", callback_data='watchlist')])
+        return InlineKeyboardMarkup(rows)
+
+    def watchlist_text(self, user_id):
+        watch = self.watchlists.get(user_id)
+        if watch.assets is None:
+            assets = "все"
+        elif watch.assets:
+            assets = ', '.join(f"`{a}`" for a in sorted(watch.assets))
+        else:
+            assets = "нет (сигналы не приходят)"
+        directions = ', '.join(sorted(watch.directions))
         return (
-            f"🚨 *ТОРГОВЫЙ СИГНАЛ*\n\n"
-            f"Актив: `{signal['asset']}`\n"
-            f"Направление: *{signal['direction']}*\n"
-            f"Уверенность: {signal['confidence']}%\n"
-            f"RSI: {signal['rsi']}\n"
-            f"Цена: {signal['price']}\n"
-            f"Время: {signal['time']}"
+            f"⭐ *Мои активы:* {assets}\n"
+            f"Направления: {directions}\n"
+            f"Мин. уверенность: {watch.min_confidence:g}%\n"
+            f"Доставка: {MODE_TITLES[watch.mode]}\n\n"
+            f"Добавить актив: /watch EURUSD\\_otc, убрать: /unwatch EURUSD\\_otc"
         )
 
-    async def ping_loop(self):
-        """Поддержание соединения с Pocket Option"""
-        while self.is_scanning:
+    def watchlist_keyboard(self, user_id):
+        return InlineKeyboardMarkup([
+            [
+                InlineKeyboardButton("📈 CALL", callback_data='dir:CALL'),
+                InlineKeyboardButton("📉 PUT", callback_data='dir:PUT'),
+                InlineKeyboardButton("↕️ Оба", callback_data='dir:ALL'),
+            ],
+            [InlineKeyboardButton(f"≥{v}%", callback_data=f'conf:{v}') for v in (0, 65, 75, 85)],
+            [InlineKeyboardButton(MODE_TITLES[mode], callback_data=f'mode:{mode}') for mode in MODES],
+            [
+                InlineKeyboardButton("🔍 Выбрать активы", callback_data='assets'),
+                InlineKeyboardButton("🌐 Все активы", callback_data='watch_all'),
+            ],
+        ])
+
+    def save_watchlist(self, user_id):
+        self.storage.save_watchlist(user_id, self.watchlists.get(user_id).to_dict())
+
+    def add_subscriber(self, user_id):
+        self.subscribers.add(user_id)
+        self.watchlists.subscribe(user_id)
+        self.storage.add_subscriber(user_id)
+
+    def remove_subscriber(self, user_id):
+        self.subscribers.discard(user_id)
+        self.watchlists.unsubscribe(user_id)
+        self.storage.remove_subscriber(user_id)
+
+    def format_signal(self, signal):
+        """Форматирование сигнала (текст один на всех подписчиков)"""
+        return self.renderer.signal(signal)
+
+    def start_scanning(self):
+        """Запуск сканирования, если оно еще не идет и эта реплика ведущая"""
+        if self.is_scanning or not self.is_leader:
+            return
+        self.is_scanning = True
+        self.scan_task = asyncio.create_task(self.scan_and_send_signals())
+
+    async def stop_scanning(self):
+        if not self.is_scanning:
+            return
+        self.is_scanning = False
+        if self.shards is not None:
+            await self.shards.stop()
+        else:
+            self.scanner.stop()
+        if self.scan_task:
+            self.scan_task.cancel()
+            await asyncio.gather(self.scan_task, return_exceptions=True)
+            self.scan_task = None
+
+    async def reload_state(self):
+        """Подписчики и настройки из общего хранилища (их меняют и другие реплики).
+
+        Состояние не заменяется целиком, а сливается: команды, пришедшие на эту
+        реплику во время чтения, еще не записаны и имеют приоритет.
+        """
+        if not self.storage.shared:
+            return
+        await self.storage.flush()
+        subscribers = await self.storage.load_subscribers()
+        settings = await self.storage.load_watchlists()
+        # Дальше без await: снимок незаписанных изменений согласован с применением
+        pending_subscribers, pending_watchlists = self.storage.pending_users()
+        for user_id, subscribed in pending_subscribers.items():
+            if subscribed:
+                subscribers.add(user_id)
+            else:
+                subscribers.discard(user_id)
+
+        for user_id, data in settings.items():
+            current = self.watchlists.settings.get(user_id)
+            if user_id not in pending_watchlists and (current is None or current.to_dict() != data):
+                self.watchlists.replace(user_id, Watch.from_dict(data))
+        for user_id in self.subscribers - subscribers:
+            self.watchlists.unsubscribe(user_id)
+        for user_id in subscribers - self.subscribers:
+            self.watchlists.subscribe(user_id)
+        self.subscribers.intersection_update(subscribers)
+        self.subscribers.update(subscribers)
+
+    async def coordinate(self, interval=10):
+        """Выбор ведущей реплики через аренду в хранилище.
+
+        Команды обрабатывает любая реплика, а сканирует и рассылает сигналы
+        только та, что держит аренду; при ее падении аренда истекает через
+        3 * interval и ее подхватывает другая. Аренда в SQLite надежна, только
+        пока все реплики на одном хосте и делят локальный файл базы.
+        """
+        while True:
             try:
-                if self.pocket_client and self.pocket_client.connected:
-                    self.pocket_client.ping()
-                await asyncio.sleep(30)
-            except:
-                pass
+                leader = await self.storage.acquire_lease('scanner', self.replica_id, ttl=3 * interval)
+                if leader != self.is_leader:
+                    logging.warning(f"👑 Реплика {self.replica_id}: {'ведущая' if leader else 'резервная'}")
+                self.is_leader = leader
+                await self.reload_state()
+                if not leader:
+                    await self.stop_scanning()
+                elif self.subscribers:
+                    self.start_scanning()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"❌ Ошибка выбора ведущей реплики: {e}")
+            await asyncio.sleep(interval)
 
     async def scan_and_send_signals(self):
         """Фоновая задача для сканирования рынка"""
-        logging.info("🔄 Подключение к Pocket Option...")
-        
-        self.pocket_client = PocketOptionClient(self.ssid)
-        if not self.pocket_client.connect():
-            logging.error("❌ Не удалось подключиться к Pocket Option")
-            # Продолжаем в тестовом режиме
-            logging.info("🔄 Переход в тестовый режим...")
+        if self.shards is not None:
+            await self.shards.run(watched=self.watched_filter)
         else:
-            logging.info("✅ Подключено к Pocket Option, начинаю сканирование...")
-            # Запускаем ping для поддержания соединения
-            asyncio.create_task(self.ping_loop())
+            await self.scanner.run()
 
-        scan_count = 0
-        while self.is_scanning:
-            try:
-                for asset in self.signal_generator.assets:
-                    # Получаем свечи
-                    candles = self.pocket_client.get_candles(asset, 60, 100)
-                    
-                    # Анализируем
-                    signal = self.signal_generator.analyze_asset(candles, asset)
-                    
-                    if signal:
-                        logging.info(f"✅ Найден сигнал: {signal['asset']} {signal['direction']}")
-                        for user_id in self.subscribers.copy():
-                            try:
-                                await self.application.bot.send_message(
-                                    chat_id=user_id,
-                                    text=self.format_signal(signal),
-                                    parse_mode='Markdown'
-                                )
-                                logging.info(f"📤 Отправлено пользователю {user_id}")
-                            except Exception as e:
-                                logging.error(f"❌ Ошибка отправки {user_id}: {e}")
-                                self.subscribers.discard(user_id)
-                    
-                    await asyncio.sleep(2)
-                
-                scan_count += 1
-                logging.info(f"🔄 Цикл сканирования #{scan_count} завершен, следующее через 60 секунд")
-                await asyncio.sleep(60)
-                
-            except Exception as e:
-                logging.error(f"❌ Ошибка в цикле сканирования: {e}")
-                await asyncio.sleep(10)
+    def publish_signals(self, signals):
+        """Сохранение и рассылка найденных сигналов (из сканера или воркеров шардов)"""
+        # Рассылка идет через очередь и не задерживает сканирование
+        for signal in signals:
+            logging.info(f"✅ Найден сигнал: {signal['asset']} {signal['direction']}")
+            self.storage.record_signal(signal)
+            metrics.SIGNALS.inc(direction=signal['direction'].split()[0])
+            instant = []
+            for user_id in self.watchlists.route(signal):
+                if self.watchlists.settings[user_id].mode == 'instant':
+                    instant.append(user_id)
+                else:
+                    self.pending_digests.setdefault(user_id, []).append(signal)
+            if instant:
+                self.delivery.broadcast(self.format_signal(signal), instant, created_at=signal.get('created_at'))
+        if self.pending_digests and self.digest_handle is None:
+            self.digest_handle = asyncio.get_running_loop().call_later(self.digest_delay, self.flush_digests)
+
+    def flush_digests(self):
+        """Один дайджест на пользователя за цикл; одинаковые наборы сигналов рендерятся один раз"""
+        self.digest_handle = None
+        pending, self.pending_digests = self.pending_digests, {}
+        groups = {}  # (режим, ключи сигналов) -> (сигналы, пользователи)
+        for user_id, signals in pending.items():
+            mode = self.watchlists.get(user_id).mode
+            key = (mode, tuple(SignalRenderer.key(s) for s in signals))
+            groups.setdefault(key, (signals, []))[1].append(user_id)
+            metrics.SIGNALS_COALESCED.inc(len(signals) - 1)
+        for (mode, _), (signals, users) in groups.items():
+            # Задержка дайджеста считается от самого раннего сигнала, включая digest_delay
+            created_at = min((s['created_at'] for s in signals if 'created_at' in s), default=None)
+            if mode == 'pinned':
+                self.delivery.pin(self.renderer.digest(signals, pinned=True), users, created_at=created_at)
+            elif len(signals) == 1:
+                self.delivery.broadcast(self.format_signal(signals[0]), users, created_at=created_at)
+            else:
+                self.delivery.broadcast(self.renderer.digest(signals), users, created_at=created_at)
+
+    def on_pinned(self, user_id, message_id):
+        """Новое закрепленное сообщение с дайджестом: дальше правим его"""
+        self.watchlists.set_pinned(user_id, message_id)
+        self.save_watchlist(user_id)
+
+    def pinned_message(self, user_id):
+        watch = self.watchlists.settings.get(user_id)
+        return watch.pinned_message_id if watch is not None else None
+
+    def record_outcome(self, outcome):
+        """Итог сигнала на экспирации: в статистику /status и в хранилище"""
+        self.outcome_stats.record(outcome)
+        self.storage.record_outcome(outcome)
+        logging.info(f"🎯 {outcome['asset']} {outcome['direction']}: {outcome['result']}")
+
+    def watched_assets(self, universe):
+        """Сканируем только активы, за которыми кто-то следит"""
+        return self.watchlists.watched_assets(universe)
+
+    def watched_filter(self):
+        """Активы, за которыми следят подписчики, для воркеров шардов (None — все)"""
+        if self.watchlists.all_assets:
+            return None
+        return set(self.watchlists.by_asset)
+
+    def on_delivery_failure(self, user_id):
+        """Пользователь недоступен навсегда (заблокировал бота и т.п.)"""
+        self.remove_subscriber(user_id)
+
+    def setup_metrics(self):
+        """Гейджи и проверка здоровья для /metrics и /health"""
+        metrics.SUBSCRIBERS.set_function(lambda: len(self.subscribers))
+        metrics.FEED_AGE_SECONDS.set_function(lambda: self.supervisor.feed_age() if self.supervisor else None)
+        metrics.FEED_CONNECTED.set_function(lambda: int(bool(self.supervisor and self.supervisor.healthy)))
+        metrics.DELIVERY_QUEUE.set_function(lambda: self.delivery.queue.qsize() if self.delivery else 0)
+        metrics.SCAN_WORKERS.set_function(lambda: self.shards.alive() if self.shards is not None else 0)
+        metrics.set_health_check(self.health_check)
+
+    def health_check(self):
+        """Бот здоров, пока сканирование не запущено или поток данных живой"""
+        if not self.is_scanning or not self.supervisor:
+            return True, "OK"
+        problem = self.supervisor.problem()
+        if problem:
+            return False, f"Pocket Option: {problem}"
+        degraded = self.supervisor.degraded()
+        if degraded:
+            return True, f"DEGRADED: {degraded}"
+        return True, "OK"
+
+    async def post_init(self, application):
+        """Загрузка подписчиков и запуск воркеров отправки внутри event loop бота"""
+        await self.storage.start()
+        self.watchlists.load(await self.storage.load_watchlists())
+        self.subscribers.update(await self.storage.load_subscribers())
+        for user_id in self.subscribers:
+            self.watchlists.subscribe(user_id)
+        logging.info(f"👥 Загружено подписчиков: {len(self.subscribers)}")
+
+        self.delivery = SignalDelivery(
+            application.bot, on_permanent_failure=self.on_delivery_failure,
+            get_pinned=self.pinned_message, on_pinned=self.on_pinned
+        )
+        self.delivery.start()
+
+        # После перезапуска продолжаем рассылку сохраненным подписчикам
+        if self.subscribers:
+            self.start_scanning()
+
+    async def post_shutdown(self, application):
+        if self.digest_handle is not None:
+            self.digest_handle.cancel()
+            self.digest_handle = None
+        if self.shards is not None:
+            await self.shards.stop()
+        if self.delivery:
+            await self.delivery.stop()
+        await self.storage.close()
 
     def run(self):
         """Запуск бота"""
-        self.application = Application.builder().token(self.token).build()
+        builder = (
+            Application.builder()
+            .token(self.token)
+            .post_init(self.post_init)
+            .post_shutdown(self.post_shutdown)
+        )
+        # Локальная заглушка API (fake_telegram.py) для офлайн-запуска
+        if os.getenv('TELEGRAM_API_URL'):
+            builder = builder.base_url(os.getenv('TELEGRAM_API_URL'))
+        self.application = builder.build()
         
         # Команды
         self.application.add_handler(CommandHandler("start", self.start))
         self.application.add_handler(CommandHandler("subscribe", self.subscribe_command))
         self.application.add_handler(CommandHandler("status", self.status_command))
         self.application.add_handler(CommandHandler("assets", self.assets_command))
+        self.application.add_handler(CommandHandler("watchlist", self.watchlist_command))
+        self.application.add_handler(CommandHandler("watch", self.watch_command))
+        self.application.add_handler(CommandHandler("unwatch", self.unwatch_command))
+        self.application.add_handler(CommandHandler("direction", self.direction_command))
+        self.application.add_handler(CommandHandler("minconf", self.minconf_command))
+        self.application.add_handler(CommandHandler("mode", self.mode_command))
         
         # Кнопки
         self.application.add_handler(CallbackQueryHandler(self.button_handler))
@@ -443,7 +1465,44 @@ class TelegramSignalBot:
         logging.info("📱 Отправь /start в Telegram")
         logging.info("=" * 50)
         
-        self.application.run_polling()
+        if self.webhook_url:
+            asyncio.run(self.run_webhook())
+        else:
+            # HTTP-сервер для /health и /metrics
+            keep_alive()
+            self.application.run_polling()
+
+    async def run_webhook(self):
+        """Режим webhook: обновления, /health и /metrics обслуживает один сервер в этом event loop"""
+        server = WebhookServer(
+            self.application, path=os.getenv('WEBHOOK_PATH', '/telegram'),
+            secret=webhook_secret(self.token), port=int(os.getenv('PORT', 8080))
+        )
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (SIGINT, SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+
+        async with self.application:
+            await self.post_init(self.application)
+            # Все реплики ставят один и тот же URL, балансировщик делит запросы между ними
+            await self.application.bot.set_webhook(
+                self.webhook_url.rstrip('/') + server.path, secret_token=server.secret,
+                allowed_updates=Update.ALL_TYPES
+            )
+            await self.application.start()
+            await server.start()
+            coordinator = asyncio.create_task(self.coordinate())
+            try:
+                await stop.wait()
+            finally:
+                coordinator.cancel()
+                await asyncio.gather(coordinator, return_exceptions=True)
+                await server.stop()
+                await self.stop_scanning()
+                await self.storage.release_lease('scanner', self.replica_id)
+                await self.application.stop()
+                await self.post_shutdown(self.application)
 
 # ==================== ЗАПУСК ====================
 if __name__ == "__main__":
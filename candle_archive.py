@@ -0,0 +1,345 @@
+"""Архив закрытых свечей на диске: колонки фиксированной ширины и чтение через mmap.
+
+Раскладка: <root>/<timeframe>/<asset>/<YYYYMMDD>.cndl — один файл на актив
+за сутки (UTC). Файл — заголовок и пять колонок (time int64, open/high/
+low/close float64) на все свечи суток; свечи только дописываются в конец,
+колонка time отсортирована и служит индексом для выборки по времени.
+Закрытые дни сжимаются (compact) до фактического числа свечей.
+
+Пример:
+    python candle_archive.py info --root candles
+    python candle_archive.py compact --root candles
+"""
+import argparse
+import calendar
+import logging
+import os
+import time
+
+import numpy as np
+
+from candle_store import CandleView
+
+MAGIC = b'CNDL0001'
+HEADER_SIZE = 64
+DAY = 86400
+DTYPES = (np.int64, np.float64, np.float64, np.float64, np.float64)
+
+
+# ==================== ФАЙЛ ДНЯ ====================
+class DayFile:
+    """Свечи одного актива за одни сутки, отображенные в память.
+
+    Заголовок: magic и int64-поля timeframe, day_start, capacity, count.
+    Писатель сначала пишет строки и только потом увеличивает count, поэтому
+    читатель из другого процесса никогда не видит недописанную свечу.
+    """
+
+    def __init__(self, path, writable=False):
+        self.path = path
+        self.mm = np.memmap(path, dtype=np.uint8, mode='r+' if writable else 'r')
+        if bytes(self.mm[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path}: не файл архива свечей")
+        self._header = np.ndarray(4, dtype=np.int64, buffer=self.mm, offset=len(MAGIC))
+        self.timeframe, self.day_start, self.capacity = (int(v) for v in self._header[:3])
+        self.columns = tuple(
+            np.ndarray(self.capacity, dtype=dtype, buffer=self.mm, offset=HEADER_SIZE + 8 * i * self.capacity)
+            for i, dtype in enumerate(DTYPES)
+        )
+
+    @classmethod
+    def create(cls, path, timeframe, day_start, capacity=None, columns=None):
+        """Новый файл на capacity свечей (по умолчанию — на все сутки) с начальными columns"""
+        capacity = capacity or DAY // timeframe
+        count = len(columns[0]) if columns is not None else 0
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(MAGIC + np.array([timeframe, day_start, capacity, count], dtype=np.int64).tobytes())
+            for i, dtype in enumerate(DTYPES):
+                f.seek(HEADER_SIZE + 8 * i * capacity)
+                if count:
+                    f.write(np.asarray(columns[i], dtype=dtype).tobytes())
+            # Пустой хвост остается разреженным и не занимает место на диске
+            f.truncate(HEADER_SIZE + 8 * len(DTYPES) * capacity)
+        os.replace(tmp, path)
+        return cls(path, writable=True)
+
+    @property
+    def count(self):
+        return int(self._header[3])
+
+    @property
+    def last_time(self):
+        count = self.count
+        return int(self.columns[0][count - 1]) if count else None
+
+    def arrays(self, start=None, end=None):
+        """Свечи с start <= time < end как срезы колонок без копирования"""
+        count = self.count
+        times = self.columns[0][:count]
+        lo = int(np.searchsorted(times, start, side='left')) if start is not None else 0
+        hi = int(np.searchsorted(times, end, side='left')) if end is not None else count
+        return tuple(column[lo:hi] for column in self.columns)
+
+    def append(self, columns):
+        count, n = self.count, len(columns[0])
+        if count + n > self.capacity:
+            raise ValueError(f"{self.path}: нет места для {n} свечей")
+        for column, values in zip(self.columns, columns):
+            column[count:count + n] = values
+        self._header[3] = count + n
+
+    def flush(self):
+        self.mm.flush()
+
+
+def day_of(t):
+    return int(t) - int(t) % DAY
+
+
+# ==================== АРХИВ ====================
+class CandleArchive:
+    """Архив свечей всех активов: запись из CandleStore, чтение для теплого старта и бэктестов.
+
+    timeframes задает таймфрейм отдельных активов, как у CandleStore.
+    """
+
+    def __init__(self, root, timeframe=60, timeframes=None):
+        self.root = root
+        self.timeframe = timeframe
+        self.timeframes = dict(timeframes or {})
+        self.writers = {}  # asset -> DayFile текущего дня
+        self.last_times = {}  # asset -> время последней записанной свечи
+        self.appended = 0
+
+    def timeframe_of(self, asset):
+        return self.timeframes.get(asset, self.timeframe)
+
+    def directory(self, asset):
+        return os.path.join(self.root, str(self.timeframe_of(asset)), asset)
+
+    def path(self, asset, day_start):
+        return os.path.join(self.directory(asset), time.strftime('%Y%m%d', time.gmtime(day_start)) + '.cndl')
+
+    def assets(self):
+        """Активы, у которых есть свечи в архиве (для их таймфреймов)"""
+        found = set()
+        if not os.path.isdir(self.root):
+            return []
+        for timeframe in os.listdir(self.root):
+            directory = os.path.join(self.root, timeframe)
+            if os.path.isdir(directory):
+                found.update(a for a in os.listdir(directory) if str(self.timeframe_of(a)) == timeframe)
+        return sorted(found)
+
+    def days(self, asset):
+        """Файлы актива по возрастанию даты"""
+        try:
+            names = sorted(n for n in os.listdir(self.directory(asset)) if n.endswith('.cndl'))
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.directory(asset), n) for n in names]
+
+    def last_time(self, asset):
+        if asset not in self.last_times:
+            last = None
+            for path in reversed(self.days(asset)):
+                last = DayFile(path).last_time
+                if last is not None:
+                    break
+            self.last_times[asset] = last
+        return self.last_times[asset]
+
+    # ---------- запись ----------
+    def _writer(self, asset, day_start):
+        writer = self.writers.get(asset)
+        if writer is not None and writer.day_start == day_start:
+            return writer
+        if writer is not None:
+            # Ротация: день закончился, сжимаем его файл
+            self.writers.pop(asset)
+            compact_file(writer.path)
+        path = self.path(asset, day_start)
+        timeframe = self.timeframe_of(asset)
+        if os.path.exists(path):
+            writer = DayFile(path, writable=True)
+            if writer.capacity < DAY // timeframe:
+                # День уже сжат, а свечи за него еще пришли: возвращаем полный размер
+                writer = DayFile.create(path, timeframe, day_start, columns=writer.arrays())
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            writer = DayFile.create(path, timeframe, day_start)
+        self.writers[asset] = writer
+        return writer
+
+    def append(self, asset, times, opens, highs, lows, closes):
+        """Дописывание свечей (по возрастанию времени); свечи не новее уже записанных пропускаются"""
+        columns = (times, opens, highs, lows, closes)
+        last = self.last_time(asset)
+        if last is not None:
+            start = int(np.searchsorted(times, last, side='right'))
+            columns = tuple(c[start:] for c in columns)
+        times = columns[0]
+        if not len(times):
+            return 0
+        days = times - times % DAY
+        bounds = np.flatnonzero(np.diff(days)) + 1
+        for lo, hi in zip(np.r_[0, bounds], np.r_[bounds, len(times)]):
+            self._writer(asset, int(days[lo])).append(tuple(c[lo:hi] for c in columns))
+        self.last_times[asset] = int(times[-1])
+        self.appended += len(times)
+        return len(times)
+
+    def record(self, asset, candles):
+        """Запись закрытых свечей из CandleBuffer/CandleView, которых еще нет в архиве"""
+        if not len(candles):
+            return 0
+        return self.append(asset, *candles.arrays())
+
+    def flush(self):
+        for writer in self.writers.values():
+            writer.flush()
+
+    def close(self):
+        self.flush()
+        self.writers.clear()
+
+    # ---------- чтение ----------
+    def read(self, asset, start=None, end=None):
+        """Свечи с start <= time < end как CandleView.
+
+        В пределах одного дня это срезы отображенного файла без копирования,
+        диапазон через несколько дней склеивается в новые массивы.
+        """
+        parts = []
+        for path in self.days(asset):
+            day_start = _day_from_path(path)
+            if (end is not None and day_start >= end) or (start is not None and day_start + DAY <= start):
+                continue
+            arrays = DayFile(path).arrays(start, end)
+            if len(arrays[0]):
+                parts.append(arrays)
+        return _view(parts)
+
+    def tail(self, asset, n):
+        """Последние n свечей актива (по файлам с конца, обычно один-два дня)"""
+        parts, total = [], 0
+        for path in reversed(self.days(asset)):
+            arrays = DayFile(path).arrays()
+            if len(arrays[0]):
+                parts.append(tuple(a[max(0, len(a) - (n - total)):] for a in arrays))
+                total += len(parts[-1][0])
+            if total >= n:
+                break
+        return _view(parts[::-1])
+
+    def warm_start(self, store, assets, now=None):
+        """Заполнение буферов store историей из архива.
+
+        Берутся только активы, у которых архив перекрывает окно буфера;
+        пропуск до текущего момента помечается в missing и догружается
+        обычным backfill. Возвращает список заполненных активов.
+        """
+        now = time.time() if now is None else now
+        warmed = []
+        for asset in assets:
+            view = self.tail(asset, store.capacity)
+            timeframe = store.timeframe_of(asset)
+            if not len(view) or now - view.last_time >= store.capacity * timeframe:
+                continue
+            buf = store.buffer(asset)
+            buf.seed_arrays(*view.arrays())
+            buf.missing = int(now - view.last_time) // timeframe
+            warmed.append(asset)
+        return warmed
+
+    def compact(self, before=None):
+        """Сжатие всех дней раньше before (по умолчанию — раньше текущих суток UTC)"""
+        before = day_of(time.time()) if before is None else before
+        compacted = 0
+        open_paths = {writer.path for writer in self.writers.values()}
+        for asset in self.assets():
+            for path in self.days(asset):
+                if _day_from_path(path) < before and path not in open_paths and compact_file(path):
+                    compacted += 1
+        return compacted
+
+
+def _day_from_path(path):
+    return calendar.timegm(time.strptime(os.path.basename(path).split('.')[0], '%Y%m%d'))
+
+
+def _view(parts):
+    if not parts:
+        return CandleView(tuple(np.empty(0, dtype=dtype) for dtype in DTYPES))
+    if len(parts) == 1:
+        return CandleView(parts[0])
+    return CandleView(tuple(np.concatenate(columns) for columns in zip(*parts)))
+
+
+def compact_file(path):
+    """Обрезка файла дня до фактического числа свечей; True, если файл изменился"""
+    day = DayFile(path)
+    if day.count == day.capacity:
+        return False
+    if not day.count:
+        os.remove(path)
+        return True
+    DayFile.create(path, day.timeframe, day.day_start, capacity=day.count, columns=day.arrays())
+    return True
+
+
+def iter_days(directory):
+    """Колонки (time, close) каждого дня из каталога актива, для backtest.read_chunks"""
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.cndl'):
+            times, _, _, _, closes = DayFile(os.path.join(directory, name)).arrays()
+            yield times, closes
+
+
+def create_candle_archive(timeframe=60, timeframes=None):
+    """Архив в каталоге CANDLE_ARCHIVE (по умолчанию candles); CANDLE_ARCHIVE=off отключает запись"""
+    root = os.getenv('CANDLE_ARCHIVE', 'candles')
+    if root.lower() in ('off', 'none', '0', ''):
+        return None
+    return CandleArchive(root, timeframe, timeframes)
+
+
+# ==================== CLI ====================
+def _timeframes(root):
+    """Каталоги таймфреймов архива; посторонние файлы и каталоги пропускаются"""
+    return sorted((int(name) for name in os.listdir(root)
+                   if name.isdigit() and os.path.isdir(os.path.join(root, name))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Архив свечей")
+    parser.add_argument('command', choices=('info', 'compact'))
+    parser.add_argument('--root', default=os.getenv('CANDLE_ARCHIVE', 'candles'))
+    args = parser.parse_args()
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+
+    if args.command == 'compact':
+        compacted = 0
+        for timeframe in _timeframes(args.root):
+            archive = CandleArchive(args.root, timeframe)
+            compacted += archive.compact()
+        logging.info(f"🗜 Сжато файлов: {compacted}")
+        return
+
+    print(f"{'Таймфрейм':>10} {'Актив':<16}{'Дней':>6}{'Свечей':>10}  Период")
+    for timeframe in _timeframes(args.root):
+        archive = CandleArchive(args.root, timeframe)
+        for asset in archive.assets():
+            days = archive.days(asset)
+            files = [DayFile(path) for path in days]
+            candles = sum(f.count for f in files)
+            first = next((int(f.columns[0][0]) for f in files if f.count), 0)
+            last = archive.last_time(asset) or 0
+            period = f"{time.strftime('%Y-%m-%d %H:%M', time.gmtime(first))} — " \
+                     f"{time.strftime('%Y-%m-%d %H:%M', time.gmtime(last))}"
+            print(f"{timeframe:>10} {asset:<16}{len(days):>6}{candles:>10}  {period}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+import logging
+import time
+
+import numpy as np
+
+
+# ==================== ХРАНИЛИЩЕ СВЕЧЕЙ ====================
+class CandleBuffer:
+    """Кольцевой буфер свечей одного актива на массивах numpy.
+
+    Каждое значение пишется дважды (в i и i + capacity), поэтому последние
+    n свечей всегда лежат одним непрерывным срезом и читаются без копий.
+    """
+
+    def __init__(self, capacity=200, timeframe=60):
+        self.capacity = capacity
+        self.timeframe = timeframe
+        self.time = np.zeros(2 * capacity, dtype=np.int64)
+        self.open = np.zeros(2 * capacity, dtype=np.float64)
+        self.high = np.zeros(2 * capacity, dtype=np.float64)
+        self.low = np.zeros(2 * capacity, dtype=np.float64)
+        self.close = np.zeros(2 * capacity, dtype=np.float64)
+        self.size = 0
+        self._head = 0  # индекс следующей записи в [0, capacity)
+        self.missing = 0  # сколько свечей пропущено и ждут догрузки
+        self.version = 0  # меняется, когда история переписана целиком
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def last_time(self):
+        if not self.size:
+            return None
+        return int(self.time[self._head - 1 + self.capacity])
+
+    def _write(self, idx, t, o, h, l, c):
+        for i in (idx, idx + self.capacity):
+            self.time[i] = t
+            self.open[i] = o
+            self.high[i] = h
+            self.low[i] = l
+            self.close[i] = c
+
+    def _append(self, t, o, h, l, c):
+        self._write(self._head, t, o, h, l, c)
+        self._head = (self._head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def _last_index(self):
+        return (self._head - 1) % self.capacity
+
+    def seed(self, candles):
+        """Заполнение буфера историей (список dict, как из get_candles)"""
+        self.seed_arrays(*_columns(candles))
+
+    def seed_arrays(self, times, opens, highs, lows, closes):
+        """Заполнение буфера из колонок, отсортированных по времени (например, из архива)"""
+        n = min(len(times), self.capacity)
+        self.version += 1
+        self.missing = 0
+        for column, values in zip((self.time, self.open, self.high, self.low, self.close),
+                                  (times, opens, highs, lows, closes)):
+            column[:n] = values[len(values) - n:]
+            column[self.capacity:self.capacity + n] = values[len(values) - n:]
+        # Последние n свечей лежат в [capacity, capacity + n), см. arrays()
+        self._head = n % self.capacity
+        self.size = n
+
+    def merge(self, candles):
+        """Вклейка догруженной истории (после разрыва) с удалением дублей"""
+        new = _columns(candles)
+        # Новые свечи идут первыми: np.unique оставляет первое вхождение времени
+        merged = [np.concatenate([n, o]) for n, o in zip(new, self.arrays())]
+        _, first = np.unique(merged[0], return_index=True)
+        self.seed_arrays(*(column[first] for column in merged))
+        # Догруженные свечи могли не закрыть весь разрыв: оставшиеся дыры считаем заново
+        times = self.arrays()[0]
+        self.missing = int(np.sum(np.diff(times) // self.timeframe - 1)) if len(times) > 1 else 0
+
+    def _bucket(self, ts):
+        ts = int(ts)
+        return ts - ts % self.timeframe
+
+    def _open_candle(self, bucket, o, h, l, c):
+        last = self.last_time
+        if last is not None and bucket - last > self.timeframe:
+            self.missing += (bucket - last) // self.timeframe - 1
+        self._append(bucket, o, h, l, c)
+
+    def update_tick(self, ts, price):
+        """Обновление текущей свечи по тику цены. Возвращает True, если свеча закрылась"""
+        bucket = self._bucket(ts)
+        last = self.last_time
+        if last is not None and bucket < last:
+            return False
+        if last is not None and bucket == last:
+            i = self._last_index()
+            h = max(self.high[i], price)
+            l = min(self.low[i], price)
+            self._write(i, last, self.open[i], h, l, price)
+            return False
+        self._open_candle(bucket, price, price, price, price)
+        return last is not None
+
+    def update_candle(self, candle):
+        """Вставка или обновление свечи целиком (кадр обновления свечи)"""
+        t = int(candle['time'])
+        last = self.last_time
+        values = (float(candle['open']), float(candle['high']),
+                  float(candle['low']), float(candle['close']))
+        if last is not None and t < last:
+            return False
+        if last is not None and t == last:
+            self._write(self._last_index(), t, *values)
+            return False
+        self._open_candle(t, *values)
+        return last is not None
+
+    def arrays(self, n=None):
+        """Последние n свечей как срезы (time, open, high, low, close) без копирования"""
+        n = self.size if n is None else min(n, self.size)
+        end = self._head + self.capacity
+        sl = slice(end - n, end)
+        return self.time[sl], self.open[sl], self.high[sl], self.low[sl], self.close[sl]
+
+    def closes(self, n=None):
+        return self.arrays(n)[4]
+
+    def to_candles(self, n=None):
+        """Последние n свечей в формате get_candles (список dict)"""
+        return [
+            {'close': float(c), 'open': float(o), 'high': float(h), 'low': float(l), 'time': int(t)}
+            for t, o, h, l, c in zip(*self.arrays(n))
+        ]
+
+    def closed(self, before):
+        """Свечи, открытые раньше before (т.е. уже закрытые к этому моменту), без копирования"""
+        arrays = self.arrays()
+        n = int(np.searchsorted(arrays[0], before, side='left'))
+        return CandleView(tuple(a[:n] for a in arrays), self.version)
+
+
+def _columns(candles):
+    """Список dict свечей -> колонки по возрастанию времени (при дублях побеждает последняя)"""
+    by_time = {int(c['time']): c for c in candles}
+    times = sorted(by_time)
+    return (
+        np.array(times, dtype=np.int64),
+        *(np.array([float(by_time[t][key]) for t in times]) for key in ('open', 'high', 'low', 'close'))
+    )
+
+
+class CandleView:
+    """Неизменяемый срез буфера с тем же интерфейсом чтения, что и у CandleBuffer"""
+
+    def __init__(self, arrays, version=0):
+        self._arrays = arrays
+        self.version = version
+
+    def __len__(self):
+        return len(self._arrays[0])
+
+    @property
+    def last_time(self):
+        return int(self._arrays[0][-1]) if len(self) else None
+
+    def arrays(self, n=None):
+        n = len(self) if n is None else min(n, len(self))
+        return tuple(a[len(a) - n:] for a in self._arrays)
+
+    def closes(self, n=None):
+        return self.arrays(n)[4]
+
+    def to_candles(self, n=None):
+        return [
+            {'close': float(c), 'open': float(o), 'high': float(h), 'low': float(l), 'time': int(t)}
+            for t, o, h, l, c in zip(*self.arrays(n))
+        ]
+
+
+class CandleStore:
+    """Свечи всех активов, которые держатся актуальными потоком с сокета.
+
+    timeframes задает таймфрейм отдельных активов, остальные используют timeframe.
+    """
+
+    def __init__(self, capacity=200, timeframe=60, timeframes=None):
+        self.capacity = capacity
+        self.timeframe = timeframe
+        self.timeframes = dict(timeframes or {})
+        self.buffers = {}
+
+    def __contains__(self, asset):
+        return asset in self.buffers
+
+    def __len__(self):
+        return len(self.buffers)
+
+    def get(self, asset):
+        return self.buffers.get(asset)
+
+    def timeframe_of(self, asset):
+        return self.timeframes.get(asset, self.timeframe)
+
+    def buffer(self, asset):
+        buf = self.buffers.get(asset)
+        if buf is None:
+            buf = self.buffers[asset] = CandleBuffer(self.capacity, self.timeframe_of(asset))
+        return buf
+
+    def seed(self, asset, candles):
+        if candles:
+            self.buffer(asset).seed(candles)
+
+    def on_stream(self, payload):
+        """Кадр updateStream: [[asset, timestamp, price], ...]"""
+        if not isinstance(payload, list):
+            return
+        for item in payload:
+            try:
+                asset, ts, price = item[0], item[1], float(item[2])
+            except (IndexError, TypeError, ValueError):
+                continue
+            buf = self.buffers.get(asset)
+            if buf is not None and len(buf):
+                buf.update_tick(ts, price)
+
+    def on_candle(self, payload):
+        """Кадр обновления свечи: {"asset": ..., "time": ..., "open": ..., ...}"""
+        items = payload if isinstance(payload, list) else [payload]
+        for c in items:
+            if not isinstance(c, dict) or 'asset' not in c or 'close' not in c:
+                continue
+            buf = self.buffers.get(c['asset'])
+            if buf is not None and len(buf):
+                buf.update_candle(c)
+
+    def mark_stale(self, now):
+        """Пометка свечей, пропущенных за время разрыва соединения, для догрузки"""
+        for buf in self.buffers.values():
+            last = buf.last_time
+            if last is not None:
+                buf.missing = max(buf.missing, (int(now) - last) // buf.timeframe)
+
+    def gaps(self):
+        """Активы с пропущенными свечами: asset -> сколько догрузить"""
+        return {asset: buf.missing for asset, buf in self.buffers.items() if buf.missing}
+
+    async def backfill(self, client, asset):
+        """Догрузка пропущенных свечей после разрыва потока"""
+        buf = self.buffers.get(asset)
+        if buf is None or not buf.missing:
+            return
+        count = buf.missing + 2
+        times = buf.arrays()[0]
+        holes = np.flatnonzero(np.diff(times) > buf.timeframe)
+        if len(holes):
+            # Дыра внутри буфера (догрузка закрыла ее не целиком): берем свечи от ее начала
+            count = max(count, (int(time.time()) - int(times[holes[0]])) // buf.timeframe + 1)
+        count = min(self.capacity, count)
+        candles = await client.get_candles(asset, buf.timeframe, count)
+        if candles:
+            buf.merge(candles)
+            logging.info(f"🧩 {asset}: догружено {len(candles)} свечей после разрыва")
+
@@ -0,0 +1,224 @@
+import asyncio
+import logging
+import time
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+
+import metrics
+
+# Лимиты Telegram: ~30 сообщений в секунду на бота и ~1 в секунду в один чат
+GLOBAL_RATE = 30
+PER_CHAT_RATE = 1
+
+# Ошибки BadRequest, после которых писать пользователю бессмысленно
+PERMANENT_BAD_REQUEST = ('chat not found', 'user is deactivated', 'bot was blocked', 'peer_id_invalid')
+
+
+# ==================== ДОСТАВКА СИГНАЛОВ ====================
+class TokenBucket:
+    """Token bucket для ограничения частоты запросов"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def pause(self, seconds):
+        """Остановка выдачи токенов (например, после RetryAfter)"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class SignalDelivery:
+    """Очередь отправки с пулом воркеров и соблюдением лимитов Telegram.
+
+    Постоянные ошибки (бот заблокирован, чат не найден) передаются в
+    on_permanent_failure, временные повторяются с экспоненциальной паузой.
+    Сообщения из pin() правят закрепленное сообщение чата (его id дает
+    get_pinned), а если его нет — отправляются, закрепляются и передаются
+    в on_pinned.
+    """
+
+    def __init__(self, bot, workers=20, max_retries=5, on_permanent_failure=None,
+                 global_rate=GLOBAL_RATE, per_chat_rate=PER_CHAT_RATE, get_pinned=None, on_pinned=None,
+                 bucket_ttl=300):
+        self.bot = bot
+        self.workers = workers
+        self.max_retries = max_retries
+        self.on_permanent_failure = on_permanent_failure
+        self.get_pinned = get_pinned
+        self.on_pinned = on_pinned
+        self.queue = asyncio.Queue()
+        self.global_bucket = TokenBucket(global_rate)
+        self.per_chat_rate = per_chat_rate
+        self.chat_buckets = {}
+        # Лимит чата, не использованный bucket_ttl секунд, уже полон и хранить его незачем
+        self.bucket_ttl = bucket_ttl
+        self._last_sweep = time.monotonic()
+        self._tasks = []
+        self.sent = 0
+        self.edited = 0
+        self.failed = 0
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+            logging.info(f"📬 Запущено {self.workers} воркеров отправки")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def broadcast(self, text, chat_ids, parse_mode='Markdown', created_at=None):
+        """Постановка сообщения в очередь для всех chat_ids, без ожидания отправки.
+
+        created_at — время создания сигнала (time.time()), от него считается
+        задержка доставки; по умолчанию — момент постановки в очередь.
+        """
+        self._enqueue(text, chat_ids, parse_mode, pin=False, created_at=created_at)
+
+    def pin(self, text, chat_ids, parse_mode='Markdown', created_at=None):
+        """Как broadcast, но текст заменяет закрепленное сообщение чата"""
+        self._enqueue(text, chat_ids, parse_mode, pin=True, created_at=created_at)
+
+    def _enqueue(self, text, chat_ids, parse_mode, pin, created_at=None):
+        created_at = time.time() if created_at is None else created_at
+        for chat_id in chat_ids:
+            self.queue.put_nowait((chat_id, text, parse_mode, created_at, 0, pin))
+
+    def _chat_bucket(self, chat_id):
+        now = time.monotonic()
+        if now - self._last_sweep >= self.bucket_ttl:
+            self._last_sweep = now
+            self.evict_idle_buckets(now)
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.per_chat_rate, 1)
+        return bucket
+
+    def evict_idle_buckets(self, now=None):
+        """Удаление лимитов чатов, которым давно ничего не отправляли"""
+        now = time.monotonic() if now is None else now
+        idle = [
+            chat_id for chat_id, bucket in self.chat_buckets.items()
+            if now - bucket.updated >= self.bucket_ttl and now >= bucket.paused_until
+        ]
+        for chat_id in idle:
+            del self.chat_buckets[chat_id]
+        return len(idle)
+
+    async def _worker(self):
+        while True:
+            item = await self.queue.get()
+            try:
+                await self._deliver(*item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"❌ Ошибка воркера отправки: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def _deliver(self, chat_id, text, parse_mode, created_at, attempt, pin):
+        await self._chat_bucket(chat_id).acquire()
+        await self.global_bucket.acquire()
+        try:
+            if pin and await self._edit_pinned(chat_id, text, parse_mode):
+                self.edited += 1
+                metrics.MESSAGES_EDITED.inc()
+            else:
+                message = await self.bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode)
+                if pin:
+                    await self._pin(chat_id, message.message_id)
+                self.sent += 1
+                metrics.MESSAGES_SENT.inc()
+            metrics.DELIVERY_LATENCY_SECONDS.observe(time.time() - created_at)
+            logging.info(f"📤 Отправлено пользователю {chat_id}")
+        except RetryAfter as e:
+            metrics.SEND_FAILURES.inc(kind='retry_after')
+            # Флуд-контроль Telegram касается всего бота, поэтому тормозим всех
+            logging.warning(f"⏳ RetryAfter {e.retry_after}с при отправке {chat_id}")
+            self.global_bucket.pause(float(e.retry_after))
+            self.queue.put_nowait((chat_id, text, parse_mode, created_at, attempt, pin))
+        except Forbidden as e:
+            self._permanent_failure(chat_id, e)
+        except BadRequest as e:
+            if any(reason in str(e).lower() for reason in PERMANENT_BAD_REQUEST):
+                self._permanent_failure(chat_id, e)
+            else:
+                self.failed += 1
+                metrics.SEND_FAILURES.inc(kind='rejected')
+                logging.error(f"❌ Сообщение для {chat_id} отклонено: {e}")
+        except NetworkError as e:
+            self._retry(chat_id, text, parse_mode, created_at, attempt, pin, e)
+
+    async def _edit_pinned(self, chat_id, text, parse_mode):
+        """Правка закрепленного сообщения; False, если его нет и нужно отправить новое"""
+        message_id = self.get_pinned(chat_id) if self.get_pinned else None
+        if not message_id:
+            return False
+        try:
+            await self.bot.edit_message_text(text, chat_id=chat_id, message_id=message_id, parse_mode=parse_mode)
+        except BadRequest as e:
+            reason = str(e).lower()
+            if 'not modified' in reason:
+                return True
+            if 'message to edit not found' in reason or "message can't be edited" in reason:
+                # Пользователь удалил закреп — отправим и закрепим новое сообщение
+                return False
+            raise
+        return True
+
+    async def _pin(self, chat_id, message_id):
+        """Закрепление уже отправленного сообщения; ошибка не приводит к повторной отправке"""
+        # Сообщение уже в чате: запоминаем его до закрепления, чтобы дальше править, а не слать заново
+        if self.on_pinned:
+            self.on_pinned(chat_id, message_id)
+        try:
+            await self.bot.pin_chat_message(chat_id, message_id, disable_notification=True)
+        except RetryAfter as e:
+            self.global_bucket.pause(float(e.retry_after))
+            logging.warning(f"⏳ RetryAfter {e.retry_after}с при закреплении в {chat_id}, сообщение не закреплено")
+        except TelegramError as e:
+            # Например, в группе без прав на закрепление: правим сообщение и без закрепа
+            logging.warning(f"⚠️ Не удалось закрепить сообщение в {chat_id}: {e}")
+
+    def _retry(self, chat_id, text, parse_mode, created_at, attempt, pin, error):
+        metrics.SEND_FAILURES.inc(kind='transient')
+        if attempt + 1 >= self.max_retries:
+            self.failed += 1
+            logging.error(f"❌ Не удалось отправить {chat_id} за {self.max_retries} попыток: {error}")
+            return
+        delay = 2 ** attempt
+        logging.warning(f"🔁 Повтор отправки {chat_id} через {delay}с: {error}")
+        asyncio.get_running_loop().call_later(
+            delay, self.queue.put_nowait, (chat_id, text, parse_mode, created_at, attempt + 1, pin)
+        )
+
+    def _permanent_failure(self, chat_id, error):
+        self.failed += 1
+        metrics.SEND_FAILURES.inc(kind='permanent')
+        logging.error(f"❌ Ошибка отправки {chat_id}: {error}, пользователь отписан")
+        self.chat_buckets.pop(chat_id, None)
+        if self.on_permanent_failure:
+            self.on_permanent_failure(chat_id)
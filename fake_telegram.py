@@ -0,0 +1,156 @@
+"""Локальная заглушка Telegram Bot API для офлайн-запуска бота и бенчмарков.
+
+Понимает методы, которые использует бот (getMe, getUpdates, sendMessage,
+editMessageText, pinChatMessage и т.п.), запоминает отправленные сообщения
+со временем получения и может имитировать флуд-контроль (429) и
+заблокированных пользователей (403).
+
+Пример:
+    python fake_telegram.py --port 8081
+    TELEGRAM_API_URL=http://127.0.0.1:8081/bot python bot.py
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from urllib.parse import parse_qsl
+
+REASONS = {200: 'OK', 403: 'Forbidden', 429: 'Too Many Requests'}
+
+
+class FakeTelegramAPI:
+    """HTTP-сервер Bot API на asyncio без внешних зависимостей.
+
+    rate_limit — сообщений в секунду на весь бот, сверх которых отвечаем 429;
+    blocked — chat_id, для которых sendMessage возвращает 403.
+    """
+
+    def __init__(self, host='127.0.0.1', port=8081, rate_limit=None, blocked=(), latency=0.0):
+        self.host = host
+        self.port = port
+        self.rate_limit = rate_limit
+        self.blocked = set(blocked)
+        self.latency = latency
+        self.server = None
+        self.messages = []  # (chat_id, text, monotonic-время получения)
+        self.edits = []
+        self.rejected = 0
+        self._message_id = 0
+        self._window = (0, 0)  # (секунда, сообщений в ней)
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}/bot"
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        logging.info(f"🧪 Заглушка Telegram API: {self.base_url}")
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                lines = head.decode('latin-1').split('\r\n')
+                _, path, _ = lines[0].split(' ', 2)
+                headers = {}
+                for line in lines[1:]:
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                status, payload = await self._call(path.rsplit('/', 1)[-1], self._params(headers, body))
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\nConnection: keep-alive\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _params(headers, body):
+        if not body:
+            return {}
+        if headers.get('content-type', '').startswith('application/json'):
+            return json.loads(body)
+        return dict(parse_qsl(body.decode()))
+
+    def _throttled(self):
+        if not self.rate_limit:
+            return False
+        second = int(time.monotonic())
+        start, count = self._window
+        if start != second:
+            start, count = second, 0
+        self._window = (start, count + 1)
+        return count >= self.rate_limit
+
+    def _message(self, chat_id, text):
+        self._message_id += 1
+        return {
+            'message_id': self._message_id, 'date': int(time.time()), 'text': text,
+            'chat': {'id': chat_id, 'type': 'private'},
+        }
+
+    async def _call(self, method, params):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if method == 'getMe':
+            return 200, {'ok': True, 'result': {
+                'id': 1, 'is_bot': True, 'first_name': 'Signal Bot', 'username': 'signal_bot'
+            }}
+        if method == 'getUpdates':
+            await asyncio.sleep(min(float(params.get('timeout', 0) or 0), 1.0))
+            return 200, {'ok': True, 'result': []}
+        if method in ('sendMessage', 'editMessageText'):
+            chat_id = int(params.get('chat_id', 0))
+            if chat_id in self.blocked:
+                self.rejected += 1
+                return 403, {'ok': False, 'error_code': 403,
+                             'description': 'Forbidden: bot was blocked by the user'}
+            if self._throttled():
+                self.rejected += 1
+                return 429, {'ok': False, 'error_code': 429, 'description': 'Too Many Requests: retry after 1',
+                             'parameters': {'retry_after': 1}}
+            text = params.get('text', '')
+            (self.messages if method == 'sendMessage' else self.edits).append((chat_id, text, time.monotonic()))
+            return 200, {'ok': True, 'result': self._message(chat_id, text)}
+        # deleteWebhook, setWebhook, pinChatMessage, setMyCommands и прочие
+        return 200, {'ok': True, 'result': True}
+
+
+async def serve(args):
+    api = FakeTelegramAPI(args.host, args.port, rate_limit=args.rate_limit)
+    await api.start()
+    while True:
+        await asyncio.sleep(10)
+        logging.info(f"📨 Получено сообщений: {len(api.messages)}, отклонено: {api.rejected}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка Telegram Bot API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--rate-limit', type=int, help="Сообщений в секунду до ответа 429")
+    args = parser.parse_args()
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+from collections import deque
+
+import numpy as np
+
+
+# ==================== ИНДИКАТОРЫ ====================
+def rsi_from_averages(avg_gain, avg_loss):
+    """RSI по средним приросту и падению.
+
+    Нулевое среднее падение дает RS = 0, как и в SignalGenerator.calculate_rsi
+    (там loss.replace(0, inf)), чтобы значения совпадали с эталоном.
+    """
+    rs = avg_gain / avg_loss if avg_loss else 0.0
+    return 100 - (100 / (1 + rs))
+
+
+class RsiState:
+    """Инкрементальный RSI одного актива: O(1) на новую свечу, без pandas.
+
+    По умолчанию средние считаются простым скользящим окном, как в
+    calculate_rsi; wilder=True включает сглаживание Уайлдера.
+    """
+
+    def __init__(self, period=14, wilder=False):
+        self.period = period
+        self.wilder = wilder
+        self.reset()
+
+    def reset(self):
+        self.prev = None
+        self.count = 0  # сколько приращений учтено
+        self.gains = deque(maxlen=self.period)
+        self.losses = deque(maxlen=self.period)
+        self.sum_gain = 0.0
+        self.sum_loss = 0.0
+        self.avg_gain = None
+        self.avg_loss = None
+
+    def _next(self, close):
+        """Новые (sum_gain, sum_loss, avg_gain, avg_loss) после цены close"""
+        delta = close - self.prev
+        gain = delta if delta > 0 else 0.0
+        loss = -delta if delta < 0 else 0.0
+        count = self.count + 1
+
+        if self.wilder and count > self.period:
+            p = self.period
+            avg_gain = (self.avg_gain * (p - 1) + gain) / p
+            avg_loss = (self.avg_loss * (p - 1) + loss) / p
+            return self.sum_gain, self.sum_loss, avg_gain, avg_loss
+
+        sum_gain = self.sum_gain + gain
+        sum_loss = self.sum_loss + loss
+        if len(self.gains) == self.period:
+            sum_gain -= self.gains[0]
+            sum_loss -= self.losses[0]
+        if count < self.period:
+            return sum_gain, sum_loss, None, None
+        return sum_gain, sum_loss, sum_gain / self.period, sum_loss / self.period
+
+    def update(self, close):
+        """Учет закрытой свечи. Возвращает текущий RSI или None"""
+        close = float(close)
+        if self.prev is not None:
+            delta = close - self.prev
+            self.sum_gain, self.sum_loss, self.avg_gain, self.avg_loss = self._next(close)
+            self.gains.append(delta if delta > 0 else 0.0)
+            self.losses.append(-delta if delta < 0 else 0.0)
+            self.count += 1
+        self.prev = close
+        return self.value
+
+    def peek(self, close):
+        """RSI, если бы следующая свеча закрылась по close (состояние не меняется)"""
+        if self.prev is None:
+            return None
+        avg_gain, avg_loss = self._next(float(close))[2:]
+        if avg_gain is None:
+            return None
+        return rsi_from_averages(avg_gain, avg_loss)
+
+    @property
+    def value(self):
+        if self.avg_gain is None:
+            return None
+        return rsi_from_averages(self.avg_gain, self.avg_loss)
+
+
+def rsi_matrix(closes, period=14, wilder=False):
+    """RSI по последней свече для каждой строки матрицы (n_assets, window).
+
+    Без wilder достаточно последних period + 1 цен; с wilder окно
+    используется целиком, как при последовательном проходе RsiState.
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    if closes.ndim != 2 or closes.shape[1] < period + 1:
+        return np.full(closes.shape[0] if closes.ndim == 2 else 0, np.nan)
+
+    if not wilder:
+        delta = np.diff(closes[:, -(period + 1):], axis=1)
+        avg_gain = np.clip(delta, 0, None).mean(axis=1)
+        avg_loss = np.clip(-delta, 0, None).mean(axis=1)
+    else:
+        delta = np.diff(closes, axis=1)
+        gains = np.clip(delta, 0, None)
+        losses = np.clip(-delta, 0, None)
+        avg_gain = gains[:, :period].mean(axis=1)
+        avg_loss = losses[:, :period].mean(axis=1)
+        for i in range(period, delta.shape[1]):
+            avg_gain = (avg_gain * (period - 1) + gains[:, i]) / period
+            avg_loss = (avg_loss * (period - 1) + losses[:, i]) / period
+
+    # Нулевое падение дает RS = 0, как в rsi_from_averages
+    safe_loss = np.where(avg_loss > 0, avg_loss, 1.0)
+    rs = np.where(avg_loss > 0, avg_gain / safe_loss, 0.0)
+    return 100 - (100 / (1 + rs))
+
+
+def rsi_series(closes, period=14, wilder=False):
+    """RSI для каждой свечи ряда (NaN, пока не хватает истории).
+
+    Без wilder совпадает с SignalGenerator.calculate_rsi; с wilder — с
+    последовательным проходом RsiState. Сглаживание Уайлдера считается через
+    ewm(adjust=False), поэтому работает на миллионах свечей без цикла Python.
+    """
+    import pandas as pd
+
+    closes = np.asarray(closes, dtype=np.float64)
+    out = np.full(len(closes), np.nan)
+    if len(closes) < period + 1:
+        return out
+
+    delta = np.diff(closes)
+    gains = np.clip(delta, 0, None)
+    losses = np.clip(-delta, 0, None)
+    if wilder:
+        avg_gain = pd.Series(np.concatenate([[gains[:period].mean()], gains[period:]]))
+        avg_loss = pd.Series(np.concatenate([[losses[:period].mean()], losses[period:]]))
+        avg_gain = avg_gain.ewm(alpha=1 / period, adjust=False).mean().to_numpy()
+        avg_loss = avg_loss.ewm(alpha=1 / period, adjust=False).mean().to_numpy()
+    else:
+        avg_gain = pd.Series(gains).rolling(period).mean().to_numpy()[period - 1:]
+        avg_loss = pd.Series(losses).rolling(period).mean().to_numpy()[period - 1:]
+
+    safe_loss = np.where(avg_loss > 0, avg_loss, 1.0)
+    rs = np.where(avg_loss > 0, avg_gain / safe_loss, 0.0)
+    out[period:] = 100 - (100 / (1 + rs))
+    return out
@@ -1,6 +1,9 @@
-from flask import Flask
+import os
+from flask import Flask, Response
 from threading import Thread
 
+import metrics
+
 app = Flask(__name__)
 
 @app.route('/')
@@ -9,11 +12,16 @@ def home():
 
 @app.route('/health')
 def health():
-    return "OK", 200
+    ok, reason = metrics.health()
+    return (reason, 200) if ok else (reason, 503)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 def run():
-    app.run(host='0.0.0.0', port=8080)
+    app.run(host='0.0.0.0', port=int(os.getenv('PORT', 8080)))
 
 def keep_alive():
-    t = Thread(target=run)
+    t = Thread(target=run, daemon=True)
     t.start()
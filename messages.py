@@ -0,0 +1,81 @@
+from collections import OrderedDict
+from datetime import datetime
+
+# Telegram обрезает сообщения длиннее 4096 символов
+MAX_DIGEST_LINES = 40
+
+
+def format_signal(signal):
+    """Сообщение с одним сигналом"""
+    return (
+        f"🚨 *ТОРГОВЫЙ СИГНАЛ*\n\n"
+        f"Актив: `{signal['asset']}`\n"
+        f"Направление: *{signal['direction']}*\n"
+        f"Уверенность: {signal['confidence']}%\n"
+        f"RSI: {signal['rsi']}\n"
+        f"Цена: {signal['price']}\n"
+        f"Время: {signal['time']}"
+    )
+
+
+def format_signal_line(signal):
+    """Строка сигнала в дайджесте"""
+    return (
+        f"`{signal['asset']}` *{signal['direction']}* {signal['confidence']}% · "
+        f"RSI {signal['rsi']} · {signal['price']}"
+    )
+
+
+# ==================== РЕНДЕРИНГ СООБЩЕНИЙ ====================
+class SignalRenderer:
+    """Кэш готовых текстов: сигнал рендерится один раз на всех подписчиков.
+
+    Дайджесты кэшируются по набору сигналов, поэтому пользователи с
+    одинаковыми фильтрами получают один и тот же текст без повторной сборки.
+    Старые записи вытесняются по LRU после size штук.
+    """
+
+    def __init__(self, size=1024):
+        self.size = size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.cache)
+
+    @staticmethod
+    def key(signal):
+        return signal['asset'], signal['direction'], signal['time'], signal['price']
+
+    def _cached(self, key, render):
+        text = self.cache.get(key)
+        if text is not None:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return text
+        self.misses += 1
+        text = self.cache[key] = render()
+        if len(self.cache) > self.size:
+            self.cache.popitem(last=False)
+        return text
+
+    def signal(self, signal):
+        return self._cached(('signal', self.key(signal)), lambda: format_signal(signal))
+
+    def digest(self, signals, pinned=False):
+        """Все сигналы цикла одним сообщением; pinned — текст для закрепленного сообщения"""
+        # Заголовок закрепа содержит текущее время, поэтому кэшируются только строки сигналов
+        body = self._cached(('digest', tuple(self.key(s) for s in signals)), lambda: self._render_lines(signals))
+        if pinned:
+            header = f"📌 *Последние сигналы* (обновлено {datetime.now().strftime('%H:%M:%S')})"
+        else:
+            header = f"🚨 *ТОРГОВЫЕ СИГНАЛЫ: {len(signals)}* ({signals[0]['time']})"
+        return header + "\n\n" + body
+
+    @staticmethod
+    def _render_lines(signals):
+        lines = [format_signal_line(s) for s in signals[:MAX_DIGEST_LINES]]
+        if len(signals) > MAX_DIGEST_LINES:
+            lines.append(f"…и еще {len(signals) - MAX_DIGEST_LINES}")
+        return "\n".join(lines)
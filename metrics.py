@@ -0,0 +1,223 @@
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+# ==================== МЕТРИКИ ====================
+# Минимальная реализация метрик в текстовом формате Prometheus. Метрики
+# обновляются из event loop бота, а в режиме polling читаются из потока
+# Flask, поэтому изменения защищены блокировкой.
+class Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(label, '')) for label in self.labels)
+
+    def _format_labels(self, key, extra=None):
+        pairs = list(zip(self.labels, key))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def drain(self):
+        """Прирост с прошлого вызова (обнуляет счетчик); None, если прироста нет"""
+        with self._lock:
+            values, self._values = self._values, {}
+        return values or None
+
+    def merge(self, values):
+        with self._lock:
+            for key, amount in values.items():
+                self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            values = dict(self._values) or ({(): 0} if not self.labels else {})
+        return [f"{self.name}{self._format_labels(k)} {v}" for k, v in values.items()]
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, help_text):
+        super().__init__(name, help_text)
+        self._value = 0.0
+        self._function = None
+
+    def set(self, value):
+        self._value = value
+
+    def set_function(self, function):
+        """Значение вычисляется при каждом чтении (например, число подписчиков)"""
+        self._function = function
+
+    def value(self):
+        if self._function is not None:
+            try:
+                return self._function()
+            except Exception:
+                return float('nan')
+        return self._value
+
+    def _samples(self):
+        value = self.value()
+        return [f"{self.name} {'NaN' if value is None else value}"]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(buckets)
+        self._counts = [0] * len(self.buckets)
+        self._sum = 0.0
+        self._count = 0
+
+    def observe(self, value):
+        with self._lock:
+            self._sum += value
+            self._count += 1
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self._counts[i] += 1
+
+    def drain(self):
+        """Наблюдения с прошлого вызова (обнуляет гистограмму); None, если их не было"""
+        with self._lock:
+            if not self._count:
+                return None
+            state = (self._counts, self._sum, self._count)
+            self._counts, self._sum, self._count = [0] * len(self.buckets), 0.0, 0
+        return state
+
+    def merge(self, state):
+        counts, total, count = state
+        with self._lock:
+            self._counts = [a + b for a, b in zip(self._counts, counts)]
+            self._sum += total
+            self._count += count
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def _samples(self):
+        with self._lock:
+            counts, total, count = list(self._counts), self._sum, self._count
+        lines = [
+            f"{self.name}_bucket{self._format_labels((), ('le', bound))} {c}"
+            for bound, c in zip(self.buckets, counts)
+        ]
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {count}')
+        lines.append(f"{self.name}_sum {total}")
+        lines.append(f"{self.name}_count {count}")
+        return lines
+
+
+REGISTRY = []
+
+CANDLE_FETCH_SECONDS = Histogram('pocket_candle_fetch_seconds', "Время запроса свечей (round-trip)")
+ANALYZE_SECONDS = Histogram('signal_analyze_seconds', "Время анализа активов за цикл")
+SCAN_CYCLE_SECONDS = Histogram('scan_cycle_seconds', "Длительность цикла сканирования")
+SCAN_CLOSE_LAG_SECONDS = Histogram('scan_close_lag_seconds', "Задержка от закрытия свечи до готовых сигналов")
+DELIVERY_LATENCY_SECONDS = Histogram(
+    'signal_delivery_latency_seconds', "Задержка от сигнала до доставки пользователю",
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+)
+
+SIGNALS = Counter('signals_total', "Найдено сигналов", labels=('direction',))
+MESSAGES_SENT = Counter('messages_sent_total', "Отправлено сообщений")
+MESSAGES_EDITED = Counter('messages_edited_total', "Закрепленных дайджестов обновлено правкой")
+SIGNALS_COALESCED = Counter('signals_coalesced_total', "Сообщений сэкономлено объединением сигналов в дайджесты")
+SEND_FAILURES = Counter('send_failures_total', "Ошибки отправки", labels=('kind',))
+RECONNECTS = Counter('pocket_reconnects_total', "Переподключения к Pocket Option")
+CANDLES_ARCHIVED = Counter('candles_archived_total', "Свечей записано в архив")
+WORKER_RESTARTS = Counter('scan_worker_restarts_total', "Перезапуски воркеров шардов")
+SIGNALS_SUPPRESSED = Counter('signals_suppressed_total', "Повторные сигналы, не отправленные из-за cooldown")
+SIGNAL_OUTCOMES = Counter('signal_outcomes_total', "Исходы сигналов на экспирации", labels=('result',))
+
+SUBSCRIBERS = Gauge('subscribers', "Число подписчиков")
+FEED_AGE_SECONDS = Gauge('pocket_feed_age_seconds', "Сколько секунд назад пришли данные от Pocket Option")
+FEED_CONNECTED = Gauge('pocket_feed_connected', "1, если соединение с Pocket Option живо")
+DELIVERY_QUEUE = Gauge('delivery_queue_size', "Сообщений в очереди отправки")
+SCAN_WORKERS = Gauge('scan_workers_alive', "Живых воркеров шардов")
+
+_health_check = None
+
+
+def drain():
+    """Прирост счетчиков и гистограмм процесса с прошлого вызова.
+
+    Воркеры шардов отправляют его с heartbeat, а главный процесс добавляет
+    через merge(), поэтому /metrics бота видит и метрики сканирования воркеров.
+    """
+    states = {}
+    for metric in REGISTRY:
+        if isinstance(metric, (Counter, Histogram)):
+            state = metric.drain()
+            if state is not None:
+                states[metric.name] = state
+    return states
+
+
+def merge(states):
+    by_name = {metric.name: metric for metric in REGISTRY}
+    for name, state in states.items():
+        by_name[name].merge(state)
+
+
+def render():
+    """Все метрики в текстовом формате Prometheus"""
+    return '\n'.join(metric.render() for metric in REGISTRY) + '\n'
+
+
+def set_health_check(check):
+    """check() -> (ok, описание); используется эндпоинтом /health"""
+    global _health_check
+    _health_check = check
+
+
+def health():
+    if _health_check is None:
+        return True, "OK"
+    try:
+        return _health_check()
+    except Exception as e:
+        return False, f"ошибка проверки: {e}"
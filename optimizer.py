@@ -0,0 +1,210 @@
+"""Подбор периода RSI и порогов SignalGenerator по истории свечей.
+
+Для каждого периода RSI считается один раз на актив. Все комбинации
+(lower, upper, min_confidence) оцениваются сразу: условие сигнала сводится к
+интервалу значений RSI, а число побед в интервале — к двум searchsorted по
+отсортированному RSI с префиксными суммами.
+
+Пример:
+    python optimizer.py data/*.csv --expiry 60 --out signal_params.json
+"""
+import argparse
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from backtest import MIN_CANDLES, asset_from_path, read_chunks, select_assets, split_tasks
+from indicators import rsi_series
+
+# Потолок уверенности из SignalGenerator.make_signal
+MAX_CONFIDENCE = 85
+
+
+def parse_range(text):
+    """'20:40:5' -> [20, 25, ..., 40], '7,14,21' -> [7, 14, 21]"""
+    if ':' in text:
+        start, stop, step = (float(x) for x in text.split(':'))
+        return list(np.arange(start, stop + step / 2, step))
+    return [float(x) for x in text.split(',')]
+
+
+def build_combos(lowers, uppers, confidences, samples=None, seed=0):
+    """Матрица комбинаций (lower, upper, min_confidence): сетка или случайная выборка"""
+    if samples:
+        rng = np.random.default_rng(seed)
+        combos = np.column_stack([
+            rng.uniform(min(lowers), max(lowers), samples),
+            rng.uniform(min(uppers), max(uppers), samples),
+            rng.uniform(min(confidences), max(confidences), samples),
+        ]).round(1)
+    else:
+        combos = np.array(np.meshgrid(lowers, uppers, confidences, indexing='ij')).reshape(3, -1).T
+    return combos[combos[:, 0] < combos[:, 1]]
+
+
+# ==================== ОЦЕНКА ====================
+def load_closes(path, chunk_size=200_000, assets=None):
+    """Цены закрытия по активам из файла (только assets, если заданы): {asset: np.ndarray}"""
+    parts = {}
+    for chunk in read_chunks(path, chunk_size):
+        chunk = select_assets(chunk, assets)
+        if 'asset' in chunk.columns:
+            groups = chunk.groupby('asset', sort=False)
+        else:
+            groups = [(asset_from_path(path), chunk)]
+        for asset, frame in groups:
+            parts.setdefault(asset, []).append(frame['close'].to_numpy(dtype=np.float64))
+    return {asset: np.concatenate(chunks) for asset, chunks in parts.items()}
+
+
+def count_in(sorted_rsi, prefix, low, high):
+    """Сумма prefix по значениям RSI строго внутри (low, high) для массивов границ"""
+    left = np.searchsorted(sorted_rsi, low, side='right')
+    right = np.searchsorted(sorted_rsi, high, side='left')
+    right = np.maximum(right, left)
+    return prefix[right] - prefix[left]
+
+
+def sweep_asset(closes, periods, combos, expiry_candles=1, wilder=False):
+    """Все комбинации для одного актива.
+
+    Возвращает массив строк (period, lower, upper, min_confidence, signals, wins, losses).
+    """
+    n = len(closes)
+    if n <= MIN_CANDLES + expiry_candles:
+        return np.empty((0, 7))
+
+    # Исход сделки не зависит от параметров: считаем его один раз
+    idx = np.arange(MIN_CANDLES - 1, n - expiry_candles)
+    move = np.sign(closes[idx + expiry_candles] - closes[idx])
+
+    lower, upper, min_conf = combos.T
+    # CALL: rsi < lower и 100 - (lower - rsi) > min_conf -> rsi в (lower + min_conf - 100, lower)
+    # PUT:  rsi > upper и 100 - (rsi - upper) > min_conf -> rsi в (upper, upper + 100 - min_conf)
+    blocked = min_conf >= MAX_CONFIDENCE
+    call_low, call_high = lower + min_conf - 100, lower
+    put_low, put_high = upper, upper + 100 - min_conf
+
+    rows = []
+    for period in periods:
+        rsi = rsi_series(closes, int(period), wilder)[idx]
+        valid = ~np.isnan(rsi)
+        order = np.argsort(rsi[valid], kind='stable')
+        sorted_rsi = rsi[valid][order]
+        sorted_move = move[valid][order]
+        ones = np.concatenate([[0], np.cumsum(np.ones(len(sorted_rsi)))])
+        ups = np.concatenate([[0], np.cumsum(sorted_move > 0)])
+        downs = np.concatenate([[0], np.cumsum(sorted_move < 0)])
+
+        call_signals = count_in(sorted_rsi, ones, call_low, call_high)
+        put_signals = count_in(sorted_rsi, ones, put_low, put_high)
+        wins = count_in(sorted_rsi, ups, call_low, call_high) + count_in(sorted_rsi, downs, put_low, put_high)
+        losses = count_in(sorted_rsi, downs, call_low, call_high) + count_in(sorted_rsi, ups, put_low, put_high)
+        signals = np.where(blocked, 0, call_signals + put_signals)
+        wins = np.where(blocked, 0, wins)
+        losses = np.where(blocked, 0, losses)
+
+        rows.append(np.column_stack([
+            np.full(len(combos), period), lower, upper, min_conf, signals, wins, losses
+        ]))
+    return np.vstack(rows)
+
+
+def rank(rows, min_signals=30, top=10):
+    """Лучшие комбинации по win rate (при равенстве — по числу сигналов)"""
+    resolved = rows[:, 5] + rows[:, 6]
+    win_rate = np.where(resolved > 0, 100.0 * rows[:, 5] / np.maximum(resolved, 1), 0.0)
+    eligible = np.flatnonzero(rows[:, 4] >= min_signals)
+    order = eligible[np.lexsort((-rows[eligible, 4], -win_rate[eligible]))][:top]
+    return [
+        {
+            'period': int(rows[i, 0]),
+            'lower': float(rows[i, 1]),
+            'upper': float(rows[i, 2]),
+            'min_confidence': float(rows[i, 3]),
+            'signals': int(rows[i, 4]),
+            'wins': int(rows[i, 5]),
+            'losses': int(rows[i, 6]),
+            'win_rate': round(float(win_rate[i]), 2),
+        }
+        for i in order
+    ]
+
+
+def optimize_file(path, periods, combos, expiry=60, timeframe=60, wilder=False,
+                  min_signals=30, top=10, assets=None):
+    """Подбор параметров для активов файла (всех или assets): {asset: [лучшие комбинации]}"""
+    logging.getLogger().setLevel(logging.WARNING)
+    expiry_candles = max(1, expiry // timeframe)
+    results = {}
+    for asset, closes in load_closes(path, assets=assets).items():
+        rows = sweep_asset(closes, periods, combos, expiry_candles, wilder)
+        results[asset] = rank(rows, min_signals, top)
+    return results
+
+
+# ==================== ОТЧЕТ ====================
+def print_report(results):
+    for asset in sorted(results):
+        print(f"\n📊 {asset}")
+        print(f"{'#':>3}{'Период':>8}{'Lower':>8}{'Upper':>8}{'MinConf':>9}{'Сигналов':>10}{'Win %':>8}")
+        for i, row in enumerate(results[asset], 1):
+            print(f"{i:>3}{row['period']:>8}{row['lower']:>8.1f}{row['upper']:>8.1f}"
+                  f"{row['min_confidence']:>9.1f}{row['signals']:>10}{row['win_rate']:>8.1f}")
+        if not results[asset]:
+            print("   нет комбинаций с достаточным числом сигналов")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Подбор параметров RSI по истории свечей")
+    parser.add_argument('files', nargs='+', help="CSV/Parquet файлы со свечами (time, close[, asset])")
+    parser.add_argument('--periods', default='7,9,14,21', help="Периоды RSI")
+    parser.add_argument('--lower', default='15:40:2.5', help="Нижний порог: список или start:stop:step")
+    parser.add_argument('--upper', default='60:85:2.5', help="Верхний порог: список или start:stop:step")
+    parser.add_argument('--min-confidence', default='50:80:5', help="Минимальная уверенность")
+    parser.add_argument('--random', type=int, default=0, help="Случайный поиск: число комбинаций вместо сетки")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--expiry', type=int, default=60, help="Экспирация сигнала, секунд")
+    parser.add_argument('--timeframe', type=int, default=60, help="Таймфрейм свечей, секунд")
+    parser.add_argument('--wilder', action='store_true', help="Сглаживание RSI по Уайлдеру")
+    parser.add_argument('--min-signals', type=int, default=30, help="Минимум сигналов для попадания в рейтинг")
+    parser.add_argument('--top', type=int, default=10, help="Сколько лучших комбинаций показывать")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="Процессов в пуле (делят между собой файлы и активы внутри файла)")
+    parser.add_argument('--out', default='signal_params.json',
+                        help="JSON с лучшими параметрами, который загружает SignalGenerator")
+    args = parser.parse_args()
+
+    periods = [int(p) for p in parse_range(args.periods)]
+    combos = build_combos(parse_range(args.lower), parse_range(args.upper),
+                          parse_range(args.min_confidence), args.random, args.seed)
+    print(f"🔍 {len(periods)} периодов x {len(combos)} комбинаций порогов")
+
+    options = dict(expiry=args.expiry, timeframe=args.timeframe, wilder=args.wilder,
+                   min_signals=args.min_signals, top=args.top)
+    results = {}
+    tasks = split_tasks(args.files, args.workers)
+    if args.workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            futures = [pool.submit(optimize_file, path, periods, combos, assets=assets, **options)
+                       for path, assets in tasks]
+            for future in futures:
+                results.update(future.result())
+    else:
+        for path in args.files:
+            results.update(optimize_file(path, periods, combos, **options))
+
+    print_report(results)
+
+    # Лучшая комбинация + рейтинг: SignalGenerator.load_params читает верхние поля
+    params = {asset: dict(ranked[0], ranked=ranked) for asset, ranked in results.items() if ranked}
+    with open(args.out, 'w') as f:
+        json.dump(params, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Параметры для {len(params)} активов сохранены в {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import os
+import time
+
+import numpy as np
+
+from delivery import TokenBucket
+from indicators import rsi_matrix
+
+TIMEFRAMES = (5, 15, 60, 300)
+
+
+def _check_timeframe(value):
+    timeframe = int(value)
+    if timeframe not in TIMEFRAMES:
+        raise ValueError(f"Таймфрейм {timeframe}с не поддерживается, допустимы: {TIMEFRAMES}")
+    return timeframe
+
+
+def timeframes_from_env():
+    """Таймфреймы из SCAN_TIMEFRAME (общий) и ASSET_TIMEFRAMES ("EURUSD_otc=5,GBPUSD_otc=15")"""
+    default = _check_timeframe(os.getenv('SCAN_TIMEFRAME', '60'))
+    per_asset = {}
+    for item in os.getenv('ASSET_TIMEFRAMES', '').split(','):
+        if item.strip():
+            asset, _, value = item.partition('=')
+            per_asset[asset.strip()] = _check_timeframe(value)
+    return default, per_asset
+
+
+# ==================== ПЛАНИРОВЩИК СКАНИРОВАНИЯ ====================
+class ScanScheduler:
+    """Будит сканер точно на закрытии свечей и распределяет запросы к серверу.
+
+    Активы могут иметь разные таймфреймы (asset_timeframes), по умолчанию
+    используется timeframe. Запросы свечей идут через общий token bucket,
+    а при нехватке бюджета первыми обслуживаются активы, у которых RSI ближе
+    всего к порогу или выше волатильность.
+    """
+
+    def __init__(self, timeframe=60, asset_timeframes=None, close_delay=0.05,
+                 request_rate=10, request_burst=20):
+        self.timeframe = timeframe
+        self.asset_timeframes = dict(asset_timeframes or {})
+        self.close_delay = close_delay
+        self.bucket = TokenBucket(request_rate, request_burst)
+        self._lock = asyncio.Lock()
+        self.late_wakeups = 0
+
+    def timeframe_of(self, asset):
+        return self.asset_timeframes.get(asset, self.timeframe)
+
+    def timeframes(self, assets=()):
+        return {self.timeframe} | {self.timeframe_of(a) for a in assets}
+
+    @staticmethod
+    def next_boundary(now, timeframe):
+        return (int(now) // timeframe + 1) * timeframe
+
+    async def wait_next(self, assets=()):
+        """Сон до ближайшего закрытия свечи. Возвращает (время закрытия, закрывшиеся таймфреймы)"""
+        now = time.time()
+        timeframes = self.timeframes(assets)
+        boundary = min(self.next_boundary(now, tf) for tf in timeframes)
+        await asyncio.sleep(max(0.0, boundary + self.close_delay - time.time()))
+        lag = time.time() - boundary
+        if lag > 1:
+            self.late_wakeups += 1
+            logging.warning(f"⏰ Сканер проснулся с опозданием {lag:.2f}с")
+        return boundary, {tf for tf in timeframes if boundary % tf == 0}
+
+    def due(self, assets, closed_timeframes):
+        """Активы, у которых только что закрылась свеча"""
+        return [a for a in assets if self.timeframe_of(a) in closed_timeframes]
+
+    async def acquire(self):
+        """Токен на один запрос к серверу; очередь ожидающих обслуживается по порядку"""
+        async with self._lock:
+            await self.bucket.acquire()
+
+    def rank(self, assets, store, generator):
+        """Активы по убыванию срочности: близость RSI к порогу, затем волатильность.
+
+        Период и пороги берутся из generator.params(asset), так что активы с
+        подобранными оптимизатором параметрами ранжируются по своим порогам.
+        """
+        params = {a: generator.params(a) for a in assets}
+        known = [a for a in assets if store.get(a) is not None and len(store.get(a)) > params[a][0] + 1]
+        known_set = set(known)
+        unknown = [a for a in assets if a not in known_set]
+        if not known:
+            return list(assets)
+
+        # Группируем по периоду RSI, чтобы считать каждую группу одной матрицей
+        groups = {}
+        for asset in known:
+            groups.setdefault(params[asset][0], []).append(asset)
+
+        distance = np.empty(len(known))
+        volatility = np.empty(len(known))
+        position = {asset: i for i, asset in enumerate(known)}
+        for period, group in groups.items():
+            closes = np.array([store.get(a).closes(period + 1) for a in group], dtype=np.float64)
+            rsi = rsi_matrix(closes, period)
+            lower = np.array([params[a][1] for a in group], dtype=np.float64)
+            upper = np.array([params[a][2] for a in group], dtype=np.float64)
+            gap = np.minimum(np.abs(rsi - lower), np.abs(rsi - upper))
+            # Внутри порогов расстояние положительное, за порогами сигнал уже есть
+            gap = np.where((rsi < lower) | (rsi > upper), 0, gap)
+            returns = np.diff(np.log(np.clip(closes, 1e-12, None)), axis=1)
+            index = [position[a] for a in group]
+            distance[index] = gap
+            volatility[index] = returns.std(axis=1)
+
+        order = np.lexsort((-volatility, distance))
+        return [known[i] for i in order] + unknown
@@ -0,0 +1,310 @@
+import asyncio
+import logging
+import multiprocessing
+import queue
+import random
+import time
+import zlib
+
+import metrics
+from candle_archive import create_candle_archive
+from candle_store import CandleStore
+from scheduler import ScanScheduler, timeframes_from_env
+from signal_cache import create_outcome_tracker, create_signal_cache
+
+HEARTBEAT_INTERVAL = 2
+
+
+def shard_of(asset, shards):
+    """Номер шарда актива; не зависит от PYTHONHASHSEED и порядка активов"""
+    return zlib.crc32(asset.encode()) % shards
+
+
+# ==================== ВОРКЕР ШАРДА ====================
+def run_worker(shard_id, shards, ssid, inbox, outbox):
+    """Точка входа процесса-воркера: свое соединение, свечи и состояние индикаторов"""
+    try:
+        asyncio.run(_worker_main(shard_id, shards, ssid, inbox, outbox))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _worker_main(shard_id, shards, ssid, inbox, outbox):
+    # bot импортирует этот модуль, поэтому импорт внутри функции
+    from bot import MarketScanner, create_signal_generator
+
+    generator = create_signal_generator()
+    timeframe, asset_timeframes = timeframes_from_env()
+    store = CandleStore(capacity=200, timeframe=timeframe, timeframes=asset_timeframes)
+
+    watched = None  # None — все активы шарда
+
+    def own(universe):
+        return [a for a in universe if shard_of(a, shards) == shard_id]
+
+    def select(universe):
+        return [a for a in own(universe) if watched is None or a in watched]
+
+    scanner = MarketScanner(
+        ssid, generator, store, ScanScheduler(timeframe, asset_timeframes),
+        on_signals=lambda signals: outbox.put(('signals', shard_id, signals)),
+        select_assets=select,
+        signal_cache=create_signal_cache(),
+        outcomes=create_outcome_tracker(),
+        on_outcome=lambda outcome: outbox.put(('outcome', shard_id, outcome)),
+        # Активы шардов не пересекаются, поэтому каждый воркер пишет свои файлы архива
+        archive=create_candle_archive(timeframe, asset_timeframes)
+    )
+    scan_task = asyncio.create_task(scanner.run())
+    loop = asyncio.get_running_loop()
+    universe = None
+    logging.info(f"🧩 Воркер шарда {shard_id}/{shards} запущен")
+
+    try:
+        while not scan_task.done():
+            try:
+                message = await loop.run_in_executor(None, inbox.get, True, HEARTBEAT_INTERVAL)
+            except queue.Empty:
+                message = None
+            if message is not None:
+                if message[0] == 'stop':
+                    break
+                if message[0] == 'watched':
+                    watched = message[1]
+
+            assets = own(generator.assets)
+            if assets != universe:
+                universe = assets
+                outbox.put(('universe', shard_id, assets))
+
+            supervisor = scanner.supervisor
+            outbox.put(('heartbeat', shard_id, {
+                'connected': bool(supervisor and supervisor.connected),
+                'problem': supervisor.problem() if supervisor else "соединение не создано",
+                'feed_age': supervisor.feed_age() if supervisor else None,
+                'reconnects': supervisor.reconnects if supervisor else 0,
+                'downtime': supervisor.total_downtime() if supervisor else 0.0,
+                'cycles': scanner.cycles,
+                # Метрики воркера видны только через /metrics главного процесса
+                'metrics': metrics.drain(),
+            }))
+    finally:
+        scanner.stop()
+        scan_task.cancel()
+        await asyncio.gather(scan_task, return_exceptions=True)
+
+
+# ==================== ПУЛ ВОРКЕРОВ ====================
+class ShardWorker:
+    """Состояние одного воркера глазами главного процесса"""
+
+    def __init__(self, shard_id):
+        self.shard_id = shard_id
+        self.process = None
+        self.inbox = None
+        self.last_heartbeat = 0.0
+        self.status = {}
+        self.universe = []
+        self.failures = 0
+        self.restart_at = 0.0
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.is_alive()
+
+
+class ShardPool:
+    """Делит активы между процессами-воркерами и перезапускает упавшие.
+
+    Каждый воркер держит свое соединение с Pocket Option и анализирует только
+    активы своего шарда (shard_of), а найденные сигналы отправляет в общую
+    очередь; главный процесс передает их в on_signals. Воркер, который
+    завершился или перестал слать heartbeat, перезапускается с
+    экспоненциальной паузой.
+
+    Снаружи пул выглядит как ConnectionSupervisor (healthy, problem() и т.д.),
+    поэтому /status и /health работают без изменений. Свечи, соединения и
+    архив живут только в воркерах.
+    """
+
+    def __init__(self, ssid, workers, on_signals, signal_generator=None,
+                 heartbeat_timeout=60, check_interval=2, base_backoff=1, max_backoff=60, on_outcome=None):
+        self.ssid = ssid
+        self.shards = workers
+        self.on_signals = on_signals
+        self.on_outcome = on_outcome
+        self.signal_generator = signal_generator
+        self.heartbeat_timeout = heartbeat_timeout
+        self.check_interval = check_interval
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        # spawn: в дочерний процесс не копируются потоки и event loop главного
+        self.ctx = multiprocessing.get_context('spawn')
+        self.outbox = self.ctx.Queue()
+        self.workers = {shard_id: ShardWorker(shard_id) for shard_id in range(workers)}
+        self.watched = None
+        self.restarts = 0
+        self.running = False
+        self._reader = None
+
+    # --- интерфейс ConnectionSupervisor ---
+    @property
+    def connected(self):
+        return any(w.alive and w.status.get('connected') for w in self.workers.values())
+
+    @property
+    def healthy(self):
+        return self.problem() is None
+
+    def _worker_problem(self, worker):
+        if not worker.alive:
+            return f"воркер шарда {worker.shard_id} не запущен"
+        if not worker.status:
+            return f"воркер шарда {worker.shard_id} еще не подключился"
+        if worker.status.get('problem'):
+            return f"шард {worker.shard_id}: {worker.status['problem']}"
+        return None
+
+    def _problems(self):
+        return [p for p in map(self._worker_problem, self.workers.values()) if p]
+
+    def problem(self):
+        """Пул неработоспособен, только если не работает ни один шард"""
+        problems = self._problems()
+        if problems and len(problems) == len(self.workers):
+            return "; ".join(problems)
+        return None
+
+    def degraded(self):
+        """Часть шардов не работает: сигналы по их активам не приходят"""
+        problems = self._problems()
+        if problems and len(problems) < len(self.workers):
+            return "; ".join(problems)
+        return None
+
+    def feed_age(self):
+        ages = [w.status.get('feed_age') for w in self.workers.values()]
+        ages = [age for age in ages if age is not None]
+        return max(ages) if ages else None
+
+    @property
+    def reconnects(self):
+        return sum(w.status.get('reconnects', 0) for w in self.workers.values())
+
+    def total_downtime(self):
+        return max((w.status.get('downtime', 0.0) for w in self.workers.values()), default=0.0)
+
+    def alive(self):
+        return sum(w.alive for w in self.workers.values())
+
+    # --- управление процессами ---
+    def _start(self, worker):
+        worker.inbox = self.ctx.Queue()
+        worker.inbox.put(('watched', self.watched))
+        process = self.ctx.Process(
+            target=run_worker,
+            args=(worker.shard_id, self.shards, self.ssid, worker.inbox, self.outbox),
+            name=f'scan-shard-{worker.shard_id}',
+            daemon=True,
+        )
+        process.start()
+        worker.process = process
+        worker.last_heartbeat = time.monotonic()
+        worker.status = {}
+
+    def _reap(self, worker, reason):
+        logging.error(f"💥 Воркер шарда {worker.shard_id}: {reason}, перезапуск")
+        if worker.process.is_alive():
+            worker.process.kill()
+        worker.process.join(timeout=5)
+        worker.process = None
+        worker.failures += 1
+        self.restarts += 1
+        metrics.WORKER_RESTARTS.inc()
+        delay = min(self.max_backoff, self.base_backoff * 2 ** (worker.failures - 1))
+        worker.restart_at = time.monotonic() + delay * random.uniform(0.5, 1.0)
+
+    def _check(self):
+        now = time.monotonic()
+        for worker in self.workers.values():
+            if worker.process is None:
+                if now >= worker.restart_at:
+                    self._start(worker)
+            elif not worker.process.is_alive():
+                self._reap(worker, f"процесс завершился с кодом {worker.process.exitcode}")
+            elif now - worker.last_heartbeat > self.heartbeat_timeout:
+                self._reap(worker, f"нет heartbeat {now - worker.last_heartbeat:.0f}с")
+
+    def set_watched(self, watched):
+        """Активы, за которыми следят подписчики (None — все); рассылается воркерам"""
+        if watched == self.watched:
+            return
+        self.watched = watched
+        for worker in self.workers.values():
+            if worker.alive:
+                worker.inbox.put(('watched', watched))
+
+    # --- сообщения от воркеров ---
+    def _handle(self, message):
+        kind, shard_id = message[0], message[1]
+        worker = self.workers[shard_id]
+        if kind == 'signals':
+            self.on_signals(message[2])
+        elif kind == 'outcome':
+            if self.on_outcome:
+                self.on_outcome(message[2])
+        elif kind == 'heartbeat':
+            worker.last_heartbeat = time.monotonic()
+            metrics.merge(message[2].pop('metrics', {}))
+            if message[2]['connected']:
+                worker.failures = 0
+            worker.status = message[2]
+        elif kind == 'universe':
+            worker.universe = message[2]
+            if self.signal_generator is not None:
+                universe = [a for w in self.workers.values() for a in w.universe]
+                if universe:
+                    self.signal_generator.assets = universe
+
+    async def _read_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await loop.run_in_executor(None, self.outbox.get)
+            if message is None:
+                return
+            try:
+                self._handle(message)
+            except Exception as e:
+                logging.error(f"❌ Ошибка обработки сообщения воркера: {e}")
+
+    async def run(self, watched=None):
+        """Запуск воркеров и надзор за ними; watched() — текущий фильтр активов"""
+        logging.info(f"🧩 Сканирование в {self.shards} процессах")
+        self.running = True
+        self._reader = asyncio.create_task(self._read_loop())
+        while self.running:
+            try:
+                if watched is not None:
+                    self.set_watched(watched())
+                self._check()
+            except Exception as e:
+                logging.error(f"❌ Ошибка супервизора воркеров: {e}")
+            await asyncio.sleep(self.check_interval)
+
+    async def stop(self):
+        self.running = False
+        for worker in self.workers.values():
+            if worker.alive:
+                worker.inbox.put(('stop',))
+        loop = asyncio.get_running_loop()
+        for worker in self.workers.values():
+            if worker.process is None:
+                continue
+            await loop.run_in_executor(None, worker.process.join, 10)
+            if worker.process.is_alive():
+                worker.process.kill()
+            worker.process = None
+        if self._reader is not None:
+            self.outbox.put(None)
+            await asyncio.gather(self._reader, return_exceptions=True)
+            self._reader = None
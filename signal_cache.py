@@ -0,0 +1,174 @@
+import bisect
+import os
+import time
+
+import numpy as np
+
+import metrics
+
+
+# ==================== ПОВТОРЫ СИГНАЛОВ ====================
+class SignalCache:
+    """Подавление повторных сигналов по (актив, направление).
+
+    После сигнала направление «разряжается»: следующий сигнал того же
+    направления пройдет, только когда RSI вернется за порог на hysteresis
+    пунктов (для CALL — выше lower + hysteresis) и пройдет cooldown секунд.
+    С комбинированной стратегией порогов RSI нет, и направление взводится
+    через observe_signals — когда стратегия перестала давать этот сигнал.
+    Взведенные записи старше ttl удаляются, поэтому кэш не растет со временем;
+    пока актив в зоне сигнала, запись живет, чтобы сигнал не повторился.
+    """
+
+    def __init__(self, cooldown=300, hysteresis=5, ttl=3600):
+        self.cooldown = cooldown
+        self.hysteresis = hysteresis
+        self.ttl = max(ttl, cooldown)
+        self.entries = {}  # (asset, 'CALL'/'PUT') -> [время сигнала, взведено ли]
+        self.suppressed = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def observe(self, rsi_by_asset, params):
+        """Взвод направлений, у которых RSI вышел из зоны сигнала; params(asset) как у SignalGenerator"""
+        for (asset, direction), entry in self.entries.items():
+            rsi = rsi_by_asset.get(asset)
+            if entry[1] or rsi is None or rsi != rsi:
+                continue
+            _, lower, upper, _ = params(asset)
+            if direction == 'CALL' and rsi >= lower + self.hysteresis:
+                entry[1] = True
+            elif direction == 'PUT' and rsi <= upper - self.hysteresis:
+                entry[1] = True
+
+    def observe_signals(self, assets, signals):
+        """Взвод направлений без гистерезиса: актив проанализирован, а сигнала в эту сторону нет"""
+        assets = set(assets)
+        current = {(s['asset'], s['direction'].split()[0]) for s in signals}
+        for key, entry in self.entries.items():
+            if not entry[1] and key[0] in assets and key not in current:
+                entry[1] = True
+
+    def admit(self, signals, now=None):
+        """Сигналы, которые стоит разослать; остальные считаются повторами"""
+        now = time.time() if now is None else now
+        self.evict(now)
+        admitted = []
+        for signal in signals:
+            key = (signal['asset'], signal['direction'].split()[0])
+            entry = self.entries.get(key)
+            if entry is not None and not (entry[1] and now - entry[0] >= self.cooldown):
+                self.suppressed += 1
+                metrics.SIGNALS_SUPPRESSED.inc()
+                continue
+            self.entries[key] = [now, False]
+            admitted.append(signal)
+        return admitted
+
+    def evict(self, now):
+        # Невзведенная запись означает, что актив все еще в зоне сигнала
+        stale = [key for key, (sent_at, armed) in self.entries.items() if armed and now - sent_at > self.ttl]
+        for key in stale:
+            del self.entries[key]
+
+
+def create_signal_cache():
+    """Кэш по переменным окружения SIGNAL_COOLDOWN, SIGNAL_HYSTERESIS, SIGNAL_CACHE_TTL"""
+    return SignalCache(
+        cooldown=float(os.getenv('SIGNAL_COOLDOWN', '300')),
+        hysteresis=float(os.getenv('SIGNAL_HYSTERESIS', '5')),
+        ttl=float(os.getenv('SIGNAL_CACHE_TTL', '3600')),
+    )
+
+
+# ==================== ИСХОДЫ СИГНАЛОВ ====================
+class OutcomeTracker:
+    """Разосланные сигналы до экспирации; итог берется из живого CandleStore.
+
+    Сигнал на закрытии свечи entry сравнивается с закрытием свечи через
+    expiry секунд, округленных до целых свечей (не меньше одной) — так же,
+    как считает backtest.py.
+    """
+
+    def __init__(self, expiry=60):
+        self.expiry = expiry
+        self.pending = []  # (время, когда свеча выхода закроется, порядковый номер, запись)
+        self._seq = 0
+
+    def __len__(self):
+        return len(self.pending)
+
+    def track(self, signal, boundary, timeframe):
+        """boundary — время закрытия свечи, на которой найден сигнал"""
+        entry_time = boundary - timeframe
+        # Экспирация округляется до целых свечей, как в backtest.py
+        exit_time = entry_time + max(1, self.expiry // timeframe) * timeframe
+        self._seq += 1
+        bisect.insort(self.pending, (exit_time + timeframe, self._seq, {
+            'asset': signal['asset'],
+            'direction': signal['direction'].split()[0],
+            'entry_price': float(signal['price']),
+            'entry_time': entry_time,
+            'exit_time': exit_time,
+        }))
+
+    def resolve(self, store, now=None):
+        """Итоги сигналов, у которых закрылась свеча выхода"""
+        now = time.time() if now is None else now
+        results = []
+        while self.pending and self.pending[0][0] <= now:
+            _, _, record = self.pending.pop(0)
+            record['exit_price'], record['result'] = None, 'unknown'
+            buf = store.get(record['asset'])
+            if buf is not None and len(buf):
+                times, _, _, _, closes = buf.arrays()
+                entry, exit_ = np.searchsorted(times, [record['entry_time'], record['exit_time']])
+                if exit_ < len(times) and times[exit_] == record['exit_time']:
+                    # Цена в сигнале округлена, поэтому берем точное закрытие свечи входа
+                    if times[entry] == record['entry_time']:
+                        record['entry_price'] = float(closes[entry])
+                    record['exit_price'] = float(closes[exit_])
+                    move = record['exit_price'] - record['entry_price']
+                    if record['direction'] == 'PUT':
+                        move = -move
+                    record['result'] = 'win' if move > 0 else 'loss' if move < 0 else 'draw'
+            results.append(record)
+        return results
+
+
+def create_outcome_tracker():
+    """Трекер с экспирацией из SIGNAL_EXPIRY (секунд)"""
+    return OutcomeTracker(expiry=int(os.getenv('SIGNAL_EXPIRY', '60')))
+
+
+class OutcomeStats:
+    """Живая статистика исходов для /status"""
+
+    def __init__(self):
+        self.stats = {'wins': 0, 'losses': 0, 'draws': 0, 'unknown': 0}
+        self.by_direction = {'CALL': {'wins': 0, 'losses': 0}, 'PUT': {'wins': 0, 'losses': 0}}
+
+    def record(self, outcome):
+        key = {'win': 'wins', 'loss': 'losses', 'draw': 'draws'}.get(outcome['result'], 'unknown')
+        self.stats[key] += 1
+        direction = self.by_direction.get(outcome['direction'])
+        if direction is not None and key in direction:
+            direction[key] += 1
+        metrics.SIGNAL_OUTCOMES.inc(result=outcome['result'])
+
+    @staticmethod
+    def win_rate(stats):
+        resolved = stats['wins'] + stats['losses']
+        return 100.0 * stats['wins'] / resolved if resolved else None
+
+    def text(self):
+        total = self.win_rate(self.stats)
+        if total is None:
+            return "🎯 Винрейт: нет завершенных сигналов"
+        parts = [f"🎯 Винрейт: {total:.1f}% ({self.stats['wins']}/{self.stats['wins'] + self.stats['losses']})"]
+        for direction, stats in self.by_direction.items():
+            rate = self.win_rate(stats)
+            if rate is not None:
+                parts.append(f"{direction} {rate:.0f}%")
+        return ', '.join(parts)
@@ -0,0 +1,301 @@
+"""Локальный симулятор потока Pocket Option для офлайн-тестов и бенчмарков.
+
+Сервер говорит на том же подмножестве socket.io, что и PocketOptionClient:
+auth, getAssets, getCandles (ответ через ack), changeSymbol и поток
+updateStream. Цены детерминированы: случайное блуждание с режимами тренда
+от seed или повтор записанных свечей (CSV/Parquet, как у backtest.py).
+
+Пример:
+    python simulator.py --assets 200 --seed 42 --port 8765
+    POCKET_WS_URL=ws://127.0.0.1:8765/ python bot.py
+"""
+import argparse
+import asyncio
+import json
+import logging
+import re
+import time
+import zlib
+
+import numpy as np
+import websockets
+
+DEFAULT_ASSETS = (
+    "EURUSD_otc", "GBPUSD_otc", "USDJPY_otc", "AUDUSD_otc", "BTCUSD_otc", "ETHUSD_otc",
+    "EURJPY_otc", "GBPJPY_otc", "USDCHF_otc",
+)
+
+
+def base_price(asset):
+    if "BTC" in asset:
+        return 50000.0
+    if "ETH" in asset:
+        return 3000.0
+    if "JPY" in asset:
+        return 150.0
+    return 1.1
+
+
+def asset_names(count):
+    names = list(DEFAULT_ASSETS[:count])
+    names += [f"SIM{i:04d}_otc" for i in range(len(names), count)]
+    return names
+
+
+# ==================== ЦЕНЫ ====================
+class PriceWalk:
+    """Тиковые цены одного актива: блуждание с режимами тренда.
+
+    Режим (снос и волатильность) держится случайное число тиков, поэтому
+    на графике есть тренды и развороты и RSI доходит до порогов, в отличие
+    от независимых случайных цен. Ряд достраивается лениво и полностью
+    определяется (seed, asset); path задает начало ряда (повтор записи).
+    """
+
+    def __init__(self, asset, seed=0, volatility=0.0002, regime_ticks=300, path=None):
+        self.rng = np.random.default_rng([seed, zlib.crc32(asset.encode())])
+        self.volatility = volatility
+        self.regime_ticks = regime_ticks
+        self.prices = np.asarray(path, dtype=np.float64) if path is not None else np.array([base_price(asset)])
+
+    def extend(self, n):
+        """Гарантирует, что в ряду есть хотя бы n тиков"""
+        missing = n - len(self.prices)
+        if missing <= 0:
+            return
+        lengths, drifts, vols = [], [], []
+        total = 0
+        while total < missing:
+            length = int(self.rng.geometric(1 / self.regime_ticks))
+            lengths.append(length)
+            drifts.append(self.rng.normal(0, self.volatility * 0.05))
+            vols.append(self.volatility * self.rng.uniform(0.5, 1.5))
+            total += length
+        drift = np.repeat(drifts, lengths)[:missing]
+        vol = np.repeat(vols, lengths)[:missing]
+        steps = drift + vol * self.rng.standard_normal(missing)
+        tail = self.prices[-1] * np.exp(np.cumsum(steps))
+        self.prices = np.concatenate([self.prices, tail])
+
+
+class MarketSimulator:
+    """Детерминированный рынок: assets — число активов или список имен.
+
+    Время симуляции идет в speed раз быстрее реального и начинается с
+    start; history секунд истории до start доступны через candles().
+    """
+
+    def __init__(self, assets=20, seed=42, tick=1.0, speed=1.0, history=6 * 3600,
+                 start=None, replay=None, volatility=0.0002):
+        self.seed = seed
+        self.tick = tick
+        self.speed = speed
+        self.start = time.time() if start is None else start
+        self.origin = self.start - history  # время тика 0
+        self._wall_start = time.monotonic()
+        replay = replay or {}
+        for candles in replay.values():
+            # Запись проигрывается так, чтобы последняя свеча закрылась в start
+            times = np.asarray(candles['time'], dtype=np.float64)
+            self.origin = min(self.origin, self.start - (times[-1] - times[0]))
+        if isinstance(assets, int):
+            names = list(replay) + [a for a in asset_names(assets) if a not in replay]
+            self.assets = names[:max(assets, len(replay))]
+        else:
+            self.assets = list(dict.fromkeys([*replay, *assets]))
+        self.walks = {}
+        for asset in self.assets:
+            path = None
+            if asset in replay:
+                path = self._replay_path(replay[asset])
+            self.walks[asset] = PriceWalk(asset, seed, volatility, path=path)
+
+    def _replay_path(self, candles):
+        """Записанные свечи (time, close) -> тиковые цены с линейной интерполяцией"""
+        times = np.asarray(candles['time'], dtype=np.float64)
+        closes = np.asarray(candles['close'], dtype=np.float64)
+        times = times - times[-1] + self.start
+        ticks = self.origin + np.arange(int((self.start - self.origin) / self.tick) + 1) * self.tick
+        return np.interp(ticks, times, closes)
+
+    def now(self):
+        """Текущее время симуляции"""
+        return self.start + (time.monotonic() - self._wall_start) * self.speed
+
+    def _index(self, t):
+        return int((t - self.origin) // self.tick)
+
+    def ticks(self, asset, t_from, t_to):
+        """Тики в (t_from, t_to]: (время, цена)"""
+        first = max(0, self._index(t_from) + 1)
+        last = self._index(t_to)
+        if last < first:
+            return np.empty(0), np.empty(0)
+        walk = self.walks[asset]
+        walk.extend(last + 1)
+        idx = np.arange(first, last + 1)
+        return self.origin + idx * self.tick, walk.prices[first:last + 1]
+
+    def candles(self, asset, timeframe=60, count=100, end=None):
+        """Последние count свечей на момент end (последняя может быть незакрытой)"""
+        end = self.now() if end is None else end
+        last_open = int(end) - int(end) % timeframe
+        first_open = max(last_open - (count - 1) * timeframe, int(self.origin) + timeframe)
+        times, prices = self.ticks(asset, first_open - self.tick, end)
+        keep = times >= first_open
+        times, prices = times[keep], prices[keep]
+        if not len(prices):
+            return []
+        buckets = (times.astype(np.int64) // timeframe) * timeframe
+        starts = np.flatnonzero(np.diff(buckets, prepend=-1))
+        ends = np.append(starts[1:], len(prices)) - 1
+        return [
+            {'time': int(t), 'open': float(o), 'high': float(h), 'low': float(l), 'close': float(c)}
+            for t, o, h, l, c in zip(
+                buckets[starts], prices[starts],
+                np.maximum.reduceat(prices, starts), np.minimum.reduceat(prices, starts), prices[ends]
+            )
+        ]
+
+
+def load_replay(paths):
+    """Записанные свечи из CSV/Parquet: {asset: DataFrame(time, close)}"""
+    import pandas as pd
+    from backtest import asset_from_path, read_chunks
+
+    replay = {}
+    for path in paths:
+        frame = pd.concat(read_chunks(path), ignore_index=True)
+        if 'asset' in frame:
+            for asset, group in frame.groupby('asset'):
+                replay[asset] = group.sort_values('time')
+        else:
+            replay[asset_from_path(path)] = frame.sort_values('time')
+    return replay
+
+
+# ==================== СЕРВЕР ====================
+class SimulatorServer:
+    """WebSocket-сервер с протоколом Pocket Option поверх MarketSimulator"""
+
+    def __init__(self, simulator, host='127.0.0.1', port=8765, stream_interval=0.05):
+        self.simulator = simulator
+        self.host = host
+        self.port = port
+        self.stream_interval = stream_interval
+        self.server = None
+        self.connections = 0
+        self.ticks_sent = 0
+        self.candles_sent = 0
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}/"
+
+    async def start(self):
+        self.server = await websockets.serve(self._handle, self.host, self.port, max_size=None)
+        # port=0: берем порт, выданный системой
+        self.port = self.server.sockets[0].getsockname()[1]
+        logging.info(f"🧪 Симулятор Pocket Option: {self.url} ({len(self.simulator.assets)} активов)")
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def _handle(self, ws):
+        self.connections += 1
+        subscriptions = set()
+        stream_task = asyncio.create_task(self._stream(ws, subscriptions))
+        try:
+            await ws.send('0' + json.dumps({"sid": f"sim{self.connections}", "pingInterval": 25000,
+                                            "pingTimeout": 20000}))
+            async for frame in ws:
+                await self._on_frame(ws, frame, subscriptions)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            stream_task.cancel()
+
+    async def _on_frame(self, ws, frame, subscriptions):
+        if frame == '2':
+            await ws.send('3')
+            return
+        if frame.startswith('40'):
+            await ws.send('40' + json.dumps({"sid": f"sim{self.connections}"}))
+            return
+        match = re.match(r'42(\d*)(.*)', frame, re.S)
+        if not match:
+            return
+        ack_id, (event, *args) = match.group(1), json.loads(match.group(2))
+        payload = args[0] if args else {}
+
+        if event == 'auth':
+            await ws.send('42' + json.dumps(["successauth", {"id": "simulator"}]))
+        elif event == 'getAssets':
+            await self._reply(ws, ack_id, event, self.simulator.assets)
+        elif event == 'getCandles':
+            asset = payload.get('asset')
+            candles = []
+            if asset in self.simulator.walks:
+                candles = self.simulator.candles(asset, int(payload.get('timeframe', 60)),
+                                                 int(payload.get('count', 100)))
+            self.candles_sent += len(candles)
+            await self._reply(ws, ack_id, event, {"asset": asset, "candles": candles})
+        elif event == 'changeSymbol':
+            if payload.get('asset') in self.simulator.walks:
+                subscriptions.add(payload['asset'])
+
+    @staticmethod
+    async def _reply(ws, ack_id, event, data):
+        if ack_id:
+            await ws.send(f'43{ack_id}' + json.dumps([data], separators=(',', ':')))
+        else:
+            await ws.send('42' + json.dumps([event, data], separators=(',', ':')))
+
+    async def _stream(self, ws, subscriptions):
+        """Все тики подписанных активов с прошлой отправки, одним кадром updateStream"""
+        sent_until = self.simulator.now()
+        while True:
+            await asyncio.sleep(self.stream_interval)
+            now = self.simulator.now()
+            items = []
+            for asset in list(subscriptions):
+                times, prices = self.simulator.ticks(asset, sent_until, now)
+                items.extend([asset, float(t), float(p)] for t, p in zip(times, prices))
+            sent_until = now
+            if items:
+                self.ticks_sent += len(items)
+                await ws.send('42' + json.dumps(["updateStream", items], separators=(',', ':')))
+
+
+async def serve(args):
+    replay = load_replay(args.replay) if args.replay else None
+    simulator = MarketSimulator(assets=args.assets, seed=args.seed, tick=args.tick,
+                                speed=args.speed, replay=replay)
+    server = SimulatorServer(simulator, args.host, args.port)
+    await server.start()
+    await asyncio.Future()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальный симулятор потока Pocket Option")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--assets', type=int, default=20, help="Число активов")
+    parser.add_argument('--seed', type=int, default=42, help="Seed случайного блуждания")
+    parser.add_argument('--tick', type=float, default=1.0, help="Интервал тиков, секунд симуляции")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="Ускорение времени (для запуска бота оставьте 1)")
+    parser.add_argument('--replay', nargs='*', help="CSV/Parquet со свечами для повтора")
+    args = parser.parse_args()
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+# ==================== ХРАНИЛИЩЕ ПОДПИСЧИКОВ И СИГНАЛОВ ====================
+class Storage:
+    """Базовое хранилище: держит все в памяти и ничего не пишет на диск.
+
+    Методы add_/remove_subscriber, record_signal и record_outcome не блокируют:
+    изменения копятся в памяти, а бэкенд сбрасывает их пачкой раз в flush_interval.
+    """
+
+    # Видят ли изменения другие реплики (в памяти — нет)
+    shared = False
+
+    def __init__(self, flush_interval=2.0):
+        self.flush_interval = flush_interval
+        self._pending_subscribers = {}  # user_id -> True (подписан) / False (отписан)
+        self._pending_signals = []
+        self._pending_watchlists = {}  # user_id -> dict настроек
+        self._pending_outcomes = []
+        self._flush_task = None
+
+    async def start(self):
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self._flush_task:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        await self.flush()
+
+    async def load_subscribers(self):
+        return set()
+
+    async def load_watchlists(self):
+        return {}
+
+    async def acquire_lease(self, name, owner, ttl):
+        """Захват/продление аренды между репликами; в памяти реплика всегда одна"""
+        return True
+
+    async def release_lease(self, name, owner):
+        pass
+
+    def save_watchlist(self, user_id, settings):
+        self._pending_watchlists[user_id] = settings
+
+    def add_subscriber(self, user_id):
+        self._pending_subscribers[user_id] = True
+
+    def remove_subscriber(self, user_id):
+        self._pending_subscribers[user_id] = False
+
+    def record_signal(self, signal):
+        self._pending_signals.append((
+            signal['asset'], signal['direction'], signal['confidence'],
+            signal['rsi'], signal['price'], time.time()
+        ))
+
+    def record_outcome(self, outcome):
+        self._pending_outcomes.append((
+            outcome['asset'], outcome['direction'], outcome['entry_price'], outcome['exit_price'],
+            outcome['result'], outcome['entry_time'], outcome['exit_time']
+        ))
+
+    def _take_pending(self):
+        pending = (self._pending_subscribers, self._pending_signals,
+                   self._pending_watchlists, self._pending_outcomes)
+        self._pending_subscribers, self._pending_signals = {}, []
+        self._pending_watchlists, self._pending_outcomes = {}, []
+        return pending
+
+    def pending_users(self):
+        """Пользователи с еще не записанными изменениями: ({user_id: подписан ли}, {user_id})"""
+        return dict(self._pending_subscribers), set(self._pending_watchlists)
+
+    async def flush(self):
+        self._take_pending()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logging.error(f"❌ Ошибка записи в хранилище: {e}")
+
+
+class SQLiteStorage(Storage):
+    """SQLite в режиме WAL; весь дисковый ввод-вывод идет в отдельном потоке.
+
+    Общим хранилищем для реплик файл служит, только если все они работают
+    на одном хосте с одной локальной файловой системой: WAL держит индекс в
+    разделяемой памяти, а блокировки SQLite на сетевых ФС (NFS, SMB)
+    ненадежны, и аренда acquire_lease там может достаться двум репликам сразу.
+    """
+
+    shared = True
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS subscribers (
+            user_id INTEGER PRIMARY KEY,
+            subscribed_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS signals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            asset TEXT NOT NULL,
+            direction TEXT NOT NULL,
+            confidence REAL,
+            rsi REAL,
+            price REAL,
+            created_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_signals_asset_time ON signals (asset, created_at);
+        CREATE INDEX IF NOT EXISTS idx_signals_time ON signals (created_at);
+        CREATE TABLE IF NOT EXISTS watchlists (
+            user_id INTEGER PRIMARY KEY,
+            settings TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS outcomes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            asset TEXT NOT NULL,
+            direction TEXT NOT NULL,
+            entry_price REAL,
+            exit_price REAL,
+            result TEXT NOT NULL,
+            entry_time INTEGER NOT NULL,
+            exit_time INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_outcomes_asset_time ON outcomes (asset, entry_time);
+        CREATE TABLE IF NOT EXISTS leases (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path, flush_interval=2.0):
+        super().__init__(flush_interval)
+        self.path = path
+        self.conn = None
+        # Один поток гарантирует последовательный доступ к соединению
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite')
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _open(self):
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(self.SCHEMA)
+        self.conn.commit()
+
+    async def start(self):
+        if self.conn is None:
+            await self._run(self._open)
+            logging.info(f"💾 Хранилище SQLite: {self.path}")
+        await super().start()
+
+    async def close(self):
+        await super().close()
+        if self.conn is not None:
+            await self._run(self.conn.close)
+            self.conn = None
+        self._executor.shutdown(wait=True)
+
+    async def load_subscribers(self):
+        if self.conn is None:
+            await self.start()
+        rows = await self._run(lambda: self.conn.execute('SELECT user_id FROM subscribers').fetchall())
+        return {row[0] for row in rows}
+
+    async def load_watchlists(self):
+        if self.conn is None:
+            await self.start()
+        rows = await self._run(lambda: self.conn.execute('SELECT user_id, settings FROM watchlists').fetchall())
+        return {user_id: json.loads(settings) for user_id, settings in rows}
+
+    def _acquire_lease(self, name, owner, ttl):
+        # Время сравнивается по часам реплики: на одном хосте они общие
+        now = time.time()
+        with self.conn:
+            # Аренду можно взять, если она свободна, истекла или уже наша
+            self.conn.execute(
+                'INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) '
+                'ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at '
+                'WHERE leases.owner = excluded.owner OR leases.expires_at < ?',
+                (name, owner, now + ttl, now)
+            )
+            row = self.conn.execute('SELECT owner FROM leases WHERE name = ?', (name,)).fetchone()
+        return row is not None and row[0] == owner
+
+    async def acquire_lease(self, name, owner, ttl):
+        if self.conn is None:
+            await self.start()
+        return await self._run(self._acquire_lease, name, owner, ttl)
+
+    async def release_lease(self, name, owner):
+        if self.conn is None:
+            return
+
+        def release():
+            with self.conn:
+                self.conn.execute('DELETE FROM leases WHERE name = ? AND owner = ?', (name, owner))
+        await self._run(release)
+
+    def _write(self, subscribers, signals, watchlists, outcomes):
+        now = time.time()
+        with self.conn:
+            added = [(user_id, now) for user_id, active in subscribers.items() if active]
+            removed = [(user_id,) for user_id, active in subscribers.items() if not active]
+            if added:
+                self.conn.executemany(
+                    'INSERT OR IGNORE INTO subscribers (user_id, subscribed_at) VALUES (?, ?)', added
+                )
+            if removed:
+                self.conn.executemany('DELETE FROM subscribers WHERE user_id = ?', removed)
+            if signals:
+                self.conn.executemany(
+                    'INSERT INTO signals (asset, direction, confidence, rsi, price, created_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?)', signals
+                )
+            if watchlists:
+                self.conn.executemany(
+                    'INSERT OR REPLACE INTO watchlists (user_id, settings) VALUES (?, ?)',
+                    [(user_id, json.dumps(settings)) for user_id, settings in watchlists.items()]
+                )
+            if outcomes:
+                self.conn.executemany(
+                    'INSERT INTO outcomes (asset, direction, entry_price, exit_price, result, entry_time, exit_time) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)', outcomes
+                )
+
+    async def flush(self):
+        subscribers, signals, watchlists, outcomes = self._take_pending()
+        if self.conn is None or not (subscribers or signals or watchlists or outcomes):
+            return
+        try:
+            await self._run(self._write, subscribers, signals, watchlists, outcomes)
+        except Exception:
+            # Возвращаем изменения в очередь, более новые имеют приоритет
+            subscribers.update(self._pending_subscribers)
+            self._pending_subscribers = subscribers
+            watchlists.update(self._pending_watchlists)
+            self._pending_watchlists = watchlists
+            self._pending_signals = signals + self._pending_signals
+            self._pending_outcomes = outcomes + self._pending_outcomes
+            raise
+
+
+def create_storage():
+    """Хранилище по переменным окружения STORAGE и DB_PATH"""
+    backend = os.getenv('STORAGE', 'sqlite').lower()
+    if backend == 'memory':
+        return Storage()
+    return SQLiteStorage(os.getenv('DB_PATH', 'bot.db'))
@@ -0,0 +1,270 @@
+import logging
+import time
+from datetime import datetime
+
+import numpy as np
+
+# ==================== ПРОМЕЖУТОЧНЫЕ РЯДЫ ====================
+# Каждый ряд — функция (ctx, *params) -> np.ndarray. Зависимости берутся через
+# ctx.get(), поэтому граф строится лениво, а общий ряд (дельты, EMA, скользящие
+# суммы) считается один раз на актив за свечу, сколько бы индикаторов его ни
+# использовали.
+SERIES = {}
+
+
+def series(name):
+    def register(func):
+        SERIES[name] = func
+        return func
+    return register
+
+
+class SeriesContext:
+    """Кэш рядов одного актива на одну свечу"""
+
+    def __init__(self, close, high=None, low=None):
+        close = np.asarray(close, dtype=np.float64)
+        self.cache = {
+            ('close',): close,
+            ('high',): close if high is None else np.asarray(high, dtype=np.float64),
+            ('low',): close if low is None else np.asarray(low, dtype=np.float64),
+        }
+        self.computed = 0
+
+    def get(self, name, *params):
+        """Ряд по имени; имя может быть кортежем (имя, *параметры) вложенного ряда"""
+        if isinstance(name, tuple):
+            return self.get(*name, *params)
+        key = (name, *params)
+        value = self.cache.get(key)
+        if value is None:
+            value = self.cache[key] = SERIES[name](self, *params)
+            self.computed += 1
+        return value
+
+    def last(self, name, *params):
+        return float(self.get(name, *params)[-1])
+
+
+@series('delta')
+def _delta(ctx, src='close'):
+    return np.diff(ctx.get(src), prepend=np.nan)
+
+
+@series('gain')
+def _gain(ctx):
+    return np.clip(np.nan_to_num(ctx.get('delta')), 0, None)
+
+
+@series('loss')
+def _loss(ctx):
+    return np.clip(-np.nan_to_num(ctx.get('delta')), 0, None)
+
+
+@series('cumsum')
+def _cumsum(ctx, src):
+    return np.concatenate([[0.0], np.cumsum(ctx.get(src))])
+
+
+@series('rolling_sum')
+def _rolling_sum(ctx, src, n):
+    csum = ctx.get('cumsum', src)
+    out = np.full(len(csum) - 1, np.nan)
+    out[n - 1:] = csum[n:] - csum[:-n]
+    return out
+
+
+@series('sma')
+def _sma(ctx, src, n):
+    return ctx.get('rolling_sum', src, n) / n
+
+
+@series('square')
+def _square(ctx, src):
+    return ctx.get(src) ** 2
+
+
+@series('std')
+def _std(ctx, src, n):
+    mean = ctx.get('sma', src, n)
+    mean_sq = ctx.get('rolling_sum', ('square', src), n) / n
+    return np.sqrt(np.clip(mean_sq - mean ** 2, 0, None))
+
+
+@series('ema')
+def _ema(ctx, src, n):
+    values = ctx.get(src)
+    alpha = 2 / (n + 1)
+    out = np.empty(len(values))
+    prev = np.nan
+    for i, v in enumerate(values.tolist()):
+        if v != v:  # NaN до начала ряда
+            out[i] = np.nan
+            continue
+        prev = v if prev != prev else prev + alpha * (v - prev)
+        out[i] = prev
+    return out
+
+
+@series('rolling_max')
+def _rolling_max(ctx, src, n):
+    values = ctx.get(src)
+    out = np.full(len(values), np.nan)
+    if len(values) >= n:
+        out[n - 1:] = np.lib.stride_tricks.sliding_window_view(values, n).max(axis=1)
+    return out
+
+
+@series('rolling_min')
+def _rolling_min(ctx, src, n):
+    values = ctx.get(src)
+    out = np.full(len(values), np.nan)
+    if len(values) >= n:
+        out[n - 1:] = np.lib.stride_tricks.sliding_window_view(values, n).min(axis=1)
+    return out
+
+
+@series('rsi')
+def _rsi(ctx, n):
+    avg_gain = ctx.get('sma', 'gain', n)
+    avg_loss = ctx.get('sma', 'loss', n)
+    # Нулевое падение дает RS = 0, как в SignalGenerator.calculate_rsi
+    rs = np.where(avg_loss > 0, avg_gain / np.where(avg_loss > 0, avg_loss, 1.0), 0.0)
+    return np.where(np.isnan(avg_gain), np.nan, 100 - 100 / (1 + rs))
+
+
+@series('macd')
+def _macd(ctx, fast, slow):
+    return ctx.get('ema', 'close', fast) - ctx.get('ema', 'close', slow)
+
+
+@series('stoch_k')
+def _stoch_k(ctx, n):
+    highest = ctx.get('rolling_max', 'high', n)
+    lowest = ctx.get('rolling_min', 'low', n)
+    span = highest - lowest
+    return np.where(span > 0, 100 * (ctx.get('close') - lowest) / np.where(span > 0, span, 1.0), 50.0)
+
+
+# ==================== ИНДИКАТОРЫ ====================
+# Индикатор возвращает голос: 1 — CALL, -1 — PUT, 0 — нет мнения.
+INDICATORS = {}
+
+
+def indicator(name):
+    def register(func):
+        INDICATORS[name] = func
+        return func
+    return register
+
+
+# Период RSI по умолчанию: у голоса 'rsi' и для поля rsi в сигнале стратегии без него
+RSI_PERIOD = 14
+
+
+@indicator('rsi')
+def rsi_vote(ctx, period=RSI_PERIOD, lower=30, upper=70):
+    value = ctx.last('rsi', period)
+    return 1 if value < lower else -1 if value > upper else 0
+
+
+@indicator('ema_cross')
+def ema_cross_vote(ctx, fast=9, slow=21):
+    diff = ctx.get('ema', 'close', fast) - ctx.get('ema', 'close', slow)
+    return int(np.sign(diff[-1]))
+
+
+@indicator('macd')
+def macd_vote(ctx, fast=12, slow=26, signal=9):
+    histogram = ctx.get('macd', fast, slow) - ctx.get('ema', ('macd', fast, slow), signal)
+    return int(np.sign(histogram[-1]))
+
+
+@indicator('bollinger')
+def bollinger_vote(ctx, period=20, width=2.0):
+    mid = ctx.last('sma', 'close', period)
+    std = ctx.last('std', 'close', period)
+    price = ctx.last('close')
+    if price < mid - width * std:
+        return 1
+    if price > mid + width * std:
+        return -1
+    return 0
+
+
+@indicator('stochastic')
+def stochastic_vote(ctx, period=14, smooth=3, lower=20, upper=80):
+    d = ctx.last('sma', ('stoch_k', period), smooth)
+    return 1 if d < lower else -1 if d > upper else 0
+
+
+# ==================== СТРАТЕГИИ ====================
+class Strategy:
+    """Комбинация индикаторов в голосование или взвешенную сумму.
+
+    rules — список (имя индикатора, параметры, вес). Итоговый счет лежит
+    в [-1, 1]; сигнал выдается, если |счет| >= threshold.
+    """
+
+    def __init__(self, rules, mode='weighted', threshold=0.5, min_confidence=60):
+        for name, _, _ in rules:
+            if name not in INDICATORS:
+                raise ValueError(f"Неизвестный индикатор: {name}")
+        self.rules = rules
+        self.mode = mode
+        self.threshold = threshold
+        self.min_confidence = min_confidence
+        # RSI в сигнале считается с периодом правила 'rsi' стратегии
+        self.rsi_period = next(
+            (params.get('period', RSI_PERIOD) for name, params, _ in rules if name == 'rsi'), RSI_PERIOD
+        )
+
+    def votes(self, ctx):
+        return [(name, INDICATORS[name](ctx, **params), weight) for name, params, weight in self.rules]
+
+    def score(self, ctx, votes=None):
+        votes = [(v, w) for _, v, w in (votes or self.votes(ctx))]
+        if self.mode == 'vote':
+            return sum(v for v, _ in votes) / len(votes)
+        total = sum(w for _, w in votes)
+        return sum(v * w for v, w in votes) / total if total else 0.0
+
+    def evaluate(self, ctx, asset):
+        """Сигнал в формате SignalGenerator.analyze_asset или None"""
+        votes = self.votes(ctx)
+        score = self.score(ctx, votes)
+        if abs(score) < self.threshold:
+            return None
+        confidence = min(85, 50 + 50 * abs(score))
+        if confidence <= self.min_confidence:
+            return None
+
+        direction = "CALL 📈" if score > 0 else "PUT 📉"
+        rsi = ctx.last('rsi', self.rsi_period)
+        details = ', '.join(f"{name}={vote:+d}" for name, vote, _ in votes)
+        logging.info(f"🔍 {asset}: счет стратегии={score:+.2f} ({details}) -> {direction.split()[0]}")
+        return {
+            'asset': asset,
+            'direction': direction,
+            'confidence': round(confidence, 1),
+            'rsi': round(rsi, 1),
+            'price': round(ctx.last('close'), 5),
+            'time': datetime.now().strftime('%H:%M:%S'),
+            'created_at': time.time(),
+        }
+
+
+STRATEGIES = {
+    'rsi_macd_bb': Strategy([
+        ('rsi', {}, 2),
+        ('macd', {}, 1),
+        ('bollinger', {}, 1),
+    ], mode='weighted', threshold=0.5),
+    'consensus': Strategy([
+        ('rsi', {}, 1),
+        ('stochastic', {}, 1),
+        ('bollinger', {}, 1),
+        ('ema_cross', {}, 1),
+        ('macd', {}, 1),
+    ], mode='vote', threshold=0.6),
+}
@@ -0,0 +1,105 @@
+import os
+import sys
+
+import numpy as np
+
+import candle_archive
+from candle_archive import DAY, CandleArchive, DayFile, compact_file
+from candle_store import CandleStore
+
+DAY0 = 1_700_006_400  # полночь UTC
+
+
+def columns(times):
+    times = np.asarray(times, dtype=np.int64)
+    closes = times.astype(np.float64) / 60
+    return times, closes, closes + 1, closes - 1, closes
+
+
+def test_append_dedup(tmp_path):
+    archive = CandleArchive(str(tmp_path), timeframe=60)
+    assert archive.append('EURUSD_otc', *columns(DAY0 + np.arange(10) * 60)) == 10
+    # Пересекающаяся пачка: уже записанные свечи пропускаются
+    assert archive.append('EURUSD_otc', *columns(DAY0 + np.arange(5, 15) * 60)) == 5
+    assert archive.append('EURUSD_otc', *columns(DAY0 + np.arange(3) * 60)) == 0
+    archive.close()
+
+    reopened = CandleArchive(str(tmp_path), timeframe=60)
+    times = reopened.read('EURUSD_otc').arrays()[0]
+    assert np.array_equal(times, DAY0 + np.arange(15) * 60)
+    assert reopened.last_time('EURUSD_otc') == DAY0 + 14 * 60
+
+
+def test_day_rotation_compacts_previous_day(tmp_path):
+    archive = CandleArchive(str(tmp_path), timeframe=60)
+    times = DAY0 + DAY - 3 * 60 + np.arange(6) * 60  # три свечи до полуночи и три после
+    assert archive.append('EURUSD_otc', *columns(times)) == 6
+
+    first, second = archive.days('EURUSD_otc')
+    # Закончившийся день сжат до фактического числа свечей, текущий — на все сутки
+    assert DayFile(first).capacity == 3
+    assert DayFile(second).capacity == DAY // 60
+    assert np.array_equal(archive.read('EURUSD_otc').arrays()[0], times)
+    assert np.array_equal(archive.read('EURUSD_otc', start=DAY0 + DAY).arrays()[0], times[3:])
+    archive.close()
+
+
+def test_compact_and_reopen(tmp_path):
+    archive = CandleArchive(str(tmp_path), timeframe=60)
+    archive.append('EURUSD_otc', *columns(DAY0 + np.arange(10) * 60))
+    path = archive.writers['EURUSD_otc'].path
+    archive.close()
+    full_size = os.path.getsize(path)
+
+    assert compact_file(path)
+    assert not compact_file(path)
+    assert os.path.getsize(path) < full_size
+    day = DayFile(path)
+    assert day.capacity == day.count == 10
+
+    # Свеча за уже сжатый день: файл снова расширяется до полных суток
+    archive = CandleArchive(str(tmp_path), timeframe=60)
+    assert archive.append('EURUSD_otc', *columns([DAY0 + 10 * 60])) == 1
+    assert archive.writers['EURUSD_otc'].capacity == DAY // 60
+    assert np.array_equal(archive.read('EURUSD_otc').arrays()[0], DAY0 + np.arange(11) * 60)
+    archive.close()
+
+
+def test_compact_removes_empty_day(tmp_path):
+    path = str(tmp_path / 'empty.cndl')
+    DayFile.create(path, 60, DAY0)
+    assert compact_file(path)
+    assert not os.path.exists(path)
+
+
+def test_warm_start_marks_missing(tmp_path):
+    archive = CandleArchive(str(tmp_path), timeframe=60)
+    archive.append('EURUSD_otc', *columns(DAY0 + np.arange(50) * 60))
+    archive.append('GBPUSD_otc', *columns(DAY0 - DAY + np.arange(50) * 60))
+    archive.close()
+
+    store = CandleStore(capacity=30, timeframe=60)
+    last = DAY0 + 49 * 60
+    now = last + 5 * 60 + 30
+    # GBPUSD слишком старый для окна буфера, AUDUSD в архиве нет
+    warmed = archive.warm_start(store, ['EURUSD_otc', 'GBPUSD_otc', 'AUDUSD_otc'], now=now)
+    assert warmed == ['EURUSD_otc']
+
+    buf = store.get('EURUSD_otc')
+    assert len(buf) == 30
+    assert buf.last_time == last
+    assert buf.missing == 5
+    assert store.get('GBPUSD_otc') is None
+
+
+def test_cli_skips_foreign_entries(tmp_path, monkeypatch, capsys):
+    archive = CandleArchive(str(tmp_path), timeframe=60)
+    archive.append('EURUSD_otc', *columns(DAY0 + np.arange(3) * 60))
+    archive.close()
+    (tmp_path / 'README.txt').write_text('x')
+    (tmp_path / 'backup').mkdir()
+
+    for command in ('info', 'compact'):
+        monkeypatch.setattr(sys, 'argv', ['candle_archive.py', command, '--root', str(tmp_path)])
+        candle_archive.main()
+    assert 'EURUSD_otc' in capsys.readouterr().out
@@ -0,0 +1,53 @@
+import numpy as np
+
+from candle_store import CandleBuffer
+
+
+def columns(times):
+    times = np.asarray(times, dtype=np.int64)
+    closes = times.astype(np.float64) / 60
+    return times, closes, closes + 1, closes - 1, closes
+
+
+def candle(t):
+    return {'time': t, 'open': t / 60, 'high': t / 60 + 1, 'low': t / 60 - 1, 'close': t / 60}
+
+
+def test_seed_arrays_then_append():
+    for seeded in (3, 8, 10, 25):
+        buf = CandleBuffer(capacity=10, timeframe=60)
+        buf.seed_arrays(*columns(np.arange(seeded) * 60))
+        assert len(buf) == min(seeded, 10)
+        assert buf.last_time == (seeded - 1) * 60
+
+        for t in range(seeded, seeded + 15):
+            buf.update_candle(candle(t * 60))
+            expected = np.arange(max(0, t + 1 - 10), t + 1) * 60
+            times, _, _, _, closes = buf.arrays()
+            assert np.array_equal(times, expected)
+            assert np.array_equal(closes, expected / 60)
+            assert buf.last_time == t * 60
+        assert buf.missing == 0
+
+
+def test_merge_prefers_new_candles():
+    buf = CandleBuffer(capacity=10, timeframe=60)
+    buf.seed([candle(t * 60) for t in range(5)])
+    fixed = dict(candle(120), close=99.0)
+    buf.merge([fixed, candle(300)])
+    times, _, _, _, closes = buf.arrays()
+    assert np.array_equal(times, np.arange(6) * 60)
+    assert closes[2] == 99.0
+
+
+def test_merge_keeps_unfilled_gap():
+    buf = CandleBuffer(capacity=50, timeframe=60)
+    buf.seed([candle(t * 60) for t in range(10)])
+    buf.missing = 20
+    # Догрузили только последние 3 свечи: между ними и старой историей остается дыра
+    buf.merge([candle(t * 60) for t in range(27, 30)])
+    assert buf.missing == 17
+
+    buf.merge([candle(t * 60) for t in range(10, 27)])
+    assert buf.missing == 0
+    assert np.array_equal(buf.arrays()[0], np.arange(30) * 60)
@@ -0,0 +1,30 @@
+import asyncio
+
+from bot import PocketOptionClient
+
+
+def dispatch(waiters, payload):
+    """Ответ getCandles при ожидающих запросах [(актив, ...)]; возвращает результаты по активам"""
+    async def run():
+        client = PocketOptionClient('')
+        client._authorized = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        futures = {asset: loop.create_future() for asset in waiters}
+        client._pending_events['getCandles'] = list(futures.items())
+        client._dispatch('candles', payload)
+        return {asset: f.result() for asset, f in futures.items() if f.done()}
+    return asyncio.run(run())
+
+
+def test_response_with_asset_goes_to_its_request():
+    payload = {'asset': 'GBPUSD_otc', 'candles': []}
+    assert dispatch(['EURUSD_otc', 'GBPUSD_otc'], payload) == {'GBPUSD_otc': payload}
+
+
+def test_bare_response_resolves_single_request():
+    assert dispatch(['EURUSD_otc'], [[1, 2]]) == {'EURUSD_otc': [[1, 2]]}
+
+
+def test_bare_response_dropped_when_ambiguous():
+    # Ответы на параллельные запросы приходят в любом порядке: без актива не угадываем
+    assert dispatch(['EURUSD_otc', 'GBPUSD_otc'], [[1, 2]]) == {}
@@ -0,0 +1,66 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from telegram.error import NetworkError, RetryAfter
+
+import metrics
+from delivery import SignalDelivery
+from messages import SignalRenderer
+
+
+class PinFailingBot:
+    """Заглушка Telegram: отправка проходит, закрепление падает с error"""
+
+    def __init__(self, error):
+        self.error = error
+        self.sent = []
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        self.sent.append((chat_id, text))
+        return SimpleNamespace(message_id=len(self.sent))
+
+    async def pin_chat_message(self, chat_id, message_id, disable_notification=False):
+        raise self.error
+
+
+def deliver_pinned(error):
+    pinned = {}
+    bot = PinFailingBot(error)
+    delivery = SignalDelivery(bot, get_pinned=pinned.get, on_pinned=pinned.__setitem__)
+    asyncio.run(delivery._deliver(1, 'digest', None, 0.0, 0, True))
+    return bot, delivery, pinned
+
+
+def test_pin_failure_does_not_resend():
+    for error in (RetryAfter(3), NetworkError('timeout')):
+        bot, delivery, pinned = deliver_pinned(error)
+        assert bot.sent == [(1, 'digest')]
+        assert delivery.queue.empty()
+        assert pinned == {1: 1}
+        assert delivery.sent == 1
+
+
+def test_pinned_digest_header_not_cached():
+    renderer = SignalRenderer()
+    signals = [{'asset': 'EURUSD_otc', 'direction': 'CALL 📈', 'confidence': 70,
+                'rsi': 25.0, 'price': 1.1, 'time': '12:00:00'}]
+    first = renderer.digest(signals, pinned=True)
+    renderer.digest(signals)
+    assert renderer.hits == 1
+    assert first.startswith("📌")
+    assert first.split("\n\n", 1)[1] == renderer.digest(signals).split("\n\n", 1)[1]
+
+
+def test_latency_counts_from_signal_creation():
+    bot = PinFailingBot(NetworkError('unused'))
+    delivery = SignalDelivery(bot)
+    # Сигнал создан 30 секунд назад (ожидание дайджеста или передача из воркера)
+    delivery.broadcast('signal', [1], created_at=time.time() - 30)
+    before = metrics.DELIVERY_LATENCY_SECONDS.drain()
+    asyncio.run(delivery._deliver(*delivery.queue.get_nowait()))
+    _, total, count = metrics.DELIVERY_LATENCY_SECONDS.drain()
+    assert count == 1
+    assert total >= 30
+    if before:
+        metrics.DELIVERY_LATENCY_SECONDS.merge(before)
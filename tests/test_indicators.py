@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bot import SignalGenerator
+from candle_store import CandleBuffer
+from indicators import RsiState, rsi_matrix, rsi_series
+
+
+def random_walk(n, seed):
+    rng = np.random.default_rng(seed)
+    return 1.1 * np.exp(np.cumsum(rng.normal(0, 0.001, n)))
+
+
+def wilder_reference(closes, period):
+    """RSI Уайлдера простым циклом: первое среднее — SMA, дальше сглаживание"""
+    delta = np.diff(closes)
+    gains, losses = np.clip(delta, 0, None), np.clip(-delta, 0, None)
+    avg_gain, avg_loss = gains[:period].mean(), losses[:period].mean()
+    for gain, loss in zip(gains[period:], losses[period:]):
+        avg_gain = (avg_gain * (period - 1) + gain) / period
+        avg_loss = (avg_loss * (period - 1) + loss) / period
+    rs = avg_gain / avg_loss if avg_loss else 0.0
+    return 100 - 100 / (1 + rs)
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+@pytest.mark.parametrize('period', [7, 14, 21])
+def test_sma_matches_calculate_rsi(seed, period):
+    closes = random_walk(200, seed)
+    expected = SignalGenerator().calculate_rsi(pd.Series(closes), period).iloc[-1]
+
+    state = RsiState(period)
+    for close in closes[:-1]:
+        state.update(close)
+    assert state.peek(closes[-1]) == pytest.approx(expected, abs=1e-9)
+    assert rsi_matrix(closes[None, :], period)[0] == pytest.approx(expected, abs=1e-9)
+    assert rsi_series(closes, period)[-1] == pytest.approx(expected, abs=1e-9)
+
+
+def test_sma_full_series_matches_calculate_rsi():
+    closes = random_walk(300, 7)
+    expected = SignalGenerator().calculate_rsi(pd.Series(closes), 14).to_numpy()
+    state = RsiState(14)
+    values = [state.update(c) for c in closes]
+    values = np.array([np.nan if v is None else v for v in values])
+    # Эталон превращает NaN первого diff в нулевое изменение и выдает значение
+    # на свечу раньше (индекс period - 1); дальше ряды должны совпадать
+    np.testing.assert_allclose(values[14:], expected[14:], atol=1e-9)
+    np.testing.assert_allclose(rsi_series(closes, 14)[14:], expected[14:], atol=1e-9)
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+@pytest.mark.parametrize('period', [7, 14])
+def test_wilder_engines_agree(seed, period):
+    closes = random_walk(200, seed)
+    expected = wilder_reference(closes, period)
+
+    state = RsiState(period, wilder=True)
+    for close in closes[:-1]:
+        state.update(close)
+    assert state.peek(closes[-1]) == pytest.approx(expected, abs=1e-9)
+    assert rsi_matrix(closes[None, :], period, wilder=True)[0] == pytest.approx(expected, abs=1e-9)
+    assert rsi_series(closes, period, wilder=True)[-1] == pytest.approx(expected, abs=1e-9)
+
+
+def test_rsi_matrix_rows_are_independent():
+    rows = np.array([random_walk(100, seed) for seed in range(5)])
+    batch = rsi_matrix(rows, 14)
+    for row, value in zip(rows, batch):
+        assert value == pytest.approx(rsi_matrix(row[None, :], 14)[0])
+
+
+def test_no_losses_gives_zero_rs_like_reference():
+    closes = np.linspace(1.0, 2.0, 30)
+    expected = SignalGenerator().calculate_rsi(pd.Series(closes), 14).iloc[-1]
+    state = RsiState(14)
+    for close in closes[:-1]:
+        state.update(close)
+    assert state.peek(closes[-1]) == pytest.approx(expected)
+    assert rsi_matrix(closes[None, :], 14)[0] == pytest.approx(expected)
+
+
+def test_wilder_state_follows_buffer_appends():
+    closes = random_walk(400, 5)
+    buf = CandleBuffer(capacity=100, timeframe=60)
+    buf.seed_arrays(np.arange(100) * 60, closes[:100], closes[:100], closes[:100], closes[:100])
+    generator = SignalGenerator(wilder=True)
+    generator.analyze_many({'EURUSD_otc': buf})
+    assert generator.last_rsi['EURUSD_otc'] == pytest.approx(wilder_reference(closes[:100], 14), abs=1e-9)
+
+    # Дальше свечи только дописываются: состояние продолжает счет за пределами окна буфера
+    for i in range(100, 400):
+        buf.update_candle({'time': i * 60, 'open': closes[i], 'high': closes[i],
+                           'low': closes[i], 'close': closes[i]})
+        generator.analyze_many({'EURUSD_otc': buf})
+    assert generator.last_rsi['EURUSD_otc'] == pytest.approx(wilder_reference(closes, 14), abs=1e-9)
+
+    # Переписанная история (merge/seed) сбрасывает состояние на окно буфера
+    buf.seed_arrays(np.arange(100) * 60, closes[:100], closes[:100], closes[:100], closes[:100])
+    generator.analyze_many({'EURUSD_otc': buf})
+    assert generator.last_rsi['EURUSD_otc'] == pytest.approx(wilder_reference(closes[:100], 14), abs=1e-9)
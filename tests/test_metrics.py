@@ -0,0 +1,22 @@
+import metrics
+
+
+def test_drain_and_merge_worker_metrics():
+    # Воркер: копит метрики у себя и отдает прирост с heartbeat
+    metrics.SIGNALS_SUPPRESSED.inc(3)
+    metrics.SCAN_CYCLE_SECONDS.observe(0.2)
+    metrics.SEND_FAILURES.inc(kind='transient')
+    states = metrics.drain()
+    assert metrics.drain() == {}
+    assert metrics.SIGNALS_SUPPRESSED.value() == 0
+
+    # Главный процесс: прирост добавляется к своим значениям
+    metrics.SIGNALS_SUPPRESSED.inc(1)
+    metrics.merge(states)
+    metrics.merge(states)
+    assert metrics.SIGNALS_SUPPRESSED.value() == 7
+    assert metrics.SEND_FAILURES.value(kind='transient') == 2
+    text = metrics.render()
+    assert 'scan_cycle_seconds_count 2' in text
+    assert 'scan_cycle_seconds_bucket{le="0.25"} 2' in text
+    metrics.drain()
@@ -0,0 +1,56 @@
+import asyncio
+
+import numpy as np
+
+from bot import MarketScanner, PocketOptionClient, SignalGenerator
+from candle_store import CandleStore
+from scheduler import ScanScheduler
+from simulator import MarketSimulator, SimulatorServer
+
+SSID = '42["auth",{"session":"test","isDemo":1}]'
+
+
+async def scan_simulator(generator, assets=4, timeframe=5):
+    """Один цикл MarketScanner против локального симулятора Pocket Option"""
+    server = SimulatorServer(MarketSimulator(assets=assets, seed=7), port=0, stream_interval=0.05)
+    await server.start()
+    client = PocketOptionClient(SSID, url=server.url, request_timeout=10)
+    store = CandleStore(capacity=100, timeframe=timeframe)
+    found = []
+    scanner = MarketScanner(
+        SSID, generator, store, ScanScheduler(timeframe), on_signals=found.extend, client=client
+    )
+    try:
+        assert await client.connect()
+        await scanner.on_feed_connected()
+        await scanner.scan_once()
+        return server, store, found
+    finally:
+        await client.close()
+        await server.stop()
+
+
+def test_scan_once_end_to_end():
+    # Пороги, при которых сигнал дает любой актив: проверяем весь путь свечей до сигнала
+    generator = SignalGenerator(lower=101, upper=101, min_confidence=0)
+    server, store, found = asyncio.run(scan_simulator(generator))
+
+    assert generator.assets == server.simulator.assets
+    assert sorted(store.buffers) == sorted(server.simulator.assets)
+    assert sorted(s['asset'] for s in found) == sorted(server.simulator.assets)
+    for signal in found:
+        buf = store.get(signal['asset'])
+        assert len(buf) >= 50
+        times = buf.arrays()[0]
+        assert np.all(np.diff(times) == 5)
+        assert signal['direction'].startswith('CALL')
+        assert 0 <= signal['rsi'] <= 100
+
+
+def test_scan_once_quiet_thresholds():
+    # Недостижимые пороги: цикл проходит, но сигналов нет
+    generator = SignalGenerator(lower=-1, upper=101)
+    _, store, found = asyncio.run(scan_simulator(generator, assets=2))
+
+    assert len(store.buffers) == 2
+    assert found == []
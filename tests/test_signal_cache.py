@@ -0,0 +1,57 @@
+from candle_store import CandleBuffer
+from signal_cache import OutcomeTracker, SignalCache
+
+
+def params(asset):
+    return 14, 30, 70, 60
+
+
+def signal(asset='EURUSD_otc', direction='CALL 📈'):
+    return {'asset': asset, 'direction': direction}
+
+
+def test_ttl_keeps_entry_while_in_zone():
+    cache = SignalCache(cooldown=60, hysteresis=5, ttl=3600)
+    assert cache.admit([signal()], now=0)
+    # Час спустя RSI все еще ниже порога: запись не вытесняется, повтора нет
+    cache.observe({'EURUSD_otc': 20}, params)
+    assert cache.admit([signal()], now=4000) == []
+    assert len(cache) == 1
+
+
+def test_ttl_evicts_after_leaving_zone():
+    cache = SignalCache(cooldown=60, hysteresis=5, ttl=3600)
+    cache.admit([signal()], now=0)
+    cache.observe({'EURUSD_otc': 40}, params)
+    cache.evict(4000)
+    assert len(cache) == 0
+
+
+def test_hysteresis_rearms():
+    cache = SignalCache(cooldown=60, hysteresis=5, ttl=3600)
+    cache.admit([signal()], now=0)
+    cache.observe({'EURUSD_otc': 33}, params)
+    assert cache.admit([signal()], now=100) == []
+    cache.observe({'EURUSD_otc': 36}, params)
+    assert cache.admit([signal()], now=100) == [signal()]
+
+
+def test_strategy_mode_rearms_when_signal_stops():
+    cache = SignalCache(cooldown=60, hysteresis=5, ttl=3600)
+    cache.admit([signal(), signal('GBPUSD_otc')], now=0)
+    # EURUSD проанализирован без сигнала, GBPUSD снова дал сигнал
+    cache.observe_signals(['EURUSD_otc', 'GBPUSD_otc'], [signal('GBPUSD_otc')])
+    admitted = cache.admit([signal(), signal('GBPUSD_otc')], now=100)
+    assert admitted == [signal()]
+
+
+def test_outcome_expiry_rounded_to_candles():
+    buf = CandleBuffer(capacity=10, timeframe=300)
+    buf.seed([{'time': t * 300, 'open': t, 'high': t, 'low': t, 'close': float(t)} for t in range(5)])
+    tracker = OutcomeTracker(expiry=60)
+    # Сигнал на закрытии свечи 1 (boundary 600), экспирация меньше свечи -> одна свеча
+    tracker.track({'asset': 'EURUSD_otc', 'direction': 'CALL 📈', 'price': 1.0}, 600, 300)
+    outcome, = tracker.resolve({'EURUSD_otc': buf}, now=10_000)
+    assert outcome['exit_time'] == 600
+    assert outcome['exit_price'] == 2.0
+    assert outcome['result'] == 'win'
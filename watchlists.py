@@ -0,0 +1,164 @@
+DIRECTIONS = ('CALL', 'PUT')
+# instant — сообщение на каждый сигнал, digest — один дайджест за цикл сканирования,
+# pinned — дайджест правкой одного закрепленного сообщения
+MODES = ('instant', 'digest', 'pinned')
+
+
+# ==================== ПОДПИСКИ НА АКТИВЫ ====================
+class Watch:
+    """Настройки одного пользователя: активы (None — все, пустое множество — ни одного),
+    направления, мин. уверенность, режим доставки"""
+
+    def __init__(self, assets=None, directions=DIRECTIONS, min_confidence=0, mode='instant',
+                 pinned_message_id=None):
+        self.assets = set(assets) if assets is not None else None
+        self.directions = set(directions)
+        self.min_confidence = min_confidence
+        self.mode = mode
+        self.pinned_message_id = pinned_message_id
+
+    def to_dict(self):
+        return {
+            'assets': sorted(self.assets) if self.assets is not None else None,
+            'directions': sorted(self.directions),
+            'min_confidence': self.min_confidence,
+            'mode': self.mode,
+            'pinned_message_id': self.pinned_message_id,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('assets'), data.get('directions', DIRECTIONS), data.get('min_confidence', 0),
+                   data.get('mode', 'instant'), data.get('pinned_message_id'))
+
+
+class WatchlistIndex:
+    """Инвертированный индекс актив -> подписчики.
+
+    Маршрутизация сигнала перебирает только пользователей, следящих за его
+    активом (плюс тех, кто следит за всеми), а не всех подписчиков.
+    """
+
+    def __init__(self):
+        self.settings = {}  # user_id -> Watch, хранится и для отписавшихся
+        self.active = set()
+        self.by_asset = {}
+        self.all_assets = set()  # подписчики без фильтра по активам
+
+    def __len__(self):
+        return len(self.active)
+
+    def get(self, user_id):
+        watch = self.settings.get(user_id)
+        if watch is None:
+            watch = self.settings[user_id] = Watch()
+        return watch
+
+    def load(self, settings):
+        """Загрузка сохраненных настроек {user_id: dict}"""
+        for user_id, data in settings.items():
+            self.settings[user_id] = Watch.from_dict(data)
+
+    def _index(self, user_id):
+        watch = self.get(user_id)
+        if watch.assets is None:
+            self.all_assets.add(user_id)
+        else:
+            for asset in watch.assets:
+                self.by_asset.setdefault(asset, set()).add(user_id)
+
+    def _unindex(self, user_id):
+        self.all_assets.discard(user_id)
+        watch = self.settings.get(user_id)
+        if watch is None or watch.assets is None:
+            return
+        for asset in watch.assets:
+            users = self.by_asset.get(asset)
+            if users is not None:
+                users.discard(user_id)
+                if not users:
+                    del self.by_asset[asset]
+
+    def replace(self, user_id, watch):
+        """Замена настроек пользователя целиком (например, прочитанных из хранилища)"""
+        active = user_id in self.active
+        if active:
+            self._unindex(user_id)
+        self.settings[user_id] = watch
+        if active:
+            self._index(user_id)
+
+    def subscribe(self, user_id):
+        if user_id not in self.active:
+            self.active.add(user_id)
+            self._index(user_id)
+
+    def unsubscribe(self, user_id):
+        if user_id in self.active:
+            self._unindex(user_id)
+            self.active.discard(user_id)
+
+    def _update(self, user_id, change):
+        """Изменение настроек с переиндексацией, если пользователь подписан"""
+        active = user_id in self.active
+        if active:
+            self._unindex(user_id)
+        change(self.get(user_id))
+        if active:
+            self._index(user_id)
+        return self.get(user_id)
+
+    def watch(self, user_id, asset):
+        def change(w):
+            if w.assets is None:
+                w.assets = set()
+            w.assets.add(asset)
+        return self._update(user_id, change)
+
+    def unwatch(self, user_id, asset):
+        # Последний убранный актив оставляет пустой список, а не «все активы»
+        def change(w):
+            if w.assets is not None:
+                w.assets.discard(asset)
+        return self._update(user_id, change)
+
+    def toggle(self, user_id, asset):
+        watch = self.get(user_id)
+        if watch.assets is not None and asset in watch.assets:
+            return self.unwatch(user_id, asset)
+        return self.watch(user_id, asset)
+
+    def watch_all(self, user_id):
+        return self._update(user_id, lambda w: setattr(w, 'assets', None))
+
+    def set_directions(self, user_id, directions):
+        return self._update(user_id, lambda w: setattr(w, 'directions', set(directions)))
+
+    def set_min_confidence(self, user_id, value):
+        return self._update(user_id, lambda w: setattr(w, 'min_confidence', value))
+
+    def set_mode(self, user_id, mode):
+        # Режим не влияет на индекс, переиндексация не нужна
+        self.get(user_id).mode = mode
+        return self.get(user_id)
+
+    def set_pinned(self, user_id, message_id):
+        self.get(user_id).pinned_message_id = message_id
+
+    def route(self, signal):
+        """Получатели сигнала с учетом направления и уверенности"""
+        direction = signal['direction'].split()[0]
+        confidence = signal['confidence']
+        recipients = []
+        for users in (self.by_asset.get(signal['asset'], ()), self.all_assets):
+            for user_id in users:
+                watch = self.settings[user_id]
+                if direction in watch.directions and confidence >= watch.min_confidence:
+                    recipients.append(user_id)
+        return recipients
+
+    def watched_assets(self, universe):
+        """Активы из universe, за которыми кто-то следит"""
+        if self.all_assets:
+            return list(universe)
+        return [asset for asset in universe if asset in self.by_asset]
@@ -0,0 +1,72 @@
+import hashlib
+import logging
+import os
+
+from aiohttp import web
+from telegram import Update
+
+import metrics
+
+
+# ==================== WEBHOOK-СЕРВЕР ====================
+class WebhookServer:
+    """Один HTTP-сервер в event loop бота: обновления Telegram, /health и /metrics.
+
+    Обновления кладутся в update_queue приложения, дальше их разбирают
+    обычные обработчики python-telegram-bot. Запросы без правильного
+    X-Telegram-Bot-Api-Secret-Token отклоняются.
+    """
+
+    def __init__(self, application, path='/telegram', secret=None, host='0.0.0.0', port=8080):
+        self.application = application
+        self.path = path
+        self.secret = secret
+        self.host = host
+        self.port = port
+        self.runner = None
+        self.updates = 0
+
+        self.app = web.Application()
+        self.app.router.add_get('/', self.home)
+        self.app.router.add_get('/health', self.health)
+        self.app.router.add_get('/metrics', self.metrics_endpoint)
+        self.app.router.add_post(path, self.telegram)
+
+    async def start(self):
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        logging.info(f"🌐 Webhook-сервер слушает {self.host}:{self.port}{self.path}")
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+
+    async def home(self, request):
+        return web.Response(text="Бот работает!")
+
+    async def health(self, request):
+        ok, reason = metrics.health()
+        return web.Response(text=reason, status=200 if ok else 503)
+
+    async def metrics_endpoint(self, request):
+        return web.Response(text=metrics.render(),
+                            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+    async def telegram(self, request):
+        if self.secret and request.headers.get('X-Telegram-Bot-Api-Secret-Token') != self.secret:
+            return web.Response(status=403)
+        try:
+            update = Update.de_json(await request.json(), self.application.bot)
+        except Exception as e:
+            logging.warning(f"⚠️ Некорректное обновление от Telegram: {e}")
+            return web.Response(status=400)
+        self.updates += 1
+        await self.application.update_queue.put(update)
+        return web.Response()
+
+
+def webhook_secret(token):
+    """Секрет webhook из WEBHOOK_SECRET или производный от токена (одинаковый у всех реплик)"""
+    return os.getenv('WEBHOOK_SECRET') or hashlib.sha256(token.encode()).hexdigest()[:32]